@@ -1,11 +1,12 @@
 import os
 import sys
-import time
 import traceback
 import json
 import importlib
-import logging
-from flask import Flask, request, jsonify, render_template, send_from_directory, url_for
+import time
+import uuid
+import asyncio
+from flask import Flask, Response, g, request, jsonify, render_template, send_from_directory, stream_with_context, url_for
 from flask_login import LoginManager, login_required, logout_user
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -13,11 +14,22 @@ from dotenv import load_dotenv
 from jinja2 import TemplateNotFound, ChoiceLoader, FileSystemLoader
 from models import User
 from config import Config
+from bots.tools.BaseChatBot import BaseChatBot
+from bots.tools.metrics import registry, span, start_trace
+from bots.tools.prompt_cache import cache_stats
+from rate_limit import create_rate_limiter, rate_limit_headers
+from conversation_store import create_conversation_store, new_conversation_id, normalize_conversation_id, text_message
+from history_compactor import HistoryCompactor
+from ingestion_jobs import create_ingestion_jobs
+from logging_config import configure_logging, request_id_var, conversation_id_var
 
 # Load environment variables from the .env file
 load_dotenv()
 
 def create_app():
+    # Before the bot modules are imported, so their basicConfig calls become no-ops
+    configure_logging()
+
     app = Flask(__name__)
     app.secret_key = os.getenv('SECRET_KEY', 'your_secret_key')  # Make sure to set this in your .env file
     app.config.from_object(Config)
@@ -34,7 +46,12 @@ def create_app():
         bot_directory = 'bots/chatbot'  # Set the directory to the default chatbot's directory
     
     app.config['RATE_LIMIT_REQUESTS'] = int(os.getenv('RATE_LIMIT_REQUESTS', 30))
-    app.config['HISTORY_LIMIT'] = int(os.getenv('HISTORY_LIMIT', 20))
+    app.config['RATE_LIMIT_WINDOW'] = int(os.getenv('RATE_LIMIT_WINDOW', 3600))
+    # 'ip' limits each client address; 'session' limits each session_id sent with the chat payload
+    app.config['RATE_LIMIT_KEY'] = os.getenv('RATE_LIMIT_KEY', 'ip')
+    app.config['RATE_LIMIT_TRUST_PROXY'] = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() in ('1', 'true', 'yes')
+    # Tokens of history sent with each message; older turns are folded into a summary
+    app.config['HISTORY_TOKEN_BUDGET'] = int(os.getenv('HISTORY_TOKEN_BUDGET', 4000))
     app.config['BOT_DIRECTORY'] = bot_directory
     app.config['UPLOAD_FOLDER'] = os.path.join(bot_directory, 'uploads')
 
@@ -81,6 +98,10 @@ def create_app():
     # Make chatbot globally accessible
     app.config['CHATBOT'] = chatbot
 
+    # Uploads are parsed, embedded and indexed in the background; the upload routes return a job id
+    ingestion_jobs = create_ingestion_jobs(app)
+    app.config['INGESTION_JOBS'] = ingestion_jobs
+
     # Add the bot's template directory to the template loader search path
     template_path = os.path.join(os.path.dirname(__file__), bot_directory, 'templates')
     app.jinja_loader = ChoiceLoader([FileSystemLoader(template_path), app.jinja_loader])
@@ -90,8 +111,22 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'dashboard.login'
 
-    # Configure logging
-    logging.basicConfig(filename='app.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    @app.before_request
+    def set_request_context():
+        g.request_started = time.perf_counter()
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        request_id_var.set(request_id)
+        conversation_id_var.set(None)
+        # Spans of this request share its id as their trace id
+        start_trace(request_id)
+
+    @app.after_request
+    def add_request_id(response):
+        response.headers['X-Request-ID'] = request_id_var.get()
+        # For a stream this is the time to the first byte; the stream itself is timed in chat_stream
+        registry.observe('http_request_duration_seconds', time.perf_counter() - g.request_started,
+                         endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code)
+        return response
 
     # User loader for Flask-Login
     @login_manager.user_loader
@@ -119,54 +154,227 @@ def create_app():
             widget_template = None
         return render_template('index.html', widget_template=widget_template, bot_name=chatbot_name)
 
-    # In-memory store for rate limiting
-    first_request_time = None
-    request_count = 0
+    # Per-client sliding-window limit, shared across workers when RATE_LIMIT_REDIS_URL is set
+    rate_limiter = create_rate_limiter(app.config['RATE_LIMIT_REQUESTS'], app.config['RATE_LIMIT_WINDOW'])
+    app.config['RATE_LIMITER'] = rate_limiter
+    rate_limit_message = "וואו, אני עייף. בוא נדבר עוד שעה ככה... בסדר?"
+
+    def client_address():
+        # Behind a reverse proxy every request comes from the proxy's address
+        return request.access_route[0] if app.config['RATE_LIMIT_TRUST_PROXY'] and request.access_route else request.remote_addr
+
+    def client_key(payload, address):
+        if app.config['RATE_LIMIT_KEY'] == 'session' and payload.get('session_id'):
+            return f"session:{payload['session_id']}"
+        return f"ip:{address}"
+
+    def check_rate_limit(payload, address):
+        return rate_limiter.hit(client_key(payload, address))
+
+    # Server-side histories, so the client only sends the new message and its conversation_id
+    conversation_store = create_conversation_store()
+    app.config['CONVERSATION_STORE'] = conversation_store
+    history_compactor = HistoryCompactor(app.config['HISTORY_TOKEN_BUDGET'])
+    app.config['HISTORY_COMPACTOR'] = history_compactor
+
+    registry.register_collector('rate_limit', rate_limiter.stats)
+    registry.register_collector('conversation_store', conversation_store.stats)
+    registry.register_collector('history_compactor', history_compactor.stats)
+    registry.register_collector('anthropic_prompt_cache', cache_stats.stats)
+    registry.register_collector('ingestion_jobs', ingestion_jobs.stats)
+    if isinstance(chatbot, BaseChatBot):
+        registry.register_collector('bot_sessions', chatbot.sessions.stats)
+
+    def load_history(payload):
+        """
+        Returns (conversation_id, history). Clients that still post their own history
+        keep that behaviour and get no conversation_id; anyone else gets the stored
+        history, and a new conversation starts when no conversation_id is sent.
+        """
+        if 'history' in payload:
+            return None, fit_history(None, payload['history'])
+        if payload.get('conversation_id'):
+            conversation_id = normalize_conversation_id(payload['conversation_id'])
+            if conversation_id is None:
+                return None, None
+        else:
+            conversation_id = new_conversation_id()
+        conversation_id_var.set(conversation_id)
+        return conversation_id, fit_history(conversation_id, conversation_store.history(conversation_id))
+
+    def fit_history(conversation_id, history):
+        # Bots that keep their own session history ignore this one, so it is not worth a summary
+        if isinstance(chatbot, BaseChatBot):
+            return history
+        return history_compactor.compact(conversation_id, history)
+
+    def session_kwargs(conversation_id):
+        # Bots that keep their own per-session history need to know whose conversation this is
+        return {'session_id': conversation_id} if isinstance(chatbot, BaseChatBot) else {}
+
+    def remember(conversation_id, user_message, chat_response):
+        if conversation_id and isinstance(chat_response, str):
+            conversation_store.append(conversation_id, text_message('user', user_message), text_message('assistant', chat_response))
+
+    def start_chat(payload, address):
+        """
+        The checks /chat makes before asking the bot, shared by the Flask view and the
+        async /chat of asgi.py. Returns (reply, None) when the request ends here, with
+        reply as (body, status, headers), or (None, (conversation_id, history)).
+        """
+        if not payload.get('message'):
+            return ({'error': 'No message provided'}, 400, {}), None
+
+        rate_limit = check_rate_limit(payload, address)
+        if not rate_limit.allowed:
+            return ({'response': rate_limit_message}, 429, rate_limit_headers(rate_limit)), None
+
+        conversation_id, history = load_history(payload)
+        if history is None:
+            return ({'error': 'Invalid conversation_id'}, 400, {}), None
+        return None, (conversation_id, history)
+
+    def finish_chat(conversation_id, user_message, chat_response):
+        if isinstance(chat_response, dict) and 'error' in chat_response:
+            app.logger.error(f"Chat response error: {chat_response['error']}")
+            return {'error': chat_response['error']}, 500, {}
+
+        remember(conversation_id, user_message, chat_response)
+        return {'response': chat_response, 'conversation_id': conversation_id}, 200, {}
 
     # Handle chat messages via POST requests
     @app.route('/chat', methods=['POST'])
     def chat():
-        nonlocal first_request_time, request_count
         payload = request.json
         user_message = payload.get('message')
-        history = payload.get('history', [])
-        
-        if not user_message:
-            return jsonify({'error': 'No message provided'}), 400
-
-        # Check rate limit
-        current_time = time.time()
-        if first_request_time is None or current_time - first_request_time > int(os.getenv('RATE_LIMIT_WINDOW', 3600)):
-            first_request_time = current_time
-            request_count = 0
-        if request_count >= app.config['RATE_LIMIT_REQUESTS']:
-            return jsonify({'response': "וואו, אני עייף. בוא נדבר עוד שעה ככה... בסדר?"})
-        request_count += 1
-
-        # Limit history
-        history_limit = app.config['HISTORY_LIMIT']
-        if history_limit % 2 != 0:
-            history_limit -= 1
-        if history:
-            if history[-1]['role'] == 'assistant':
-                history = history[-history_limit:]
-            else:
-                history = history[-(history_limit-1):]
-                if history and history[0]['role'] != 'user':
-                    history = history[1:]  # Ensure the first message is from the user
+        reply, started = start_chat(payload, client_address())
+        if reply:
+            body, status, headers = reply
+            return jsonify(body), status, headers
+        conversation_id, history = started
 
         try:
             # Call get_chat_response with both user_message and history
-            chat_response = chatbot.get_chat_response(user_message, history)
+            with span('chat.response', bot=chatbot_name, mode='sync'):
+                chat_response = chatbot.get_chat_response(user_message, history, **session_kwargs(conversation_id))
         except Exception as e:
             app.logger.error(f"Error in chatbot.get_chat_response: {str(e)}")
             return jsonify({'error': 'An error occurred while processing your request'}), 500
 
-        if isinstance(chat_response, dict) and 'error' in chat_response:
-            app.logger.error(f"Chat response error: {chat_response['error']}")
-            return jsonify({'error': chat_response['error']}), 500
+        body, status, headers = finish_chat(conversation_id, user_message, chat_response)
+        return jsonify(body), status, headers
+
+    async def achat(payload, address):
+        """
+        /chat for bots with aget_chat_response when served by asgi.py. The bot's LLM and
+        tool calls are awaited on the server's event loop, so no thread waits on them;
+        the history and rate-limit bookkeeping is blocking and runs in worker threads.
+        Returns (body, status, headers).
+        """
+        user_message = payload.get('message')
+        reply, started = await asyncio.to_thread(start_chat, payload, address)
+        if reply:
+            return reply
+        conversation_id, history = started
+        conversation_id_var.set(conversation_id)
+
+        try:
+            with app.app_context(), span('chat.response', bot=chatbot_name, mode='async'):
+                chat_response = await chatbot.aget_chat_response(user_message, history)
+        except Exception as e:
+            app.logger.error(f"Error in chatbot.aget_chat_response: {str(e)}")
+            return {'error': 'An error occurred while processing your request'}, 500, {}
+
+        return await asyncio.to_thread(finish_chat, conversation_id, user_message, chat_response)
+
+    if hasattr(chatbot, 'aget_chat_response'):
+        app.config['ASYNC_CHAT'] = achat
+
+    def sse_event(event):
+        return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    # Stream the reply as Server-Sent Events: text deltas, tool progress, then done or error
+    @app.route('/chat/stream', methods=['POST'])
+    def chat_stream():
+        payload = request.json
+        user_message = payload.get('message')
+
+        if not user_message:
+            return jsonify({'error': 'No message provided'}), 400
 
-        return jsonify({'response': chat_response})
+        conversation_id, history = load_history(payload)
+        if history is None:
+            return jsonify({'error': 'Invalid conversation_id'}), 400
+
+        # Refused before the stream opens, so a limited client sees the same 429 as /chat
+        rate_limit = check_rate_limit(payload, client_address())
+        if not rate_limit.allowed:
+            return jsonify({'response': rate_limit_message}), 429, rate_limit_headers(rate_limit)
+
+        if hasattr(chatbot, 'stream_chat_response'):
+            events = chatbot.stream_chat_response(user_message, history)
+        else:
+            # Bots without a streaming path answer in one piece
+            def events_from_full_response():
+                chat_response = chatbot.get_chat_response(user_message, history, **session_kwargs(conversation_id))
+                if isinstance(chat_response, dict) and 'error' in chat_response:
+                    yield {'type': 'error', 'error': chat_response['error']}
+                else:
+                    yield {'type': 'done', 'response': chat_response}
+            events = events_from_full_response()
+
+        def generate():
+            # Timed without a span: one cannot stay open across the yields below
+            started = time.perf_counter()
+            first_event = True
+            try:
+                for event in events:
+                    if first_event:
+                        registry.observe('chat_stream_first_event_seconds', time.perf_counter() - started, bot=chatbot_name)
+                        first_event = False
+                    if event['type'] == 'error':
+                        app.logger.error(f"Chat stream error: {event['error']}")
+                    elif event['type'] == 'done':
+                        remember(conversation_id, user_message, event['response'])
+                        event = {**event, 'conversation_id': conversation_id}
+                    yield sse_event(event)
+            except Exception as e:
+                app.logger.error(f"Error in chat stream: {str(e)}")
+                yield sse_event({'type': 'error', 'error': 'An error occurred while processing your request'})
+            finally:
+                registry.observe('chat_stream_duration_seconds', time.perf_counter() - started, bot=chatbot_name)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **rate_limit_headers(rate_limit)})
+
+    @app.route('/chat/conversation/<conversation_id>', methods=['DELETE'])
+    def delete_conversation(conversation_id):
+        conversation_id = normalize_conversation_id(conversation_id)
+        if conversation_id is None:
+            return jsonify({'error': 'Invalid conversation_id'}), 400
+        conversation_store.clear(conversation_id)
+        history_compactor.forget(conversation_id)
+        if isinstance(chatbot, BaseChatBot):
+            chatbot.reset_chat_history(conversation_id)
+        return jsonify({'message': 'Conversation cleared'})
+
+    # Status of the background ingestion jobs, newest first, for the dashboard to poll
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        return jsonify(ingestion_jobs.list(limit))
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = ingestion_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+
+    # Latency summaries, token counters and cache stats in the Prometheus text format
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
     @app.route('/get_current_personality', methods=['GET'])
     def get_current_personality():
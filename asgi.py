@@ -0,0 +1,92 @@
+"""
+ASGI entry point, for serving chats without holding a thread per request:
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+POST /chat runs as a coroutine on the worker's event loop when the bot has an
+async path (aget_chat_response), so one worker keeps hundreds of conversations
+in flight while they wait on the LLM, tools and retrieval. Every other route,
+and /chat for bots without an async path, goes to the Flask app through
+asgiref's WSGI adapter, which runs it in a thread pool as gunicorn's threads would.
+"""
+import os
+import json
+import time
+import uuid
+from asgiref.wsgi import WsgiToAsgi
+from app import create_app
+from bots.tools.metrics import registry, start_trace
+from logging_config import request_id_var, conversation_id_var
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+
+# The largest /chat body read; anything longer is refused before it is parsed
+MAX_CHAT_BODY_BYTES = int(os.getenv('MAX_CHAT_BODY_BYTES', 1024 * 1024))
+
+
+async def app(scope, receive, send):
+    achat = flask_app.config.get('ASYNC_CHAT')
+    if achat is None or scope['type'] != 'http' or scope['path'] != '/chat' or scope['method'] != 'POST':
+        await wsgi_app(scope, receive, send)
+        return
+
+    # What the Flask before_request and after_request hooks do for the other routes
+    started = time.perf_counter()
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    request_id = headers.get('x-request-id') or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    conversation_id_var.set(None)
+    start_trace(request_id)
+
+    body = await read_body(receive)
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = None
+    if body is None:
+        reply = ({'error': 'Request body too large'}, 413, {})
+    elif not isinstance(payload, dict):
+        reply = ({'error': 'Request body must be a JSON object'}, 400, {})
+    else:
+        try:
+            reply = await achat(payload, client_address(scope, headers))
+        except Exception as e:
+            flask_app.logger.exception(f"Error in async chat: {str(e)}")
+            reply = ({'error': 'An error occurred while processing your request'}, 500, {})
+
+    response_body, status, response_headers = reply
+    await send_json(send, response_body, status, {**response_headers, 'X-Request-ID': request_id})
+    registry.observe('http_request_duration_seconds', time.perf_counter() - started,
+                     endpoint='chat', method='POST', status=status)
+
+
+async def read_body(receive):
+    """The request body, or None if it is longer than MAX_CHAT_BODY_BYTES."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return b''
+        chunks.append(message.get('body', b''))
+        size += len(chunks[-1])
+        if size > MAX_CHAT_BODY_BYTES:
+            return None
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def client_address(scope, headers):
+    # Same rule as the Flask view: the first X-Forwarded-For hop only when the proxy is trusted
+    forwarded = headers.get('x-forwarded-for')
+    if flask_app.config['RATE_LIMIT_TRUST_PROXY'] and forwarded:
+        return forwarded.split(',')[0].strip()
+    return scope['client'][0] if scope.get('client') else None
+
+
+async def send_json(send, body, status, headers):
+    data = json.dumps(body).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode('latin-1'))]
+    raw_headers += [(str(name).lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': data})
@@ -0,0 +1,87 @@
+"""
+Recall and latency of the ANN index types VectorDB can use, measured against exact search.
+
+Run from the repository root:
+
+    python bench/ann_recall.py --vectors 200000 --dimension 1024
+
+Vectors are synthetic and clustered so the numbers resemble real embeddings more
+than uniform noise would. Recall@k is the share of the exact top-k that each
+index returns; latency is per query, averaged over one batched search.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bots.tools.ann_index import AnnIndexFactory
+
+
+def make_vectors(count, dimension, clusters, rng):
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return AnnIndexFactory.normalize(vectors)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dimension', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=100, help="matches VectorDB.INITIAL_SEARCH_K")
+    parser.add_argument('--types', default='ivf_flat,hnsw,ivf_pq')
+    parser.add_argument('--nprobe', default='4,8,16,32,64')
+    parser.add_argument('--ef-search', default='32,64,128,256')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(args.vectors, args.dimension, max(1, args.vectors // 500), rng)
+    queries = AnnIndexFactory.normalize(vectors[rng.choice(len(vectors), args.queries, replace=False)]
+                                        + 0.1 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32))
+    ids = np.arange(len(vectors), dtype=np.int64)
+
+    exact = AnnIndexFactory(index_type='flat').create(args.dimension, len(vectors))
+    exact.add_with_ids(vectors, ids)
+    truth, exact_ms = timed_search(exact, queries, args.k)
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'ms/query':>9} {'recall@' + str(args.k):>10}")
+    print(f"{'flat':<10} {'-':<14} {'-':>8} {exact_ms:>9.3f} {1.0:>10.3f}")
+
+    for index_type in args.types.split(','):
+        factory = AnnIndexFactory(index_type=index_type, train_threshold=0)
+        start = time.perf_counter()
+        index = factory.create(args.dimension, len(vectors), factory.training_sample(vectors))
+        factory.add(index, vectors, ids)
+        build_seconds = time.perf_counter() - start
+
+        if factory.is_ivf(index):
+            sweep = [('nprobe', value) for value in map(int, args.nprobe.split(','))]
+        elif factory.index_type_of(index) == 'hnsw':
+            sweep = [('efSearch', value) for value in map(int, args.ef_search.split(','))]
+        else:
+            sweep = [('-', None)]
+        for name, value in sweep:
+            factory.nprobe = factory.ef_search = value
+            factory.set_search_params(index)
+            found, ms = timed_search(index, queries, args.k)
+            label = f"{name}={value}" if value is not None else name
+            print(f"{factory.index_type_of(index):<10} {label:<14} {build_seconds:>8.1f} {ms:>9.3f} "
+                  f"{recall_at_k(found, truth):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
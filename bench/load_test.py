@@ -0,0 +1,333 @@
+"""
+Load test the chat endpoints of each bot against local mock providers, without network access.
+
+Run from the repository root:
+
+    python bench/load_test.py --bots omnibot --workers 2 --concurrency 8 --profile fast
+    python bench/load_test.py --bots all --stream --baseline bench/results/previous.json
+    python bench/load_test.py --compare bench/results/old.json bench/results/new.json
+
+bench/mock_providers.py is started in this process and every SDK is pointed at it.
+Each worker is a fresh process that builds the bot with create_app() and replays its
+share of the workload through Flask's test client from --concurrency threads, so
+the numbers cover our own request handling plus the simulated provider latency, but
+no HTTP server in front. A conversation's turns run in order and reuse the
+conversation_id the server hands back.
+
+The workload is a JSONL file with one message per line: "message" (or "title" or
+"body", so requests.jsonl replays as is), and optionally "conversation" to group
+turns; otherwise every --turns consecutive lines form one conversation.
+
+Per bot the report has throughput, latency quantiles (and time to first event with
+--stream), and per worker its startup time, CPU seconds and utilization, peak RSS
+and the span latencies from bots/tools/metrics.py. Results are saved as JSON under
+bench/results/ for comparison with a later run.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import threading
+import multiprocessing
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_providers import MockProviders, load_profile
+
+DEFAULT_WORKLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workloads', 'chat.jsonl')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def load_workload(path, turns):
+    """Conversations (lists of messages) in file order."""
+    conversations = {}
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            message = entry.get('message') or entry.get('title') or entry.get('body')
+            if not message:
+                continue
+            key = entry.get('conversation', line_number // max(1, turns))
+            conversations.setdefault(key, []).append(message)
+    return list(conversations.values())
+
+
+def available_bots():
+    bots_dir = os.path.join(REPO_ROOT, 'bots')
+    return sorted(name for name in os.listdir(bots_dir)
+                  if os.path.isfile(os.path.join(bots_dir, name, 'chatbot.py')))
+
+
+def quantiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+    return {'p50': at(0.5), 'p95': at(0.95), 'p99': at(0.99), 'max': round(values[-1] * 1000, 2),
+            'mean': round(sum(values) / len(values) * 1000, 2)}
+
+
+def _rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _send(client, message, conversation_id, stream):
+    """One chat turn. Returns (ok, conversation_id, seconds to the first event or None)."""
+    payload = {'message': message}
+    if conversation_id:
+        payload['conversation_id'] = conversation_id
+    started = time.perf_counter()
+    if not stream:
+        response = client.post('/chat', json=payload)
+        body = response.get_json(silent=True) or {}
+        return response.status_code == 200, body.get('conversation_id'), None
+
+    response = client.post('/chat/stream', json=payload, buffered=False)
+    first_event = None
+    text = b''
+    for chunk in response.response:
+        if first_event is None:
+            first_event = time.perf_counter() - started
+        text += chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+    response.close()
+    done = None
+    for line in text.decode('utf-8').splitlines():
+        if line.startswith('data: '):
+            event = json.loads(line[len('data: '):])
+            if event.get('type') in ('done', 'error'):
+                done = event
+    ok = response.status_code == 200 and done is not None and done['type'] == 'done'
+    return ok, (done or {}).get('conversation_id'), first_event
+
+
+def run_worker(bot, worker_index, conversations, options, environment, results):
+    """Entry point of one worker process."""
+    os.chdir(REPO_ROOT)
+    os.environ.update(environment)
+    os.environ['CHATBOT_NAME'] = bot
+    try:
+        started = time.perf_counter()
+        from app import create_app
+        app = create_app()
+        startup_seconds = time.perf_counter() - started
+    except BaseException as e:
+        results.put({'worker': worker_index, 'error': f"create_app failed: {e!r}"})
+        return
+    from bots.tools.metrics import registry
+
+    latencies, first_events, errors = [], [], []
+    lock = threading.Lock()
+    # Warm-up replays the first conversations once, unmeasured, to fill caches and connection pools
+    queue = list(conversations[:options['warmup']])
+
+    def next_conversation():
+        with lock:
+            return queue.pop(0) if queue else None
+
+    def drive(warmup):
+        client = app.test_client()
+        while True:
+            conversation = next_conversation()
+            if conversation is None:
+                return
+            conversation_id = None
+            for message in conversation:
+                started = time.perf_counter()
+                failure = 'request failed'
+                try:
+                    ok, conversation_id, first_event = _send(client, message, conversation_id, options['stream'])
+                except Exception as e:
+                    ok, first_event, failure = False, None, repr(e)
+                seconds = time.perf_counter() - started
+                if warmup:
+                    continue
+                with lock:
+                    latencies.append(seconds)
+                    if first_event is not None:
+                        first_events.append(first_event)
+                    if not ok:
+                        errors.append(failure)
+
+    drive(True)
+    queue = list(conversations)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_started = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(False,)) for _ in range(options['concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - wall_started
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+
+    results.put({
+        'worker': worker_index,
+        'pid': os.getpid(),
+        'startup_seconds': round(startup_seconds, 3),
+        'wall_seconds': wall_seconds,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'cpu_seconds': round(cpu_seconds, 3),
+        'cpu_utilization': round(cpu_seconds / wall_seconds, 3) if wall_seconds else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        'max_rss_mb': round(usage_after.ru_maxrss / 1024, 1),
+        'rss_mb': round(_rss_mb(), 1),
+        'spans': registry.stats(),
+        'latencies': latencies,
+        'first_events': first_events,
+    })
+
+
+def run_bot(bot, conversations, options, environment):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    shares = [conversations[i::options['workers']] for i in range(options['workers'])]
+    processes = [context.Process(target=run_worker, args=(bot, i, share, options, environment, results))
+                 for i, share in enumerate(shares)]
+    for process in processes:
+        process.start()
+    workers = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    failed = [worker['error'] for worker in workers if 'error' in worker]
+    if failed:
+        return {'ok': False, 'error': failed[0]}
+    latencies = [seconds for worker in workers for seconds in worker.pop('latencies')]
+    first_events = [seconds for worker in workers for seconds in worker.pop('first_events')]
+    wall_seconds = max(worker['wall_seconds'] for worker in workers)
+    return {
+        'ok': True,
+        'requests': len(latencies),
+        'errors': sum(worker['errors'] for worker in workers),
+        'throughput_rps': round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        'latency_ms': quantiles(latencies),
+        'first_event_ms': quantiles(first_events),
+        'workers': sorted(workers, key=lambda worker: worker['worker']),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(run):
+    print(f"\n{'bot':<26}{'req':>6}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cpu %':>8}{'rss MB':>9}")
+    for bot, result in run['bots'].items():
+        if not result['ok']:
+            print(f"{bot:<26}  {result['error'][:90]}")
+            continue
+        latency = result['latency_ms'] or {}
+        workers = result['workers']
+        cpu = sum(worker['cpu_utilization'] for worker in workers) / len(workers) * 100
+        rss = max(worker['max_rss_mb'] for worker in workers)
+        print(f"{bot:<26}{result['requests']:>6}{result['errors']:>6}{result['throughput_rps']:>9}"
+              f"{latency.get('p50', 0):>10}{latency.get('p95', 0):>10}{latency.get('p99', 0):>10}{cpu:>8.1f}{rss:>9}")
+
+
+def print_comparison(baseline, current):
+    print(f"\nCompared with {baseline.get('created')} ({baseline.get('git_commit')}):")
+    for bot, result in current['bots'].items():
+        before = baseline.get('bots', {}).get(bot)
+        if not result['ok'] or not before or not before.get('ok'):
+            continue
+
+        def change(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"  {bot:<24} throughput {change(result['throughput_rps'], before['throughput_rps']):>8}"
+              f"   p95 {change(result['latency_ms']['p95'], before['latency_ms']['p95']):>8}"
+              f"   p99 {change(result['latency_ms']['p99'], before['latency_ms']['p99']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bots', default='omnibot', help="comma-separated bot names, or 'all'")
+    parser.add_argument('--workload', default=DEFAULT_WORKLOAD)
+    parser.add_argument('--turns', type=int, default=3, help="turns per conversation when lines have no 'conversation'")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the workload this many times")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes per bot")
+    parser.add_argument('--concurrency', type=int, default=4, help="concurrent conversations per worker")
+    parser.add_argument('--warmup', type=int, default=1, help="unmeasured conversations per worker")
+    parser.add_argument('--stream', action='store_true', help="use /chat/stream instead of /chat")
+    parser.add_argument('--profile', default='fast', help="mock latency profile: instant, fast, realistic or a JSON file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra environment for the workers, e.g. --env HISTORY_TOKEN_BUDGET=2000")
+    parser.add_argument('--output', help="where to save the run (default bench/results/<timestamp>.json)")
+    parser.add_argument('--baseline', help="a saved run to compare this one with")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="only compare two saved runs")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            print_comparison(json.load(old), json.load(new))
+        return
+
+    bots = available_bots() if args.bots == 'all' else args.bots.split(',')
+    conversations = load_workload(args.workload, args.turns) * args.repeat
+    options = {'workers': args.workers, 'concurrency': args.concurrency, 'warmup': args.warmup, 'stream': args.stream}
+
+    profile = load_profile(args.profile)
+    mock = MockProviders(profile=profile, seed=args.seed)
+    mock.start()
+    scratch = os.path.join(RESULTS_DIR, 'scratch')
+    os.makedirs(scratch, exist_ok=True)
+    environment = {
+        **mock.environment(),
+        # Keep the rate limiter from shaping the numbers
+        'RATE_LIMIT_REQUESTS': '1000000000',
+        'LOG_FILE': os.path.join(scratch, 'app.log'),
+        'LOG_LEVEL': 'WARNING',
+        'TRACE_FILE': '',
+        **dict(item.split('=', 1) for item in args.env),
+    }
+
+    run = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'options': {**options, 'workload': os.path.relpath(args.workload, REPO_ROOT), 'turns': args.turns,
+                    'repeat': args.repeat, 'conversations': len(conversations),
+                    'messages': sum(len(conversation) for conversation in conversations), 'env': args.env},
+        'profile': profile,
+        'bots': {},
+    }
+    for bot in bots:
+        print(f"Running {bot}...", flush=True)
+        run['bots'][bot] = run_bot(bot, conversations, options, environment)
+    run['mock_requests'] = mock.requests
+    mock.shutdown()
+
+    print_report(run)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(json.load(f), run)
+
+
+if __name__ == '__main__':
+    main()
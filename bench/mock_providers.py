@@ -0,0 +1,420 @@
+"""
+Local stand-ins for the provider APIs the bots call, so load tests run without network access.
+
+Run from the repository root:
+
+    python bench/mock_providers.py --port 8765 --profile realistic
+
+and point the SDKs at it (bench/load_test.py does this for you):
+
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765   Anthropic Messages, JSON and streaming
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1   chat completions, images, speech, transcriptions
+    GROQ_BASE_URL=http://127.0.0.1:8765        chat completions and Whisper transcriptions
+    CO_API_URL=http://127.0.0.1:8765/v1        Cohere embed, rerank and chat
+    REPLICATE_BASE_URL=http://127.0.0.1:8765   predictions that succeed on creation
+
+Latency follows a profile: a time to first token, then output at a token rate, plus
+fixed costs for embed, rerank, image and audio calls, each with some jitter. When a
+request offers tools, a share of first rounds (tool_rate) answers with a tool call
+built from the tool's schema, so tool loops and RAG lookups get exercised too. A
+repeated system prompt and tool list is reported as a prompt cache read.
+Pexels, Shutterstock, Stability, Leonardo and the OpenAI Assistants API are not mocked.
+"""
+import re
+import json
+import time
+import uuid
+import random
+import struct
+import zlib
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFILES = {
+    'instant': {
+        'first_token_ms': 0, 'tokens_per_second': 0, 'output_tokens': 40, 'embed_ms': 0, 'rerank_ms': 0,
+        'image_ms': 0, 'audio_ms': 0, 'jitter': 0.0, 'tool_rate': 0.3, 'embed_dimension': 1024
+    },
+    'fast': {
+        'first_token_ms': 150, 'tokens_per_second': 250, 'output_tokens': 60, 'embed_ms': 30, 'rerank_ms': 40,
+        'image_ms': 400, 'audio_ms': 200, 'jitter': 0.2, 'tool_rate': 0.3, 'embed_dimension': 1024
+    },
+    'realistic': {
+        'first_token_ms': 700, 'tokens_per_second': 60, 'output_tokens': 120, 'embed_ms': 150, 'rerank_ms': 200,
+        'image_ms': 3000, 'audio_ms': 900, 'jitter': 0.3, 'tool_rate': 0.3, 'embed_dimension': 1024
+    },
+}
+
+WORDS = ("the quick brown fox jumps over a lazy dog while the assistant keeps answering short "
+         "friendly sentences about images knowledge personas and whatever else the user asked").split()
+
+
+def load_profile(name_or_path):
+    if name_or_path in PROFILES:
+        return dict(PROFILES[name_or_path])
+    with open(name_or_path) as f:
+        # A profile file only needs the fields it changes
+        return {**PROFILES['realistic'], **json.load(f)}
+
+
+def _png():
+    # A 1x1 white PNG, enough for code that downloads and saves the generated image
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b'\x00\xff\xff\xff')) + chunk(b'IEND', b''))
+
+
+PNG = _png()
+
+
+def schema_example(schema):
+    """The smallest value that satisfies a JSON schema, for mock tool calls."""
+    kind = schema.get('type')
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if kind == 'object':
+        properties = schema.get('properties', {})
+        return {name: schema_example(properties.get(name, {})) for name in schema.get('required', properties)}
+    if kind == 'array':
+        return [schema_example(schema.get('items', {'type': 'string'}))]
+    if kind in ('integer', 'number'):
+        return schema.get('minimum', 0)
+    if kind == 'boolean':
+        return False
+    return "benchmark"
+
+
+class MockProviders(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), profile=None, seed=0):
+        super().__init__(address, MockHandler)
+        self.profile = profile or dict(PROFILES['fast'])
+        self.random = random.Random(seed)
+        self.cached_prefixes = set()
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="mock-providers", daemon=True)
+        thread.start()
+        return thread
+
+    def environment(self):
+        """Environment that points every supported SDK at this server, with placeholder keys."""
+        return {
+            'ANTHROPIC_BASE_URL': self.url,
+            'OPENAI_BASE_URL': f"{self.url}/v1",
+            'GROQ_BASE_URL': self.url,
+            'CO_API_URL': f"{self.url}/v1",
+            'REPLICATE_BASE_URL': self.url,
+            'ANTHROPIC_API_KEY': 'bench',
+            'OPENAI_API_KEY': 'bench',
+            'GROQ_API_KEY': 'bench',
+            'COHERE_API_KEY': 'bench',
+            'REPLICATE_API_TOKEN': 'bench',
+        }
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def jittered(self, milliseconds):
+        with self.lock:
+            factor = 1 + self.profile['jitter'] * (2 * self.random.random() - 1)
+        return max(0.0, milliseconds * factor / 1000)
+
+    def chance(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def token_delay(self):
+        tokens_per_second = self.profile['tokens_per_second']
+        return 1 / tokens_per_second if tokens_per_second else 0.0
+
+    def reply_words(self):
+        with self.lock:
+            return [self.random.choice(WORDS) for _ in range(self.profile['output_tokens'])]
+
+    def is_cached(self, prefix):
+        key = hashlib.sha1(prefix.encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.cached_prefixes:
+                return True
+            self.cached_prefixes.add(key)
+            return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- plumbing ---
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Type', '').startswith('application/json') and raw:
+            return json.loads(raw)
+        return raw
+
+    def _send(self, status, payload, content_type='application/json'):
+        body = json.dumps(payload).encode('utf-8') if content_type == 'application/json' else payload
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, data, event=None):
+        head = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{head}data: {json.dumps(data) if not isinstance(data, str) else data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/images/'):
+            server.count('image_download')
+            return self._send(200, PNG, 'image/png')
+        match = re.match(r'.*/v1/predictions/([\w-]+)$', self.path)
+        if match:
+            server.count('replicate')
+            return self._send(200, self._prediction(match.group(1), {}))
+        self._send(404, {'error': f"Not mocked: GET {self.path}"})
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        routes = [
+            (r'/v1/messages$', self._anthropic),
+            (r'/chat/completions$', self._openai_chat),
+            (r'/audio/transcriptions$', self._transcription),
+            (r'/audio/speech$', self._speech),
+            (r'/images/generations$', self._image),
+            (r'/v1/embed$', self._cohere_embed),
+            (r'/v1/rerank$', self._cohere_rerank),
+            (r'/v1/chat$', self._cohere_chat),
+            (r'/predictions$', self._replicate),
+        ]
+        for pattern, handle in routes:
+            if re.search(pattern, path):
+                return handle(self._body())
+        self._send(404, {'error': f"Not mocked: POST {path}"})
+
+    # --- Anthropic ---
+
+    def _anthropic(self, request):
+        server = self.server
+        server.count('anthropic')
+        input_tokens = len(json.dumps(request)) // 4
+        prefix = json.dumps([request.get('system'), request.get('tools')], sort_keys=True)
+        prefix_tokens = len(prefix) // 4
+        cached = server.is_cached(prefix)
+        usage = {
+            'input_tokens': input_tokens - prefix_tokens,
+            'cache_creation_input_tokens': 0 if cached else prefix_tokens,
+            'cache_read_input_tokens': prefix_tokens if cached else 0,
+            'output_tokens': 0
+        }
+        message = {
+            'id': f"msg_{uuid.uuid4().hex[:24]}", 'type': 'message', 'role': 'assistant',
+            'model': request.get('model', 'mock'), 'content': [], 'stop_reason': None, 'stop_sequence': None,
+            'usage': usage
+        }
+        tool = self._pick_tool(request, last_is_tool_result=self._anthropic_tool_round(request))
+        words = [] if tool else server.reply_words()
+        usage['output_tokens'] = len(words) or 20
+        time.sleep(server.jittered(server.profile['first_token_ms']))
+
+        if not request.get('stream'):
+            time.sleep(server.token_delay() * len(words))
+            message['content'] = [self._anthropic_tool_block(tool)] if tool else [{'type': 'text', 'text': ' '.join(words)}]
+            message['stop_reason'] = 'tool_use' if tool else 'end_turn'
+            return self._send(200, message)
+
+        self._start_events()
+        self._event({'type': 'message_start', 'message': {**message, 'usage': {**usage, 'output_tokens': 1}}}, 'message_start')
+        if tool:
+            block = self._anthropic_tool_block(tool)
+            self._event({'type': 'content_block_start', 'index': 0, 'content_block': {**block, 'input': {}}}, 'content_block_start')
+            self._event({'type': 'content_block_delta', 'index': 0,
+                         'delta': {'type': 'input_json_delta', 'partial_json': json.dumps(block['input'])}}, 'content_block_delta')
+        else:
+            self._event({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}}, 'content_block_start')
+            for i, word in enumerate(words):
+                time.sleep(server.token_delay())
+                self._event({'type': 'content_block_delta', 'index': 0,
+                             'delta': {'type': 'text_delta', 'text': word if i == 0 else ' ' + word}}, 'content_block_delta')
+        self._event({'type': 'content_block_stop', 'index': 0}, 'content_block_stop')
+        self._event({'type': 'message_delta', 'delta': {'stop_reason': 'tool_use' if tool else 'end_turn', 'stop_sequence': None},
+                     'usage': {'output_tokens': usage['output_tokens']}}, 'message_delta')
+        self._event({'type': 'message_stop'}, 'message_stop')
+
+    @staticmethod
+    def _anthropic_tool_round(request):
+        content = (request.get('messages') or [{}])[-1].get('content')
+        return isinstance(content, list) and any(block.get('type') == 'tool_result' for block in content)
+
+    @staticmethod
+    def _anthropic_tool_block(tool):
+        return {'type': 'tool_use', 'id': f"toolu_{uuid.uuid4().hex[:24]}", 'name': tool['name'],
+                'input': schema_example(tool.get('input_schema', {}))}
+
+    def _pick_tool(self, request, last_is_tool_result):
+        tools = request.get('tools') or []
+        if not tools or last_is_tool_result or not self.server.chance(self.server.profile['tool_rate']):
+            return None
+        with self.server.lock:
+            return self.server.random.choice(tools)
+
+    # --- OpenAI and Groq ---
+
+    def _openai_chat(self, request):
+        server = self.server
+        server.count('openai_chat')
+        messages = request.get('messages') or [{}]
+        tool = self._pick_tool(request, last_is_tool_result=messages[-1].get('role') in ('tool', 'function'))
+        function = tool.get('function', tool) if tool else None
+        words = [] if tool else server.reply_words()
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        usage = {'prompt_tokens': len(json.dumps(messages)) // 4, 'completion_tokens': len(words) or 20}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        time.sleep(server.jittered(server.profile['first_token_ms']))
+
+        if tool:
+            message = {'role': 'assistant', 'content': None, 'tool_calls': [{
+                'id': f"call_{uuid.uuid4().hex[:24]}", 'type': 'function',
+                'function': {'name': function['name'], 'arguments': json.dumps(schema_example(function.get('parameters', {})))}
+            }]}
+        else:
+            message = {'role': 'assistant', 'content': ' '.join(words)}
+        finish_reason = 'tool_calls' if tool else 'stop'
+
+        if not request.get('stream'):
+            time.sleep(server.token_delay() * len(words))
+            return self._send(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': request.get('model', 'mock'),
+                'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}],
+                'usage': usage
+            })
+
+        self._start_events()
+        chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': request.get('model', 'mock')}
+        deltas = [{'role': 'assistant', **({'tool_calls': [{'index': 0, **message['tool_calls'][0]}]} if tool else {'content': ''})}]
+        for i, word in enumerate(words):
+            deltas.append({'content': word if i == 0 else ' ' + word})
+        for delta in deltas:
+            time.sleep(server.token_delay())
+            self._event({**chunk, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        self._event({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]})
+        self._event('[DONE]')
+
+    def _transcription(self, request):
+        self.server.count('transcription')
+        time.sleep(self.server.jittered(self.server.profile['audio_ms']))
+        self._send(200, {'text': ' '.join(self.server.reply_words()[:12])})
+
+    def _speech(self, request):
+        self.server.count('speech')
+        time.sleep(self.server.jittered(self.server.profile['audio_ms']))
+        # Not a playable MP3, just bytes of a plausible size for one short reply
+        self._send(200, b'\xff\xfb\x90\x00' * 4096, 'audio/mpeg')
+
+    def _image(self, request):
+        self.server.count('image')
+        time.sleep(self.server.jittered(self.server.profile['image_ms']))
+        self._send(200, {'created': int(time.time()), 'data': [{'url': f"{self.server.url}/images/{uuid.uuid4().hex}.png",
+                                                                 'revised_prompt': request.get('prompt')}]})
+
+    # --- Cohere ---
+
+    def _embedding(self, text):
+        # Deterministic per text, so cached and fresh embeddings of a text agree
+        rng = random.Random(hashlib.sha1(text.encode('utf-8')).digest())
+        vector = [rng.gauss(0, 1) for _ in range(self.server.profile['embed_dimension'])]
+        norm = sum(value * value for value in vector) ** 0.5
+        return [round(value / norm, 6) for value in vector]
+
+    def _cohere_embed(self, request):
+        self.server.count('cohere_embed')
+        time.sleep(self.server.jittered(self.server.profile['embed_ms']))
+        texts = request.get('texts', [])
+        self._send(200, {'id': uuid.uuid4().hex, 'response_type': 'embeddings_floats', 'texts': texts,
+                         'embeddings': [self._embedding(text) for text in texts],
+                         'meta': {'api_version': {'version': '1'}, 'billed_units': {'input_tokens': sum(len(t) // 4 for t in texts)}}})
+
+    def _cohere_rerank(self, request):
+        self.server.count('cohere_rerank')
+        time.sleep(self.server.jittered(self.server.profile['rerank_ms']))
+        documents = request.get('documents', [])
+        query_words = set(request.get('query', '').lower().split())
+        scores = []
+        for index, document in enumerate(documents):
+            text = document if isinstance(document, str) else document.get('text', '')
+            overlap = len(query_words & set(text.lower().split()))
+            scores.append((overlap / (len(query_words) or 1), index))
+        scores.sort(reverse=True)
+        top_n = request.get('top_n') or len(documents)
+        self._send(200, {'id': uuid.uuid4().hex,
+                         'results': [{'index': index, 'relevance_score': score} for score, index in scores[:top_n]],
+                         'meta': {'api_version': {'version': '1'}, 'billed_units': {'search_units': 1}}})
+
+    def _cohere_chat(self, request):
+        self.server.count('cohere_chat')
+        words = self.server.reply_words()
+        time.sleep(self.server.jittered(self.server.profile['first_token_ms']) + self.server.token_delay() * len(words))
+        self._send(200, {'text': ' '.join(words), 'generation_id': uuid.uuid4().hex, 'finish_reason': 'COMPLETE',
+                         'chat_history': [], 'meta': {'api_version': {'version': '1'}}})
+
+    # --- Replicate ---
+
+    def _prediction(self, prediction_id, request):
+        return {'id': prediction_id, 'status': 'succeeded', 'version': request.get('version', 'mock'),
+                'input': request.get('input', {}), 'output': [f"{self.server.url}/images/{prediction_id}.png"],
+                'error': None, 'logs': '', 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'urls': {'get': f"{self.server.url}/v1/predictions/{prediction_id}",
+                         'cancel': f"{self.server.url}/v1/predictions/{prediction_id}/cancel"}}
+
+    def _replicate(self, request):
+        self.server.count('replicate')
+        time.sleep(self.server.jittered(self.server.profile['image_ms']))
+        self._send(201, self._prediction(uuid.uuid4().hex[:16], request if isinstance(request, dict) else {}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', default='realistic', help=f"one of {', '.join(PROFILES)} or a JSON file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockProviders((args.host, args.port), load_profile(args.profile), args.seed)
+    print(f"Mock providers on {server.url}")
+    for key, value in server.environment().items():
+        print(f"export {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""
+Micro-benchmarks for the RAG engine: parsing, chunking, embedding, index build and search.
+
+Run from the repository root:
+
+    python bench/rag_bench.py --sizes 1000,10000,100000
+    python bench/rag_bench.py --impl mochi --index-type hnsw --sizes 1000000 --dimension 256
+    python bench/rag_bench.py --stages corpus --index-type ivf_pq --train-threshold 0 --sizes 20000
+
+Embeddings and reranking come from a deterministic fake Cohere client, so only our
+own code is measured (add --embed-latency-ms / --rerank-latency-ms to simulate the
+provider). Fake vectors are drawn around topic centers, so nearest neighbours are
+meaningful and the IVF/PQ indexes train on realistic structure.
+
+Stages:
+
+- parse:  VectorDB._load_files on a generated document of --doc-words words per
+          format (txt, docx, pdf), and the cohere bot's extract_text_from_docx;
+          --env PARSE_WORKERS=1 compares against parsing in the calling thread
+- chunk:  VectorDB._split_text and the cohere bot's chunk_text on the same text
+- embed:  VectorDB._create_embeddings (EmbeddingPipeline batching plus the
+          embedding cache) for --embed-chunks chunks, cold and then cached
+- corpus: for each of --sizes chunks, appending to the embedding store, building
+          the FAISS index the way VectorDB does, writing it, the on-disk size,
+          search latency with and without rerank, and the _rerank glue alone
+
+Every stage runs in a fresh process, so its peak RSS is its own. Results print as
+tables and are saved as JSON under bench/results/ (or --output).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import types
+import random
+import hashlib
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+IMPLEMENTATIONS = {
+    'omnibot': 'bots.omnibot.tools.rag',
+    'mochi': 'bots.mochi.tools.rag',
+}
+
+
+class FakeCohereClient:
+    """Deterministic stand-in for cohere.Client's embed and rerank."""
+
+    def __init__(self, dimension, topics=256, embed_latency=0.0, rerank_latency=0.0):
+        self.dimension = dimension
+        self.centers = np.random.default_rng(0).standard_normal((topics, dimension)).astype(np.float32)
+        self.embed_latency = embed_latency
+        self.rerank_latency = rerank_latency
+
+    def vectors(self, seeds):
+        """One vector per integer seed, near the center of the topic the seed falls in."""
+        seeds = np.asarray(seeds, dtype=np.uint64)
+        noise = np.stack([np.random.default_rng(int(seed)).standard_normal(self.dimension, dtype=np.float32)
+                          for seed in seeds]) if len(seeds) else np.empty((0, self.dimension), dtype=np.float32)
+        return self.centers[seeds % len(self.centers)] + 0.5 * noise
+
+    @staticmethod
+    def seed(text):
+        return int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'little')
+
+    def embed(self, texts, model=None, input_type=None):
+        time.sleep(self.embed_latency)
+        # An ndarray rather than Cohere's nested lists keeps the fake's own cost out of the numbers
+        return types.SimpleNamespace(embeddings=self.vectors([self.seed(text) for text in texts]))
+
+    def rerank(self, model=None, query='', documents=(), top_n=None, return_documents=False):
+        time.sleep(self.rerank_latency)
+        query_words = set(query.lower().split())
+        scored = sorted(((len(query_words & set(document.lower().split())) / (len(query_words) or 1), index)
+                         for index, document in enumerate(documents)), reverse=True)
+        return types.SimpleNamespace(results=[types.SimpleNamespace(index=index, relevance_score=score)
+                                              for score, index in scored[:top_n or len(documents)]])
+
+
+def vocabulary(size=5000, hebrew_share=0.3, seed=0):
+    rng = random.Random(seed)
+    latin, hebrew = 'abcdefghijklmnopqrstuvwxyz', 'אבגדהוזחטיכלמנסעפצקרשת'
+    return [''.join(rng.choice(hebrew if rng.random() < hebrew_share else latin) for _ in range(rng.randint(2, 9)))
+            for _ in range(size)]
+
+
+def synthetic_words(count, words, seed=0):
+    # Zipf-like word frequencies, as in natural text
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, count), len(words)) - 1
+    return [words[rank] for rank in ranks]
+
+
+def synthetic_text(count, words, seed=0):
+    tokens = synthetic_words(count, words, seed)
+    lines, line = [], []
+    for token in tokens:
+        line.append(token)
+        if len(line) >= 12:
+            lines.append(' '.join(line) + '.')
+            line = []
+    if line:
+        lines.append(' '.join(line))
+    # Paragraphs of five sentences
+    return '\n'.join(' '.join(lines[i:i + 5]) for i in range(0, len(lines), 5))
+
+
+def write_txt(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def write_docx(path, text):
+    from docx import Document
+    document = Document()
+    for paragraph in text.split('\n'):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pdf(path, text, lines_per_page=50, chars_per_line=90):
+    """A plain PDF with one Helvetica text line per row. Only ASCII survives, so pass ASCII text."""
+    rows = []
+    for paragraph in text.split('\n'):
+        while paragraph:
+            rows.append(paragraph[:chars_per_line])
+            paragraph = paragraph[chars_per_line:]
+    pages = [rows[i:i + lines_per_page] for i in range(0, len(rows), lines_per_page)] or [[]]
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        escaped = (row.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for row in page)
+        stream = ("BT /F1 10 Tf 40 800 Td 14 TL " + " ".join(f"({row}) '" for row in escaped) + " ET").encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+
+    body, offsets = b"%PDF-1.4\n", []
+    for number, content in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(body)
+
+
+def memory_mb():
+    """(current, peak) resident set size of this process."""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                key, value = line.split(':')
+                values[key] = int(value.split()[0]) / 1024
+    return round(values.get('VmRSS', 0), 1), round(values.get('VmHWM', 0), 1)
+
+
+def timed(function, repeat=1):
+    """(result of the last call, median seconds)."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return result, sorted(durations)[len(durations) // 2]
+
+
+def quantiles_ms(durations):
+    durations = sorted(durations)
+    if not durations:
+        return None
+    return {f"p{int(q * 100)}": round(durations[min(len(durations) - 1, int(q * len(durations)))] * 1000, 3)
+            for q in (0.5, 0.95, 0.99)}
+
+
+def directory_mb(directory, names):
+    return round(sum(os.path.getsize(os.path.join(directory, name)) for name in names
+                     if os.path.exists(os.path.join(directory, name))) / 2 ** 20, 2)
+
+
+def open_vector_db(options, upload_folder):
+    """A VectorDB of the chosen implementation over an empty upload folder, with the fake Cohere client."""
+    for key, value in options['env'].items():
+        os.environ[key] = value
+    os.environ.setdefault('COHERE_API_KEY', 'bench')
+    import importlib
+    from flask import Flask
+    rag = importlib.import_module(IMPLEMENTATIONS[options['impl']])
+    client = FakeCohereClient(options['dimension'], embed_latency=options['embed_latency'],
+                              rerank_latency=options['rerank_latency'])
+
+    class BenchVectorDB(rag.VectorDB):
+        def _initialize_cohere(self):
+            return client
+
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = upload_folder
+    context = app.app_context()
+    context.push()
+    return BenchVectorDB([]), client
+
+
+def stage_documents(options, workdir):
+    db, _ = open_vector_db(options, workdir)
+    words = vocabulary()
+    text = synthetic_text(options['doc_words'], words, seed=1)
+    ascii_text = synthetic_text(options['doc_words'], vocabulary(hebrew_share=0.0), seed=1)
+    from bots.cohere.document_processor import chunk_text, extract_text_from_docx
+
+    results = {'parse': [], 'chunk': []}
+    for extension, writer, content in (('txt', write_txt, text), ('docx', write_docx, text), ('pdf', write_pdf, ascii_text)):
+        path = os.path.join(workdir, f"document.{extension}")
+        try:
+            writer(path, content)
+            size_mb = os.path.getsize(path) / 2 ** 20
+            parsed, seconds = timed(lambda: db._load_files(path), options['repeat'])
+        except Exception as e:
+            results['parse'].append({'error': f"{options['impl']} {extension}: {e!r}"})
+            continue
+        results['parse'].append({'impl': options['impl'], 'format': extension, 'file_mb': round(size_mb, 3),
+                                 'chars': len(parsed), 'seconds': round(seconds, 4), 'mb_per_s': round(size_mb / seconds, 2)})
+        if extension == 'docx':
+            parsed, seconds = timed(lambda: extract_text_from_docx(path), options['repeat'])
+            results['parse'].append({'impl': 'cohere', 'format': extension, 'file_mb': round(size_mb, 3),
+                                     'chars': len(parsed), 'seconds': round(seconds, 4), 'mb_per_s': round(size_mb / seconds, 2)})
+
+    for name, split in ((options['impl'], db._split_text), ('cohere', chunk_text)):
+        chunks, seconds = timed(lambda: split(text), options['repeat'])
+        results['chunk'].append({'impl': name, 'words': options['doc_words'], 'chunks': len(chunks), 'seconds': round(seconds, 4),
+                                 'chunks_per_s': round(len(chunks) / seconds, 1)})
+    results['rss_mb'], results['peak_rss_mb'] = memory_mb()
+    return results
+
+
+def stage_embed(options, workdir):
+    db, _ = open_vector_db(options, workdir)
+    chunks = [' '.join(synthetic_words(40, vocabulary(), seed=i)) for i in range(options['embed_chunks'])]
+    (embeddings, failed), cold = timed(lambda: db._create_embeddings(chunks))
+    _, warm = timed(lambda: db._create_embeddings(chunks))
+    rss, peak = memory_mb()
+    return {'chunks': len(chunks), 'failed': len(failed), 'cold_seconds': round(cold, 4), 'cached_seconds': round(warm, 4),
+            'cold_chunks_per_s': round(len(chunks) / cold, 1), 'cached_chunks_per_s': round(len(chunks) / warm, 1),
+            'rss_mb': rss, 'peak_rss_mb': peak}
+
+
+def stage_corpus(options, workdir, size):
+    db, client = open_vector_db(options, workdir)
+    words = vocabulary()
+    rng = np.random.default_rng(size)
+    # Texts are short word salads; each chunk's vector is drawn from its own seed, like a real embedder would
+    seeds = rng.integers(0, 2 ** 63, size, dtype=np.uint64)
+    word_ids = np.minimum(rng.zipf(1.2, (size, 12)), len(words)) - 1
+    chunks = [' '.join(words[i] for i in row) for row in word_ids]
+    embeddings = np.concatenate([client.vectors(seeds[start:start + 65536]) for start in range(0, size, 65536)])
+    generated = memory_mb()[0]
+
+    result = {'impl': options['impl'], 'size': size, 'dimension': options['dimension'],
+              'index_type': os.getenv('VECTOR_INDEX_TYPE', 'flat')}
+    row_start, result['store_seconds'] = timed(lambda: db.store.append(chunks, embeddings))
+    del embeddings
+    db.file_manifest['corpus'] = {'mod_time': 0, 'content_hash': '', 'original_file': 'corpus',
+                                  'id_start': row_start, 'id_end': row_start + size}
+    _, result['build_seconds'] = timed(db._build_index)
+    db._save_manifest()
+    _, result['save_seconds'] = timed(db._save_index)
+    db._publish()
+    for key in ('store_seconds', 'build_seconds', 'save_seconds'):
+        result[key] = round(result[key], 4)
+    result['built_index_type'] = db.ann.index_type_of(db.index)
+    result['store_mb'] = directory_mb(workdir, db.store.file_names())
+    result['index_mb'] = directory_mb(workdir, [os.path.basename(db.index_file)])
+
+    queries = [' '.join(synthetic_words(6, words, seed=size + i)) for i in range(options['queries'])]
+    for label, rerank in (('search_ms', False), ('search_rerank_ms', True)):
+        durations = []
+        for query in queries:
+            db.search_cache.clear()
+            started = time.perf_counter()
+            db.search(query, do_rerank=rerank)
+            durations.append(time.perf_counter() - started)
+        result[label] = quantiles_ms(durations)
+
+    candidates = [db.store.get_chunk(int(i)) for i in range(min(size, db.INITIAL_SEARCH_K))]
+    durations = []
+    for query in queries:
+        started = time.perf_counter()
+        db._rerank([query], candidates)
+        durations.append(time.perf_counter() - started)
+    result['rerank_glue_ms'] = quantiles_ms(durations)
+    result['rss_mb'], result['peak_rss_mb'] = memory_mb()
+    result['generated_rss_mb'] = generated
+    return result
+
+
+def _run_stage(stage, options, args, results):
+    os.chdir(REPO_ROOT)
+    with tempfile.TemporaryDirectory(prefix='rag-bench-') as workdir:
+        try:
+            results.put(globals()[stage](options, workdir, *args))
+        except BaseException as e:
+            results.put({'error': f"{stage} failed: {e!r}"})
+
+
+def run_stage(stage, options, *args):
+    """Run a stage in a fresh process and return its result."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, options, args, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                # Killed before reporting, e.g. by the OOM killer on a large corpus
+                result = {'error': f"{stage}{list(args)} exited with code {process.exitcode}"}
+                break
+    process.join()
+    return result
+
+
+def print_table(title, rows, columns):
+    print(f"\n{title}")
+    print(''.join(f"{name:>{width}}" for name, width in columns))
+    for row in rows:
+        if 'error' in row:
+            print(f"  {row['error'][:110]}")
+            continue
+        cells = []
+        for name, width in columns:
+            value = row.get(name)
+            if isinstance(value, dict):
+                value = value.get('p50')
+            cells.append(f"{'-' if value is None else value:>{width}}")
+        print(''.join(cells))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--impl', choices=sorted(IMPLEMENTATIONS), default='omnibot')
+    parser.add_argument('--stages', default='documents,embed,corpus')
+    parser.add_argument('--sizes', default='1000,10000,100000', help="corpus sizes in chunks")
+    parser.add_argument('--dimension', type=int, default=1024, help="1024 matches embed-multilingual-v3.0")
+    parser.add_argument('--index-type', help="sets VECTOR_INDEX_TYPE: flat, ivf_flat, hnsw or ivf_pq")
+    parser.add_argument('--train-threshold', type=int,
+                        help="sets VECTOR_INDEX_TRAIN_THRESHOLD; smaller corpora get a flat index whatever --index-type says")
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--doc-words', type=int, default=20000)
+    parser.add_argument('--embed-chunks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per parse/chunk timing; the median is kept")
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    parser.add_argument('--rerank-latency-ms', type=float, default=0.0)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="extra environment, e.g. --env VECTOR_INDEX_TRAIN_THRESHOLD=10000")
+    parser.add_argument('--output', help="where to save the run (default bench/results/rag-<timestamp>.json)")
+    args = parser.parse_args()
+
+    env = dict(item.split('=', 1) for item in args.env)
+    if args.index_type:
+        env['VECTOR_INDEX_TYPE'] = args.index_type
+    if args.train_threshold is not None:
+        env['VECTOR_INDEX_TRAIN_THRESHOLD'] = str(args.train_threshold)
+    options = {
+        'impl': args.impl, 'dimension': args.dimension, 'queries': args.queries, 'doc_words': args.doc_words,
+        'embed_chunks': args.embed_chunks, 'repeat': args.repeat, 'env': env,
+        'embed_latency': args.embed_latency_ms / 1000, 'rerank_latency': args.rerank_latency_ms / 1000,
+    }
+    stages = args.stages.split(',')
+    run = {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'git_commit': git_commit(),
+           'cpu_count': os.cpu_count(), 'options': {**options, 'sizes': args.sizes}}
+
+    if 'documents' in stages:
+        run['documents'] = run_stage('stage_documents', options)
+        documents = run['documents']
+        print_table("Parsing", documents.get('parse', [documents]),
+                    [('impl', 10), ('format', 8), ('file_mb', 10), ('chars', 10), ('seconds', 10), ('mb_per_s', 10)])
+        print_table("Chunking", documents.get('chunk', []),
+                    [('impl', 10), ('words', 10), ('chunks', 10), ('seconds', 10), ('chunks_per_s', 14)])
+    if 'embed' in stages:
+        run['embed'] = run_stage('stage_embed', options)
+        print_table("Embedding (fake provider)", [run['embed']],
+                    [('chunks', 10), ('cold_seconds', 14), ('cached_seconds', 16), ('cold_chunks_per_s', 19),
+                     ('cached_chunks_per_s', 21), ('peak_rss_mb', 13)])
+    if 'corpus' in stages:
+        run['corpus'] = [run_stage('stage_corpus', options, int(size)) for size in args.sizes.split(',')]
+        print_table("Corpus (search columns are p50 ms)", run['corpus'],
+                    [('size', 10), ('built_index_type', 18), ('store_seconds', 15), ('build_seconds', 15),
+                     ('store_mb', 10), ('index_mb', 10), ('search_ms', 11), ('search_rerank_ms', 18),
+                     ('rerank_glue_ms', 16), ('peak_rss_mb', 13)])
+
+    output = args.output or os.path.join(RESULTS_DIR, f"rag-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2, ensure_ascii=False)
+    print(f"\nSaved {output}")
+
+
+if __name__ == '__main__':
+    main()
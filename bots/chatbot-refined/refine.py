@@ -1,5 +1,5 @@
 import os, json
-import requests
+from bots.tools.http_client import get_http_client, provider_url
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if it exists
@@ -24,8 +24,8 @@ class RefineText:
                 {"role": "user", "content": user_message}
             ]
 
-            response = requests.post(
-                'https://api.anthropic.com/v1/messages',
+            response = get_http_client('anthropic').post(
+                provider_url('anthropic', '/v1/messages'),
                 headers={
                     'x-api-key': self.api_key,
                     'anthropic-version': '2023-06-01',
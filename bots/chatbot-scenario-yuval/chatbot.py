@@ -3,7 +3,7 @@ import os
 import sys
 from openai import OpenAI
 from dotenv import load_dotenv
-import requests
+from bots.tools.http_client import get_http_client, provider_url
 
 # Add the bot directory to the system path
 sys.path.append(os.path.dirname(__file__))
@@ -85,8 +85,8 @@ class ChatBot:
                 chat_response = response.choices[0].message.content.strip()
             elif model_type == "anthropic":
                 # Using Anthropic
-                response = requests.post(
-                    'https://api.anthropic.com/v1/messages',
+                response = get_http_client('anthropic').post(
+                    provider_url('anthropic', '/v1/messages'),
                     headers={
                         'x-api-key': self.api_key,
                         'anthropic-version': '2023-06-01',
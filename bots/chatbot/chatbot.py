@@ -61,6 +61,35 @@ class ChatBot:
             return chat_response
         except Exception as e:
             return str(e)
+
+    def stream_chat_response(self, user_message, history=None):
+        # History is kept server-side in conversation_history, so the client's copy is not used
+        try:
+            self.conversation_history.append({"role": "user", "content": user_message})
+
+            stream = client.chat.completions.create(
+                model="gpt-4o",
+                messages=self.conversation_history,
+                temperature=1,
+                max_tokens=256,
+                top_p=1,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stream=True
+            )
+
+            parts = []
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield {"type": "text", "text": delta}
+
+            chat_response = "".join(parts).strip()
+            self.conversation_history.append({"role": "assistant", "content": chat_response})
+            yield {"type": "done", "response": chat_response}
+        except Exception as e:
+            yield {"type": "error", "error": str(e)}
     
     def reset_chat_history(self):
         self.conversation_history = []
@@ -1,6 +1,6 @@
 import json
 import os
-import requests
+from bots.tools.http_client import get_http_client, provider_url
 from dotenv import load_dotenv
 from whatsapp_green_link import init_whatsapp_green_link
 
@@ -45,8 +45,8 @@ class ChatBot:
             # Add the user's message to the conversation history
             self.conversation_history.append({"role": "user", "content": user_message})
             
-            response = requests.post(
-                'https://api.anthropic.com/v1/messages',
+            response = get_http_client('anthropic').post(
+                provider_url('anthropic', '/v1/messages'),
                 headers={
                     'x-api-key': self.api_key,
                     'anthropic-version': '2023-06-01',
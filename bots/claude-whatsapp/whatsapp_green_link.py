@@ -1,5 +1,6 @@
 from whatsapp_chatbot_python import GreenAPIBot, Notification
 from whatsapp_chatbot_python.filters import TEXT_TYPES
+from rate_limit import create_rate_limiter
 import os, sys
 import re
 import requests
@@ -33,6 +34,8 @@ def init_whatsapp_green_link(chatbot):
         raise ValueError("Green API instance ID and access token must be set in environment variables.")
 
     bot = GreenAPIBot(greenapi_id_instance, greenapi_access_token)
+    # Each WhatsApp chat gets its own allowance, shared with the web chat's limiter settings
+    rate_limiter = create_rate_limiter(int(os.getenv('RATE_LIMIT_REQUESTS', 30)), int(os.getenv('RATE_LIMIT_WINDOW', 3600)))
 
     @bot.router.message()
     def message_handler(notification: Notification) -> None:
@@ -42,6 +45,9 @@ def init_whatsapp_green_link(chatbot):
 
         if message_data["typeMessage"] == "textMessage":
             user_message = message_data["textMessageData"]["textMessage"]
+            if not rate_limiter.hit(f"whatsapp:{notification.chat}").allowed:
+                notification.answer("וואו, אני עייף. בוא נדבר עוד שעה ככה... בסדר?")
+                return
             print(f"Received message: {user_message}")
             response = chatbot.get_chat_response(user_message)
             
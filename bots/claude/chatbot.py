@@ -1,9 +1,10 @@
 import json
 import os
-import requests
+from bots.tools.http_client import get_http_client, provider_url
 from dotenv import load_dotenv
+from bots.tools.BaseChatBot import BaseChatBot
 
-class ChatBot:
+class ChatBot(BaseChatBot):
     def __init__(self, prompts_file=None):
         # Load environment variables from .env file if it exists
         load_dotenv()
@@ -17,32 +18,16 @@ class ChatBot:
         if prompts_file is None:
             # Set the default path to the prompts.json file within the current directory
             prompts_file = os.path.join(os.path.dirname(__file__), 'prompts.json')
-        
-        with open(prompts_file, 'r') as f:
-            prompts_data = json.load(f)
-        self.prompts = prompts_data["prompts"]
-        self.conversation_history = []
-        
-        # Set the initial prompt label
-        self.initial_prompt_label = "sarcastic_friend"  # Specify the label of the chosen prompt
-        
-        # Initialize conversation history with the initial system prompt
-        self.set_initial_prompt()
-
-    def set_initial_prompt(self):
-        initial_prompt = next((prompt["prompt"] for prompt in self.prompts if prompt["label"] == self.initial_prompt_label), None)
-        if initial_prompt:
-            self.system_prompt = initial_prompt
-        else:
-            raise ValueError(f"Prompt with label '{self.initial_prompt_label}' not found in prompts.")
+        super().__init__(prompts_file, model="claude-3-5-sonnet-20240620")
 
-    def get_chat_response(self, user_message):
+    def get_chat_response(self, user_message, history=None, session_id=None):
+        conversation = self.conversation(session_id)
         try:
             # Add the user's message to the conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            conversation.append({"role": "user", "content": user_message})
             
-            response = requests.post(
-                'https://api.anthropic.com/v1/messages',
+            response = get_http_client('anthropic').post(
+                provider_url('anthropic', '/v1/messages'),
                 headers={
                     'x-api-key': self.api_key,
                     'anthropic-version': '2023-06-01',
@@ -52,7 +37,7 @@ class ChatBot:
                     "model": "claude-3-5-sonnet-20240620",
                     "max_tokens": 256,
                     "system": self.system_prompt,
-                    "messages": self.conversation_history
+                    "messages": conversation.messages()
                 }
             )
 
@@ -67,17 +52,13 @@ class ChatBot:
                 print("Response Data:", json.dumps(response_data, indent=4))
 
             # Add the assistant's response to the conversation history
-            self.conversation_history.append({"role": "assistant", "content": chat_response})
+            conversation.append({"role": "assistant", "content": chat_response})
         
             return chat_response
         except Exception as e:
             # Debugging: Print the exception
             print("Exception:", str(e))
             return str(e)
-    
-    def reset_chat_history(self):
-        self.conversation_history = []
-        self.set_initial_prompt()
 
 # Instantiate ChatBot
 chatbot = ChatBot()
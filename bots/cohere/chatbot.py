@@ -2,14 +2,18 @@ import json
 import cohere
 from .retriever import RetrieverWithRerank
 import os
+import shutil
 from dotenv import load_dotenv
-from uuid import uuid4
+from uuid import UUID, uuid4
 from datetime import datetime, timedelta
 
 # Load environment variables from the .env file
 load_dotenv()
 
 class ChatBot:
+    # Each session's index is persisted under its own directory so sessions never overwrite each other
+    INDEX_ROOT = os.getenv('COHERE_INDEX_DIR', './vector_index')
+
     def __init__(self, api_key=None, prompts_file=None):
         self.api_key = api_key or os.getenv('COHERE_API_KEY')
         self.client = cohere.Client(api_key=self.api_key)
@@ -33,23 +37,49 @@ class ChatBot:
         else:
             raise ValueError(f"Prompt with label '{self.initial_prompt_label}' not found in prompts.")
 
-    def process_and_store_documents(self, document_paths):
+    def process_and_store_documents(self, document_paths, session_id=None):
         self.cleanup_expired_sessions()
-        session_id = str(uuid4())
-        retriever = RetrieverWithRerank(api_key=self.api_key)
+        session_id = session_id or str(uuid4())
+        retriever = RetrieverWithRerank(api_key=self.api_key, persist_dir=self._session_index_dir(session_id))
         retriever.build_index(document_paths)
         self.retrievers[session_id] = retriever
         self.set_initial_prompt(session_id)
         self.session_expiry[session_id] = datetime.now() + timedelta(hours=24)
         return session_id
 
+    def _session_index_dir(self, session_id):
+        # Session ids come from the client, so only well-formed UUIDs may name a directory
+        try:
+            session_id = str(UUID(session_id))
+        except (ValueError, TypeError, AttributeError):
+            return None
+        return os.path.join(self.INDEX_ROOT, session_id)
+
+    def _restore_session(self, session_id):
+        # Another worker, or this one before a restart, may have built the session's index
+        index_dir = self._session_index_dir(session_id)
+        if index_dir is None or not os.path.isdir(index_dir):
+            return False
+        print(f"Restoring session {session_id} from {index_dir}")
+        self.retrievers[session_id] = RetrieverWithRerank(api_key=self.api_key, persist_dir=index_dir)
+        if session_id not in self.conversation_history:
+            self.set_initial_prompt(session_id)
+        self.session_expiry.setdefault(session_id, datetime.now() + timedelta(hours=24))
+        return True
+
+    def _remove_session_index(self, session_id):
+        index_dir = self._session_index_dir(session_id)
+        if index_dir is not None:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
     def cleanup_expired_sessions(self):
         current_time = datetime.now()
         expired_sessions = [sid for sid, expiry in self.session_expiry.items() if expiry < current_time]
         for sid in expired_sessions:
-            del self.conversation_history[sid]
-            del self.retrievers[sid]
+            self.conversation_history.pop(sid, None)
+            self.retrievers.pop(sid, None)
             del self.session_expiry[sid]
+            self._remove_session_index(sid)
 
     def get_chat_response(self, user_message, params):
         print("Starting get_chat_response")
@@ -64,6 +94,9 @@ class ChatBot:
             session_id = params['session_id']
             print("session_id:", session_id)
             
+            if session_id not in self.retrievers:
+                self._restore_session(session_id)
+
             if session_id not in self.conversation_history:
                 print("Error: session_id not found in conversation_history")
                 return {"error": "session_id not found in conversation_history"}
@@ -109,8 +142,11 @@ class ChatBot:
             del self.retrievers[session_id]
         if session_id in self.session_expiry:
             del self.session_expiry[session_id]
+        self._remove_session_index(session_id)
 
     def clear_chat(self):
         self.conversation_history.clear()
+        for session_id in list(self.retrievers):
+            self._remove_session_index(session_id)
         self.retrievers.clear()
         self.session_expiry.clear()
@@ -1,13 +1,9 @@
-import docx
 import os
 from typing import List
+from bots.tools.document_parser import get_document_parser
 
 def extract_text_from_docx(file_path: str) -> str:
-    doc = docx.Document(file_path)
-    full_text = []
-    for paragraph in doc.paragraphs:
-        full_text.append(paragraph.text)
-    return '\n'.join(full_text)
+    return get_document_parser().extract_docx(file_path)
 
 def chunk_text(text: str, chunk_size: int = 256) -> List[str]:
     words = text.split()
@@ -16,12 +12,9 @@ def chunk_text(text: str, chunk_size: int = 256) -> List[str]:
 
 def process_documents(document_paths: List[str]) -> List[str]:
     all_chunks = []
-    for path in document_paths:
-        if path.endswith('.docx'):
-            text = extract_text_from_docx(path)
-        else:
-            with open(path, 'r') as file:
-                text = file.read()
+    # Files are parsed concurrently in the shared parser's worker processes; PDFs are
+    # extracted and anything other than DOCX or PDF is read as text
+    for text in get_document_parser().extract_texts(document_paths):
         chunks = chunk_text(text)
         all_chunks.extend(chunks)
     return all_chunks
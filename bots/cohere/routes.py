@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
+from uuid import uuid4
 import os
+import shutil
+import tempfile
 
 bp = Blueprint('chatbot', __name__)
 
@@ -10,16 +13,30 @@ def upload_documents():
     if not files:
         return jsonify({'error': 'No documents provided'}), 400
 
+    # A directory per upload, so a job never reads a file that a later upload overwrote
+    upload_dir = tempfile.mkdtemp(prefix='cohere-upload-')
     document_paths = []
     for file in files:
         filename = secure_filename(file.filename)
-        file_path = os.path.join('/tmp', filename)
+        file_path = os.path.join(upload_dir, filename)
         file.save(file_path)
         document_paths.append(file_path)
 
     chatbot = current_app.config['chatbot']
-    session_id = chatbot.process_and_store_documents(document_paths)
-    return jsonify({'message': 'Documents processed and stored successfully', 'session_id': session_id}), 200
+    session_id = str(uuid4())
+
+    def build_index(progress):
+        try:
+            progress('indexing')
+            return chatbot.process_and_store_documents(document_paths, session_id)
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+    # The session can chat once the job has succeeded; the client polls /jobs/<job_id>
+    job = current_app.config['INGESTION_JOBS'].submit('upload_documents', build_index, session_id=session_id,
+                                                      documents=[os.path.basename(path) for path in document_paths])
+    return jsonify({'message': 'Documents queued for processing', 'session_id': session_id,
+                    'job_id': job['id'], 'status': job['status']}), 202
 
 @bp.route('/reset', methods=['POST'])
 def reset():
@@ -22,6 +22,7 @@ function uploadDocuments() {
         body: formData
     })
     .then(response => response.json())
+    .then(data => data.error ? data : waitForJob(data.job_id).then(() => data))
     .then(data => {
         // Hide loading animation
         loadingAnimation.style.display = 'none';
@@ -64,3 +65,21 @@ function uploadDocuments() {
         alert('An error occurred while uploading documents.');
     });
 }
+
+// Ingestion runs in the background; poll the job until it has succeeded or failed
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
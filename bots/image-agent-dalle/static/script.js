@@ -39,7 +39,8 @@ function fetchMessageWithImageHandling(message) {
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ message: message })
+        // The id keeps the conversation, and the bot's own session, across messages
+        body: JSON.stringify({ message: message, conversation_id: conversationId })
     })
     .then(response => {
         if (response.status === 201) {
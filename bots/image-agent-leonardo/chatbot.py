@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 import json, os
 import sys
 import logging
+from bots.tools.BaseChatBot import BaseChatBot
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -29,34 +30,18 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 # Setup logging
 logging.basicConfig(filename='app.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s %(name)s %(message)s')
 
-class ChatBot:
+class ChatBot(BaseChatBot):
     def __init__(self, prompts_file=None):
         if prompts_file is None:
             # Set the default path to the prompts.json file within the current directory
             prompts_file = os.path.join(os.path.dirname(__file__), 'prompts.json')
-        
-        with open(prompts_file, 'r') as f:
-            prompts_data = json.load(f)
-        self.prompts = prompts_data["prompts"]
-        self.conversation_history = []
-        
-        # Set the initial prompt label
-        self.initial_prompt_label = "sarcastic_friend"  # Specify the label of the chosen prompt
-        
-        # Initialize conversation history with the initial system prompt
-        self.set_initial_prompt()
-
-    def set_initial_prompt(self):
-        initial_prompt = next((prompt["prompt"] for prompt in self.prompts if prompt["label"] == self.initial_prompt_label), None)
-        if initial_prompt:
-            self.conversation_history.append({"role": "system", "content": initial_prompt})
-        else:
-            raise ValueError(f"Prompt with label '{self.initial_prompt_label}' not found in prompts.")
+        super().__init__(prompts_file, model="gpt-4o")
 
-    def get_chat_response(self, user_message):
+    def get_chat_response(self, user_message, history=None, session_id=None):
+        conversation = self.conversation(session_id)
         try:
             # Add the user's message to the conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            conversation.append({"role": "user", "content": user_message})
             
             # Define the tools to call
             tools = [
@@ -81,7 +66,7 @@ class ChatBot:
 
             response = client.chat.completions.create(
                 model="gpt-4o",
-                messages=self.conversation_history,
+                messages=self.chat_messages(conversation),
                 tools=tools,
                 tool_choice="auto",
                 temperature=1,
@@ -109,17 +94,17 @@ class ChatBot:
                         image_url = image_path
                         
                         # Append function call result to conversation history
-                        self.conversation_history.append({"role": "function", "name": "generate_image", "content": image_url})
+                        conversation.append({"role": "function", "name": "generate_image", "content": image_url})
                         
                         # Add the image URL to the conversation history
-                        self.conversation_history.append({"role": "user", "content": f"Image generated at: {image_url}"})
+                        conversation.append({"role": "user", "content": f"Image generated at: {image_url}"})
                         
-                        logging.debug(f"Updated conversation history: {self.conversation_history}")
+                        logging.debug(f"Updated conversation history: {conversation.messages()}")
                         
                         # Make a second call to get the final completion
                         final_response = client.chat.completions.create(
                             model="gpt-4o",
-                            messages=self.conversation_history,
+                            messages=self.chat_messages(conversation),
                             temperature=1,
                             max_tokens=256,
                             top_p=1,
@@ -130,9 +115,9 @@ class ChatBot:
                         chat_response = final_response.choices[0].message.content.strip()
                         
                         # Append assistant's response to conversation history
-                        self.conversation_history.append({"role": "assistant", "content": chat_response})
+                        conversation.append({"role": "assistant", "content": chat_response})
                         
-                        logging.debug(f"Final conversation history: {self.conversation_history}")
+                        logging.debug(f"Final conversation history: {conversation.messages()}")
                         
                         return chat_response
 
@@ -144,16 +129,12 @@ class ChatBot:
                 chat_response = "Sorry, I didn't get a response from the model."
 
             # Add the assistant's response to the conversation history
-            self.conversation_history.append({"role": "assistant", "content": chat_response})
+            conversation.append({"role": "assistant", "content": chat_response})
         
             return chat_response
         except Exception as e:
             logging.error(f"Error in get_chat_response: {str(e)}")
             return {"error": str(e)}
-    
-    def reset_chat_history(self):
-        self.conversation_history = []
-        self.set_initial_prompt()
 
 # Instantiate ChatBot
 chatbot = ChatBot()
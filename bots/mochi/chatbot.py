@@ -1,21 +1,26 @@
 import json
 import os
 import logging
-import requests
-import traceback
 from dotenv import load_dotenv
 from flask import Blueprint, jsonify, request, current_app, send_from_directory
 from tools.generate_image import generate_image
 from tools.rag import VectorDB
+from bots.tools.http_client import get_http_client, provider_url
+from bots.tools.tool_runner import ToolRunner
+from bots.tools.prompt_cache import with_cache_control, cache_stats
 
 load_dotenv()
-logging.basicConfig(filename='app.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger(__name__)
 
 class ChatBot:
+    # Seconds before a tool call is abandoned and reported to the model as an error
+    TOOL_TIMEOUTS = {"generate_image": 90, "get_knowledge": 30, "switch_prompt": 5}
+
     def __init__(self, prompts_file=None, knowledge_file=None):
         self.api_key = os.getenv('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables.")
+        self.http = get_http_client('anthropic')
         
         prompts_file = prompts_file or os.path.join(os.path.dirname(__file__), 'prompts.json')
         with open(prompts_file, 'r') as f:
@@ -24,10 +29,11 @@ class ChatBot:
         self.initial_prompt_label = "sarcastic_friend"
         self.system_message = self.get_system_message()
         self.rag = None
+        self.tool_runner = ToolRunner(self.handle_tool_use, timeouts=self.TOOL_TIMEOUTS)
 
         knowledge_file = knowledge_file or os.path.join(os.path.dirname(__file__), 'uploads', 'aviz.docx')
 
-        print(f"Knowledge file exists: {os.path.exists(knowledge_file)}")
+        logger.debug("Knowledge file exists: %s", os.path.exists(knowledge_file))
         
         # Automatically append knowledge if file exists
         if knowledge_file and os.path.exists(knowledge_file):
@@ -68,10 +74,12 @@ class ChatBot:
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01"
         }
-        response = requests.post("https://api.anthropic.com/v1/messages", headers=headers, json=data)
+        response = self.http.post(provider_url('anthropic', '/v1/messages'), headers=headers, json=with_cache_control(data))
         if response.status_code != 200:
             raise Exception(f"API request failed with status {response.status_code}: {response.json()}")
-        return response.json()
+        response_data = response.json()
+        cache_stats.record(response_data)
+        return response_data
 
     def handle_knowledge_response(self, queries, original_question, knowledge_chunks):
         knowledge_context = "\n".join(knowledge_chunks)
@@ -167,93 +175,88 @@ class ChatBot:
                 if response_data.get('stop_reason') != 'tool_use':
                     break
 
-                print(f"Debug: Tool use detected. Stop reason: {response_data.get('stop_reason')}")
-                for content_block in response_data.get('content', []):
-                    print(f"Debug: Processing content block: {content_block}")
-                    if content_block.get('type') == 'tool_use':
-                        tool_name = content_block.get('name')
-                        tool_use_id = content_block.get('id')
-                        tool_input = content_block.get('input')
-                        print(f"Debug: Tool use details - Name: {tool_name}, ID: {tool_use_id}, Input: {tool_input}")
-                        
-                        tool_result = self.handle_tool_use(tool_name, tool_input, tool_use_id)
-                        
-                        data["messages"].extend([
-                            {"role": "assistant", "content": [content_block]},
-                            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id, "content": tool_result}]}
-                        ])
+                # All tool_use blocks of a turn run concurrently and answer in one tool_result message
+                tool_uses = ToolRunner.tool_uses(response_data)
+                logger.debug("Running tools: %s", [(block.get('name'), block.get('input')) for block in tool_uses])
+                tool_results = self.tool_runner.run(tool_uses)
+                data["messages"].extend(ToolRunner.tool_messages(response_data, tool_results))
 
                 if first_iteration:
                     # Remove tools and tool_choice after the first iteration
                     data.pop("tool_choice", None)
                     first_iteration = False
 
-                print("Debug: Calling Anthropic API with updated data")
-
-            print("Debug: Extracting final response")
             final_response = "".join(content_block.get('text', '') for content_block in response_data.get('content', []) if content_block.get('type') == 'text')
-            print(f"Debug: Final response: {final_response}")
+            logger.debug("Final response: %s", final_response)
             return final_response
         except Exception as e:
-            logging.error(f"Error in get_chat_response: {str(e)}")
+            logger.exception("Error in get_chat_response: %s", e)
             return str({"error": str(e)})
             
             
     def handle_tool_use(self, tool_name, tool_input, tool_use_id):
         if tool_name == "generate_image":
-            print("Debug: Generating image")
             image_url = generate_image(tool_input.get("prompt"))
-            print(f"Debug: Image generated. URL: {image_url}")
+            logger.debug("Image generated: %s", image_url)
             return image_url
         elif tool_name == "switch_prompt":
-            print("Debug: Switching prompt")
             switch_result = self.switch_prompt(tool_input.get("prompt_index"))
-            print(f"Debug: Prompt switch result: {switch_result}")
+            logger.debug("Prompt switch result: %s", switch_result)
             return switch_result
         elif tool_name == "get_knowledge":
-            print("Debug: Getting knowledge")
             queries = tool_input.get("queries", [])
             knowledge_chunks = self.get_knowledge(queries)
-            print(f"Debug: Knowledge chunks retrieved: {knowledge_chunks}")
+            logger.debug("Retrieved %d knowledge chunks", len(knowledge_chunks))
             return json.dumps(knowledge_chunks)  # Return as JSON string
         else:
             return f"Unknown tool: {tool_name}"
             
     def get_knowledge(self, queries):
-        print(f"Getting knowledge for queries: {queries}")
+        logger.debug("Getting knowledge for queries: %s", queries)
         if self.rag:
             try:
                 results = self.rag.search(queries)
-                print(f"Search results: {results}")
+                logger.debug("Search results: %s", results)
                 if not results:
-                    print("No results found in knowledge base")
                     return ["No relevant information found in the knowledge base."]
                 return [result['text'] for result in results]
             except Exception as e:
-                print(f"Error retrieving knowledge: {str(e)}")
+                logger.exception("Error retrieving knowledge: %s", e)
                 return [f"Error retrieving knowledge: {str(e)}"]
         else:
-            print("RAG not initialized, using mock data")
+            logger.debug("RAG not initialized, using mock data")
             return [f"Relevant information for '{query}': chunk {i}" for i, query in enumerate(queries, 1)]
 
 
-    def append_knowledge(self, file_path):
+    def append_knowledge(self, file_path, progress=None):
         """
-        Create a new VectorDB instance with the given file and assign it to self.rag.
-        
+        Add the given file to the VectorDB in self.rag, creating it on the first upload.
+
         :param file_path: Path to the file containing the knowledge to be added.
+        :param progress: Optional callback, called with the name of each ingestion stage.
         :return: str: A message indicating success or failure.
         """
         try:
-            logging.info(f"Attempting to append knowledge from file: {file_path}")
-            
-            self.rag = VectorDB(file_path)
-            logging.info(f"Successfully created VectorDB instance with file: {file_path}")
+            logger.info("Appending knowledge from file: %s", file_path)
+
+            # Assigned only once built, so chats keep the mock knowledge until then
+            rag = self.rag or VectorDB([])
+            added = rag.add_file(file_path, progress)
+            self.rag = rag
+            if not added:
+                logger.info("File already indexed: %s", file_path)
+                return f"Knowledge from {file_path} is already up to date."
+            logger.info("Added file to VectorDB: %s", file_path)
             return f"Knowledge from {file_path} has been successfully appended."
         except Exception as e:
-            logging.error(f"Error appending knowledge: {str(e)}")
-            logging.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Error appending knowledge: %s", e)
             raise  # Re-raise the exception to be caught by the route handler
 
+    def remove_knowledge(self, base_name):
+        """Drop a deleted file's vectors from the knowledge base. Returns False if it was not in it."""
+        if not self.rag:
+            return False
+        return self.rag.remove_file(base_name)
+
 # Usage
 # chatbot = ChatBot(knowledge_file="path/to/your/knowledge_file.txt")
\ No newline at end of file
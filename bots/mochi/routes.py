@@ -4,6 +4,7 @@ import traceback
 import json
 from flask import Blueprint, jsonify, request, current_app, send_from_directory
 from werkzeug.utils import secure_filename
+from tools.rag import VectorDB
 
 def create_blueprint(chatbot):
     bp = Blueprint('chatbot', __name__)
@@ -72,11 +73,12 @@ def create_blueprint(chatbot):
                 current_app.logger.error(f"File not found: {file_path}")
                 return jsonify({'error': 'File not found'}), 404
             
-            # Call the chatbot's append_knowledge method
-            print(file_path)
-            result = current_app.config['chatbot'].append_knowledge(file_path)
-            current_app.logger.info(f"Knowledge appended successfully: {result}")
-            return jsonify({'message': result}), 200
+            # Parsing and embedding run in the background; the client polls /jobs/<job_id>
+            chatbot = current_app.config['chatbot']
+            job = current_app.config['INGESTION_JOBS'].submit(
+                'append_knowledge', lambda progress: chatbot.append_knowledge(file_path, progress), filename=data['filename'])
+            current_app.logger.info(f"Queued knowledge from {file_path} as job {job['id']}")
+            return jsonify({'message': f"{data['filename']} queued for ingestion", 'job_id': job['id'], 'status': job['status']}), 202
         except Exception as e:
             current_app.logger.error(f"Error in append_knowledge route: {str(e)}")
             return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 500
@@ -115,11 +117,15 @@ def create_blueprint(chatbot):
                 return jsonify({'error': 'File not found'}), 404
             
             os.remove(file_path)
-            
-            # Delete any additional files with the same name prefix
+
+            # Drop the file's vectors from the index, compacting the store once enough are dead
             base_name = os.path.splitext(filename)[0]
+            if chatbot.remove_knowledge(base_name):
+                current_app.logger.info(f"Removed vectors for {base_name} from the index")
+
+            # Delete any additional files with the same name prefix
             for f in os.listdir(current_app.config['UPLOAD_FOLDER']):
-                if f.startswith(base_name) and f != filename:
+                if f.startswith(base_name) and f != filename and not VectorDB.is_internal_file(f):
                     os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], f))
             
             return jsonify({'success': True, 'message': f'File {filename} deleted successfully'})
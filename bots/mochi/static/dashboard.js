@@ -98,6 +98,7 @@ async function uploadFile(file) {
 
         const appendResult = await appendResponse.json();
         console.log('Append result:', appendResult);
+        await waitForJob(appendResult.job_id);
 
         // Update append progress
         if (appendProgress && appendProgress.querySelector('.progress')) {
@@ -183,4 +184,22 @@ async function updateFileList() {
 
     // Initial file list update
     updateFileList();
-});
\ No newline at end of file
+});
+
+// Ingestion runs in the background; poll the job until it has succeeded or failed
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
@@ -276,6 +276,7 @@ async function uploadFile(file) {
         }
         const appendResult = await appendResponse.json();
         console.log('Append result:', appendResult);
+        await waitForJob(appendResult.job_id);
 
         console.log('File uploaded and knowledge appended successfully');
         updateDocumentCount();
@@ -350,4 +351,22 @@ function loadHtml2Canvas() {
 }
 
 // Initialize everything when the DOM is ready
-document.addEventListener('DOMContentLoaded', loadHtml2Canvas);
\ No newline at end of file
+document.addEventListener('DOMContentLoaded', loadHtml2Canvas);
+
+// Ingestion runs in the background; poll the job until it has succeeded or failed
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
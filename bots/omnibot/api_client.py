@@ -1,19 +1,80 @@
 import os
-import requests
+import json
+from bots.tools.http_client import get_http_client, get_async_http_client, provider_url
+from bots.tools.prompt_cache import with_cache_control, cache_stats
+from bots.tools.request_json import encode_request
 
 class AnthropicAPIClient:
     def __init__(self):
+        self.api_url = provider_url('anthropic', '/v1/messages')
         self.api_key = os.getenv('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables.")
+        self.http = get_http_client('anthropic')
 
-    def call_anthropic_api(self, data):
-        headers = {
+    def _headers(self):
+        return {
             "content-type": "application/json",
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01"
         }
-        response = requests.post("https://api.anthropic.com/v1/messages", headers=headers, json=data)
+
+    def call_anthropic_api(self, data):
+        response = self.http.post(self.api_url, headers=self._headers(), content=encode_request(with_cache_control(data)))
         if response.status_code != 200:
             raise Exception(f"API request failed with status {response.status_code}: {response.json()}")
-        return response.json()
\ No newline at end of file
+        response_data = response.json()
+        cache_stats.record(response_data)
+        return response_data
+
+    async def acall_anthropic_api(self, data):
+        # Resolved per call: the async client has to be created on the event loop that uses it
+        response = await get_async_http_client('anthropic').post(
+            self.api_url, headers=self._headers(), content=encode_request(with_cache_control(data)))
+        if response.status_code != 200:
+            raise Exception(f"API request failed with status {response.status_code}: {response.json()}")
+        response_data = response.json()
+        cache_stats.record(response_data)
+        return response_data
+
+    def stream_anthropic_api(self, data):
+        """
+        Call the Messages API with stream=True. Yields ("text", delta) for each text delta
+        as it arrives, then ("message", response_data) with the assembled response in the
+        same shape call_anthropic_api returns, tool_use inputs included.
+        """
+        message = {"content": [], "stop_reason": None}
+        partial_inputs = {}
+        body = encode_request({**with_cache_control(data), "stream": True})
+        with self.http.stream('POST', self.api_url, headers=self._headers(), content=body) as response:
+            if response.status_code != 200:
+                raise Exception(f"API request failed with status {response.status_code}: {response.json()}")
+            for line in response.iter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                event_type = event.get("type")
+                if event_type == "message_start":
+                    message = {**event["message"], "content": []}
+                elif event_type == "content_block_start":
+                    message["content"].append(dict(event["content_block"]))
+                elif event_type == "content_block_delta":
+                    block = message["content"][event["index"]]
+                    delta = event["delta"]
+                    if delta["type"] == "text_delta":
+                        block["text"] = block.get("text", "") + delta["text"]
+                        yield "text", delta["text"]
+                    elif delta["type"] == "input_json_delta":
+                        partial_inputs[event["index"]] = partial_inputs.get(event["index"], "") + delta["partial_json"]
+                elif event_type == "content_block_stop":
+                    # Tool inputs arrive as JSON fragments and only parse once the block is complete
+                    if event["index"] in partial_inputs:
+                        message["content"][event["index"]]["input"] = json.loads(partial_inputs.pop(event["index"]) or "{}")
+                elif event_type == "message_delta":
+                    message["stop_reason"] = event["delta"].get("stop_reason")
+                    # message_start carries the input and cache usage, message_delta the final output count
+                    message["usage"] = {**message.get("usage", {}), **event.get("usage", {})}
+                elif event_type == "error":
+                    raise Exception(f"API stream failed: {event.get('error')}")
+        cache_stats.record(message)
+        yield "message", message
@@ -2,131 +2,198 @@ import os
 import json
 import logging
 from dotenv import load_dotenv
-from flask import current_app
-from .tools.generate_image import generate_image
+from .tools.generate_image import generate_image, agenerate_image
 from .tools.rag import VectorDB
 from .persona_manager import PersonaManager
 from .api_client import AnthropicAPIClient
 from .knowledge_manager import KnowledgeManager
+from bots.tools.tool_runner import ToolRunner
 
 load_dotenv()
-logging.basicConfig(filename='app.log', level=logging.DEBUG, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger(__name__)
 
 class ChatBot:
+    # Seconds before a tool call is abandoned and reported to the model as an error
+    TOOL_TIMEOUTS = {"generate_image": 90, "get_knowledge": 30, "switch_persona": 5}
+
     def __init__(self, app, knowledge_files=None):
         self.app = app
         self.api_client = AnthropicAPIClient()
         self.persona_manager = PersonaManager(app)
         self.knowledge_manager = KnowledgeManager(app, knowledge_files)
+        self.tool_runner = ToolRunner(self.handle_tool_use, self.ahandle_tool_use, self.TOOL_TIMEOUTS)
+        self.persona_manager.register_tools(self._tool_schemas)
 
-    def get_chat_response(self, user_message, history):
-        try:
-            tools = [
-                {
-                    "name": "generate_image",
-                    "description": "Generate an image based on a given prompt",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "prompt": {"type": "string", "description": "The prompt for generating the image"}
-                        },
-                        "required": ["prompt"]
-                    }
-                },
-                {
-                    "name": "switch_persona",
-                    "description": f"Switch to a different bot personality. Available personalities:\n{self.persona_manager.get_all_personas()}",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "persona_index": {"type": "integer", "description": "The index of the prompt to switch to"}
-                        },
-                        "required": ["persona_index"]
-                    }
-                },
-                {
-                    "name": "get_knowledge",
-                    "description": "Retrieve specific knowledge when the user ask something. Can ask up to 3 queries.",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "queries": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "An array of up to 3 queries to find answers in the knowledge base",
-                                "maxItems": 1
-                            }
-                        },
-                        "required": ["queries"]
-                    }
+    def _tool_schemas(self):
+        # Built once per persona/instructions version by PersonaManager.prompt_spec
+        return [
+            {
+                "name": "generate_image",
+                "description": "Generate an image based on a given prompt",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "prompt": {"type": "string", "description": "The prompt for generating the image"}
+                    },
+                    "required": ["prompt"]
+                }
+            },
+            {
+                "name": "switch_persona",
+                "description": f"Switch to a different bot personality. Available personalities:\n{self.persona_manager.describe_personas()}",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "persona_index": {"type": "integer", "description": "The index of the prompt to switch to"}
+                    },
+                    "required": ["persona_index"]
+                }
+            },
+            {
+                "name": "get_knowledge",
+                "description": "Retrieve specific knowledge when the user ask something. Can ask up to 3 queries.",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "queries": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "An array of up to 3 queries to find answers in the knowledge base",
+                            "maxItems": 1
+                        }
+                    },
+                    "required": ["queries"]
                 }
-            ]
-            messages = [{"role": msg["role"], "content": [{"type": "text", "text": msg["content"][0]["text"]}]} for msg in history]
-            messages.append({"role": "user", "content": [{"type": "text", "text": user_message}]})
-            data = {
-                "model": "claude-3-5-sonnet-20240620",
-                "max_tokens": 1024,
-                "system": self.persona_manager.get_system_message(),
-                "tools": tools,
-                "messages": messages
             }
-            if current_app.config.get("FORCE_RAG"):
-                data["tool_choice"] = {"type": "tool", "name": "get_knowledge"}
-            first_iteration = True
+        ]
+
+    def _build_request(self, user_message, history):
+        spec = self.persona_manager.prompt_spec()
+        messages = [{"role": msg["role"], "content": [{"type": "text", "text": msg["content"][0]["text"]}]} for msg in history]
+        messages.append({"role": "user", "content": [{"type": "text", "text": user_message}]})
+        data = {
+            "model": "claude-3-5-sonnet-20240620",
+            "max_tokens": 1024,
+            "system": spec.system,
+            "tools": spec.tools,
+            "messages": messages
+        }
+        if self.app.config.get("FORCE_RAG"):
+            data["tool_choice"] = {"type": "tool", "name": "get_knowledge"}
+        return data
+
+    def _run_tool_calls(self, response_data, data):
+        # All tool_use blocks of a turn run concurrently and answer in one tool_result message
+        tool_uses = ToolRunner.tool_uses(response_data)
+        logger.debug("Running tools: %s", [(block.get('name'), block.get('input')) for block in tool_uses])
+        tool_results = self.tool_runner.run(tool_uses)
+        data["messages"].extend(ToolRunner.tool_messages(response_data, tool_results))
+        # Remove tool_choice after the first iteration
+        data.pop("tool_choice", None)
+
+    def get_chat_response(self, user_message, history):
+        try:
+            data = self._build_request(user_message, history)
             while True:
                 response_data = self.api_client.call_anthropic_api(data)
                 if response_data.get('stop_reason') != 'tool_use':
                     break
-                print(f"Debug: Tool use detected. Stop reason: {response_data.get('stop_reason')}")
-                for content_block in response_data.get('content', []):
-                    print(f"Debug: Processing content block: {content_block}")
-                    if content_block.get('type') == 'tool_use':
-                        tool_name = content_block.get('name')
-                        tool_use_id = content_block.get('id')
-                        tool_input = content_block.get('input')
-                        print(f"Debug: Tool use details - Name: {tool_name}, ID: {tool_use_id}, Input: {tool_input}")
-                        
-                        tool_result = self.handle_tool_use(tool_name, tool_input, tool_use_id)
-                        
-                        data["messages"].extend([
-                            {"role": "assistant", "content": [content_block]},
-                            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id, "content": tool_result}]}
-                        ])
-                if first_iteration:
-                    # Remove tools and tool_choice after the first iteration
-                    data.pop("tool_choice", None)
-                    first_iteration = False
-                print("Debug: Calling Anthropic API with updated data")
-            print("Debug: Extracting final response")
+                self._run_tool_calls(response_data, data)
+            final_response = "".join(content_block.get('text', '') for content_block in response_data.get('content', []) if content_block.get('type') == 'text')
+            logger.debug("Final response: %s", final_response)
+            return final_response
+        except Exception as e:
+            logger.exception("Error in get_chat_response: %s", e)
+            return str({"error": str(e)})
+
+    async def _arun_tool_calls(self, response_data, data):
+        tool_uses = ToolRunner.tool_uses(response_data)
+        logger.debug("Running tools: %s", [(block.get('name'), block.get('input')) for block in tool_uses])
+        tool_results = await self.tool_runner.arun(tool_uses)
+        data["messages"].extend(ToolRunner.tool_messages(response_data, tool_results))
+        data.pop("tool_choice", None)
+
+    async def aget_chat_response(self, user_message, history):
+        """Async counterpart of get_chat_response, awaited on the ASGI server's event loop (asgi.py)."""
+        try:
+            data = self._build_request(user_message, history)
+            while True:
+                response_data = await self.api_client.acall_anthropic_api(data)
+                if response_data.get('stop_reason') != 'tool_use':
+                    break
+                await self._arun_tool_calls(response_data, data)
             final_response = "".join(content_block.get('text', '') for content_block in response_data.get('content', []) if content_block.get('type') == 'text')
-            print(f"Debug: Final response: {final_response}")
+            logger.debug("Final response: %s", final_response)
             return final_response
         except Exception as e:
-            logging.error(f"Error in get_chat_response: {str(e)}")
+            logger.exception("Error in aget_chat_response: %s", e)
             return str({"error": str(e)})
 
+    def stream_chat_response(self, user_message, history):
+        """
+        Streaming counterpart of get_chat_response. Yields event dicts: {"type": "text", "text": ...}
+        per token delta, {"type": "tool", "name": ...} before each tool runs, then either
+        {"type": "done", "response": ...} or {"type": "error", ...}. The done response is all the
+        text streamed, from every round, so what is remembered is what the client was shown.
+        """
+        try:
+            data = self._build_request(user_message, history)
+            parts = []
+            while True:
+                round_started = True
+                for kind, payload in self.api_client.stream_anthropic_api(data):
+                    if kind == "text":
+                        if round_started and parts:
+                            # Text before a tool call and the answer after it read as separate paragraphs
+                            parts.append("\n\n")
+                            yield {"type": "text", "text": "\n\n"}
+                        round_started = False
+                        parts.append(payload)
+                        yield {"type": "text", "text": payload}
+                    else:
+                        response_data = payload
+                if response_data.get('stop_reason') != 'tool_use':
+                    break
+                for content_block in response_data.get('content', []):
+                    if content_block.get('type') == 'tool_use':
+                        yield {"type": "tool", "name": content_block.get('name')}
+                self._run_tool_calls(response_data, data)
+            yield {"type": "done", "response": "".join(parts)}
+        except Exception as e:
+            logger.exception("Error in stream_chat_response: %s", e)
+            yield {"type": "error", "error": str(e)}
+
     def handle_tool_use(self, tool_name, tool_input, tool_use_id):
         if tool_name == "generate_image":
-            print("Debug: Generating image")
             image_url = generate_image(tool_input.get("prompt"))
-            print(f"Debug: Image generated. URL: {image_url}")
+            logger.debug("Image generated: %s", image_url)
             return image_url
         elif tool_name == "switch_persona":
-            print("Debug: Switching persona")
             switch_result = self.persona_manager.switch_persona(tool_input.get("persona_index"))
-            print(f"Debug: Prompt switch result: {switch_result}")
+            logger.debug("Persona switch result: %s", switch_result)
             return switch_result
         elif tool_name == "get_knowledge":
-            print("Debug: Getting knowledge")
             queries = tool_input.get("queries", [])
             knowledge_chunks = self.knowledge_manager.get_knowledge(queries)
-            print(f"Debug: Knowledge chunks retrieved: {knowledge_chunks}")
+            logger.debug("Retrieved %d knowledge chunks", len(knowledge_chunks))
             return json.dumps(knowledge_chunks)  # Return as JSON string
         else:
             return f"Unknown tool: {tool_name}"
 
-    def append_knowledge(self, file_path):
-        return self.knowledge_manager.append_knowledge(file_path)
+    async def ahandle_tool_use(self, tool_name, tool_input, tool_use_id):
+        if tool_name == "generate_image":
+            return await agenerate_image(tool_input.get("prompt"))
+        elif tool_name == "get_knowledge":
+            knowledge_chunks = await self.knowledge_manager.aget_knowledge(tool_input.get("queries", []))
+            return json.dumps(knowledge_chunks)
+        # The remaining tools only touch local state and return immediately
+        return self.handle_tool_use(tool_name, tool_input, tool_use_id)
+
+    def append_knowledge(self, file_path, progress=None):
+        return self.knowledge_manager.append_knowledge(file_path, progress)
+
+    def remove_knowledge(self, base_name):
+        return self.knowledge_manager.remove_knowledge(base_name)
 
 # Usage
 # app = Flask(__name__)
@@ -2,6 +2,8 @@ import os
 import logging
 from .tools.rag import VectorDB
 
+logger = logging.getLogger(__name__)
+
 class KnowledgeManager:
     def __init__(self, app, knowledge_files=None):
         self.app = app
@@ -18,45 +20,71 @@ class KnowledgeManager:
             if not isinstance(knowledge_files, list):
                 knowledge_files = [knowledge_files]
             
-            print(f"Initializing knowledge base with files: {knowledge_files}")
+            logger.info("Initializing knowledge base with files: %s", knowledge_files)
             
             valid_files = [f for f in knowledge_files if os.path.exists(f)]
             
             if valid_files:
                 try:
                     self.rag = VectorDB(valid_files)
-                    print(f"Successfully created VectorDB instance with {len(valid_files)} file(s)")
+                    logger.info("Created VectorDB instance with %d file(s)", len(valid_files))
                 except Exception as e:
-                    print(f"Error initializing VectorDB: {str(e)}")
-                    self.app.logger.error(f"Error initializing VectorDB: {str(e)}")
+                    logger.exception("Error initializing VectorDB: %s", e)
             else:
-                print("No valid knowledge files found. VectorDB not initialized.")
+                logger.info("No valid knowledge files found. VectorDB not initialized.")
 
     def get_knowledge(self, queries):
-        print(f"Getting knowledge for queries: {queries}")
+        logger.debug("Getting knowledge for queries: %s", queries)
         if self.rag:
             try:
                 results = self.rag.search(queries)
-                print(f"Search results: {results}")
+                logger.debug("Search results: %s", results)
                 if not results:
-                    print("No results found in knowledge base")
                     return ["No relevant information found in the knowledge base."]
                 return [result['text'] for result in results]
             except Exception as e:
-                print(f"Error retrieving knowledge: {str(e)}")
+                logger.exception("Error retrieving knowledge: %s", e)
                 return [f"Error retrieving knowledge: {str(e)}"]
         else:
-            print("RAG not initialized, using mock data")
+            logger.debug("RAG not initialized, using mock data")
             return [f"Relevant information for '{query}': chunk {i}" for i, query in enumerate(queries, 1)]
 
-    def append_knowledge(self, file_path):
-        print(f"appending file: {file_path}")
+    async def aget_knowledge(self, queries):
+        if not self.rag:
+            return self.get_knowledge(queries)
+        try:
+            results = await self.rag.asearch(queries)
+            if not results:
+                return ["No relevant information found in the knowledge base."]
+            return [result['text'] for result in results]
+        except Exception as e:
+            logger.exception("Error retrieving knowledge: %s", e)
+            return [f"Error retrieving knowledge: {str(e)}"]
+
+    def append_knowledge(self, file_path, progress=None):
         try:
-            logging.info(f"Attempting to append knowledge from file: {file_path}")
+            logger.info("Appending knowledge from file: %s", file_path)
             
-            self.rag = VectorDB(file_path)
-            logging.info(f"Successfully created VectorDB instance with file: {file_path}")
+            with self.app.app_context():
+                # Assigned only once built, so chats keep the mock knowledge until then
+                rag = self.rag or VectorDB([])
+                added = rag.add_file(file_path, progress)
+                self.rag = rag
+            if not added:
+                logger.info("File already indexed: %s", file_path)
+                return f"Knowledge from {file_path} is already up to date."
+            logger.info("Added file to VectorDB: %s", file_path)
             return f"Knowledge from {file_path} has been successfully appended."
         except Exception as e:
-            logging.error(f"Error appending knowledge: {str(e)}")
+            logger.exception("Error appending knowledge: %s", e)
+            raise
+
+    def remove_knowledge(self, base_name):
+        logger.info("Removing knowledge: %s", base_name)
+        if not self.rag:
+            return False
+        try:
+            return self.rag.remove_file(base_name)
+        except Exception as e:
+            logger.exception("Error removing knowledge: %s", e)
             raise
\ No newline at end of file
@@ -1,19 +1,51 @@
 import os, json
+import logging
+from collections import namedtuple
 from .models import Persona  # Make sure this import path is correct
+from bots.tools.prompt_cache import with_cache_control
+from bots.tools.request_json import JsonFragment
+
+logger = logging.getLogger(__name__)
+
+# The system prompt and tool schemas of one version, serialized once for every request that uses them
+PromptSpec = namedtuple('PromptSpec', ['key', 'system', 'tools'])
 
 class PersonaManager:
+    DEFAULT_GLOBAL_INSTRUCTIONS = 'תענה קצר! עד 2 משפטים בכל פעם'
+
     def __init__(self, app):
-        print("Initializing PersonaManager")
+        logger.debug("Initializing PersonaManager")
         self.app = app
         self.personas = []
+        # Bumped by every change that alters the system prompt or the tool schemas
+        self.version = 0
+        self.tools_builder = None
+        self._prompt_spec = None
         self.load_personas()
         self.set_persona(1)
+
+    def register_tools(self, tools_builder):
+        """tools_builder() returns the tool schemas; it is called again only after a change."""
+        self.tools_builder = tools_builder
+        self.version += 1
+
+    def prompt_spec(self) -> PromptSpec:
+        # /set_global_instructions writes app.config directly, so the instructions are part of the key
+        key = (self.version, self.app.config.get('GLOBAL_INSTRUCTIONS', self.DEFAULT_GLOBAL_INSTRUCTIONS))
+        spec = self._prompt_spec
+        if spec is None or spec.key != key:
+            cached = with_cache_control({
+                "system": self._render_system_message(key[1]),
+                "tools": self.tools_builder() if self.tools_builder else []
+            })
+            spec = self._prompt_spec = PromptSpec(key, JsonFragment(cached["system"]), JsonFragment(cached["tools"]))
+        return spec
               
     def get_by_slug(self, slug):
         return Persona.get_by_slug(slug)
         
     def load_personas(self):
-        print("Loading personas")
+        logger.debug("Loading personas")
         personas_file = os.path.join(self.app.config['BOT_DIRECTORY'], 'personas.json')
         if os.path.exists(personas_file):
             with open(personas_file, 'r', encoding='utf-8') as f:
@@ -27,18 +59,21 @@ class PersonaManager:
                     'emojicon': p['emojicon']
                 }) for p in personas_data['prompts']
             ]
-            print(f"Loaded {len(self.personas)} personas from {personas_file}")
+            logger.info("Loaded %d personas from %s", len(self.personas), personas_file)
         else:
-            print(f"personas.json file not found at {personas_file}. Using empty persona list.")
+            logger.warning("personas.json file not found at %s. Using empty persona list.", personas_file)
             self.personas = []
+        self.version += 1
 
     def get_system_message(self):
-        print("Getting system message")
+        system = self.prompt_spec().system.value
+        return system[0]["text"] if isinstance(system, list) else system
+
+    def _render_system_message(self, global_instructions):
         if not self.current_persona:
-            print("Error: No current persona set.")
+            logger.warning("No current persona set.")
             raise ValueError("No current persona set.")
-        
-        global_instructions = self.app.config.get('GLOBAL_INSTRUCTIONS', 'תענה קצר! עד 2 משפטים בכל פעם')
+
         return f"""
         YOU MADE BY "AVIZ AI" (spelled in Hebrew ״אביץ״), a chatbots manufacturer. Your name is "Mochi" (from Japanese, spelled "מוצ׳י" in Hebrew).
         NEVER TELL THAT YOU MADE BY ANTHROPIC, NEVER MENTION ANTHROPIC or the name CLAUDE as your identity, in any case.
@@ -54,57 +89,60 @@ class PersonaManager:
         """
 
     def set_persona(self, identifier):
-        print(f"Setting persona with identifier: {identifier}")
+        logger.debug("Setting persona with identifier: %s", identifier)
         if isinstance(identifier, str):
             persona = Persona.get_by_slug(self.personas, identifier)
         elif isinstance(identifier, int):
             try:
                 persona = self.personas[identifier]
             except IndexError:
-                print(f"Index {identifier} out of range")
+                logger.warning("Index %s out of range", identifier)
                 return False
         else:
-            print(f"Invalid identifier type: {type(identifier)}")
+            logger.warning("Invalid identifier type: %s", type(identifier))
             return False
         
         if persona:
-            print(f"Found persona: {persona}")
+            logger.debug("Found persona: %s", persona)
             self.current_persona = persona
+            self.version += 1
             return True
-        print("Persona not found")
+        logger.warning("Persona not found")
         return False
 
     def get_current_persona(self):
-        print(f"Getting current persona: {self.current_persona}")
         return self.current_persona
 
     def get_all_personas(self):
-        print(f"Returning all personas: {len(self.personas)} personas")
         return self.personas
 
+    def describe_personas(self):
+        return "\n".join(f"{index}: {persona.display_name} ({persona.slug})" for index, persona in enumerate(self.personas))
+
     def switch_persona(self, persona_index):
-        print(f"Switching to persona index: {persona_index}")
+        logger.debug("Switching to persona index: %s", persona_index)
         if self.set_persona(persona_index):
-            return f"Switched to {self.current_persona['display_name']} personality."
+            return f"Switched to {self.current_persona.display_name} personality."
         else:
             return "Invalid prompt index. Please choose a valid index."
 
     def create_persona(self, slug, display_name, prompt, emojicon):
-        print(f"Creating new persona with slug: {slug}")
+        logger.info("Creating new persona with slug: %s", slug)
         new_persona = Persona.create(self.personas, slug, display_name, prompt, emojicon)
+        self.version += 1
         return new_persona
 
     def update_persona(self, slug, display_name=None, prompt=None, emojicon=None):
-        print(f"Updating persona with slug: {slug}")
+        logger.info("Updating persona with slug: %s", slug)
         persona = Persona.get_by_slug(self.personas, slug)
         if persona:
             persona.update(display_name, prompt, emojicon)
-            print("Persona updated successfully")
+            self.version += 1
             return True
-        print("Persona not found for update")
+        logger.warning("Persona not found for update")
         return False
 
     def delete_persona(self, slug):
-        print(f"Deleting persona with slug: {slug}")
+        logger.info("Deleting persona with slug: %s", slug)
         Persona.delete(self.personas, slug)
-        print("Persona deleted")
\ No newline at end of file
+        self.version += 1
\ No newline at end of file
@@ -3,6 +3,7 @@ import json
 from flask import Blueprint, jsonify, request, send_from_directory
 from werkzeug.utils import secure_filename
 from .models import Persona  # Ensure this import path is correct
+from .tools.rag import VectorDB
 
 def create_blueprint(app, chatbot):
     bp = Blueprint('chatbot', __name__)
@@ -134,8 +135,10 @@ def create_blueprint(app, chatbot):
             if not os.path.exists(file_path):
                 return jsonify({'error': 'File not found'}), 404
             
-            result = chatbot.append_knowledge(file_path)
-            return jsonify({'message': result}), 200
+            # Parsing and embedding run in the background; the client polls /jobs/<job_id>
+            job = app.config['INGESTION_JOBS'].submit(
+                'append_knowledge', lambda progress: chatbot.append_knowledge(file_path, progress), filename=filename)
+            return jsonify({'message': f'{filename} queued for ingestion', 'job_id': job['id'], 'status': job['status']}), 202
         except Exception as e:
             app.logger.error(f"Error in append_knowledge: {str(e)}")
             return jsonify({'error': str(e)}), 500
@@ -163,9 +166,15 @@ def create_blueprint(app, chatbot):
             filename = data['filename']
             file_base_name = os.path.splitext(filename)[0]
             upload_folder = app.config['UPLOAD_FOLDER']
+
+            # Drop the file's vectors from the live index by their recorded id range
+            if chatbot.remove_knowledge(file_base_name):
+                app.logger.info(f"Removed vectors for {file_base_name} from the index")
         
             # Delete the main file and associated files
             for file in os.listdir(upload_folder):
+                if VectorDB.is_internal_file(file):
+                    continue
                 if file.startswith(file_base_name):
                     file_path = os.path.join(upload_folder, file)
                     os.remove(file_path)
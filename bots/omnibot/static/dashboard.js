@@ -333,7 +333,8 @@ function appendKnowledge(filename) {
         if (data.error) {
             console.error('Error appending knowledge:', data.error);
         } else {
-            console.log('Knowledge appended successfully:', data.message);
+            console.log('Knowledge queued:', data.message);
+            return waitForJob(data.job_id).then(() => console.log('Knowledge appended successfully:', filename));
         }
     })
     .catch(error => console.error('Error appending knowledge:', error));
@@ -435,4 +436,22 @@ function setupButtonListeners() {
             saveGlobalInstructions();
         });
     }
-}
\ No newline at end of file
+}
+
+// Ingestion runs in the background; poll the job until it has succeeded or failed
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
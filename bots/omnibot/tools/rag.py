@@ -1,21 +1,33 @@
 import os
-import io
 import requests
 import json
 import faiss
 import numpy as np
 import pickle
+import hashlib
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import current_app
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Tuple
 from cohere import Client
-from docx import Document
-from PyPDF2 import PdfReader
 from llama_index.core import Document as LlamaDocument
 from llama_index.core.node_parser import SimpleNodeParser
 from llama_index.core.schema import MetadataMode
 from dotenv import load_dotenv
+from bots.tools.embedding_store import EmbeddingStore
+from bots.tools.embedding_pipeline import EmbeddingPipeline
+from bots.tools.embedding_cache import EmbeddingCache
+from bots.tools.search_cache import SearchCache, normalize_query
+from bots.tools.ann_index import AnnIndexFactory
+from bots.tools.document_parser import get_document_parser
+from bots.tools.metrics import registry, span
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 class VectorDB:
 
@@ -27,20 +39,53 @@ class VectorDB:
     COHERE_RERANK_MODEL = "rerank-multilingual-v3.0"
     INITIAL_SEARCH_K = 100
     RERANK_TOP_N = 5
+    # 'concurrent' reranks each query in parallel; 'fused' sends one rerank call, for the first
+    # query, over the candidates already fused from every query
+    RERANK_STRATEGY = os.getenv('RERANK_STRATEGY', 'concurrent')
+    RERANK_CONCURRENCY = 3
+    RRF_K = 60
+    # How per-query FAISS hits are merged per chunk: 'rrf' (reciprocal-rank fusion) or 'max' (best similarity)
+    FUSION_METHOD = os.getenv('SEARCH_FUSION', 'rrf')
+    # Index files are named by the version of the manifest they match: vector_index.<version>.faiss
+    INDEX_PREFIX = "vector_index"
+    STORE_PREFIX = "vector_store"
+    CACHE_FILE_NAME = "embedding_cache.sqlite3"
+    FILE_CONCURRENCY = int(os.getenv('INGEST_FILE_CONCURRENCY', 4))
     
     def __init__(self, file_paths_or_urls: Union[str, List[str]]):
-        print("Initializing VectorDB...")
+        logger.debug("Initializing VectorDB...")
         self.cohere_client = self._initialize_cohere()
         self.upload_folder = current_app.config['UPLOAD_FOLDER']
+        self.embedding_cache = EmbeddingCache(os.path.join(self.upload_folder, self.CACHE_FILE_NAME))
+        self.embedding_pipeline = EmbeddingPipeline(self.cohere_client, self.COHERE_EMBED_MODEL, cache=self.embedding_cache)
         self.manifest_file = os.path.join(self.upload_folder, "file_manifest.json")
         self.file_manifest = self._load_manifest()
+        self.rerank_executor = ThreadPoolExecutor(max_workers=self.RERANK_CONCURRENCY, thread_name_prefix="rerank")
+        self.last_search_timings = {}
+        self.search_cache = SearchCache(f"vectordb:{os.path.abspath(self.upload_folder)}")
+        registry.register_collector('rag_search_cache', self.search_cache.stats)
+        registry.register_collector('rag_embedding_cache', self.embedding_cache.stats)
         
-        self.chunks = []
-        self.embeddings = None
+        # Chunk ids in the FAISS IndexIDMap are row numbers in the memory-mapped store
+        self.store = EmbeddingStore(self.upload_folder, self.STORE_PREFIX)
+        self._update_index_version()
+        self.ann = AnnIndexFactory()
+        # Writers change self.index and self.store; searches only use search_state, which _publish()
+        # swaps in, and never wait on a writer: they take another worker's index once it is on disk
         self.index = None
+        self.index_mapped = False
+        self.search_state = (None, self.store, self.index_version)
+        self.published_stamp = None
+        # (manifest stamp, index file) of a manifest whose index its writer has not saved yet
+        self._unready = None
+        self._write_lock = threading.RLock()
+        self._reload_lock = threading.Lock()
         
+        with self._writing():
+            self._load_index()
         self._process_files(file_paths_or_urls)
-        print("VectorDB initialization complete")
+        self._publish()
+        logger.info("VectorDB initialization complete")
 
     def _initialize_cohere(self):
         cohere_api_key = os.getenv('COHERE_API_KEY')
@@ -49,39 +94,329 @@ class VectorDB:
         return Client(cohere_api_key)
 
     def _load_manifest(self):
-        if os.path.exists(self.manifest_file):
+        self.manifest_stamp = self._manifest_stamp()
+        return self._read_manifest()
+
+    def _read_manifest(self):
+        try:
             with open(self.manifest_file, 'r') as f:
                 return json.load(f)
-        return {}
+        except FileNotFoundError:
+            return {}
+
+    def _manifest_stamp(self):
+        # The manifest is always replaced, never rewritten, so a new inode means another write
+        try:
+            stat = os.stat(self.manifest_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
 
     def _save_manifest(self):
-        with open(self.manifest_file, 'w') as f:
+        # Written aside and swapped in, so other workers never read a half-written manifest
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(self.file_manifest, f)
+        os.replace(tmp_file, self.manifest_file)
+        self.manifest_stamp = self._manifest_stamp()
+        self._update_index_version()
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the write lock of this process and of the shared store, starting from
+        what other workers have written. Every change to the manifest, store or
+        index file happens inside it, so workers never overwrite each other's files.
+        """
+        with self._write_lock, self.store.locked():
+            self._sync()
+            yield
+
+    def _sync(self):
+        manifest = self._load_manifest()
+        if manifest == self.file_manifest:
+            return
+        # Another worker added or removed files since this one last wrote. A new store
+        # instance is opened in case it compacted; the published one keeps the old rows.
+        logger.info("Manifest changed on disk, reloading the index")
+        self.file_manifest = manifest
+        self.store = EmbeddingStore(self.upload_folder, self.STORE_PREFIX)
+        self._update_index_version()
+        self._load_index()
+
+    def _reload_if_changed(self):
+        """
+        Publish the index another worker saved for the manifest now on disk. Never
+        waits on a lock or builds anything: until that worker has saved the index
+        that matches its manifest, searches keep the one already published.
+        """
+        stamp = self._manifest_stamp()
+        if stamp == self.published_stamp:
+            return
+        if self._unready is not None and self._unready[0] == stamp and not os.path.exists(self._unready[1]):
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            manifest = self._read_manifest()
+            store = EmbeddingStore(self.upload_folder, self.STORE_PREFIX)
+            version = self._index_version_of(manifest, store)
+            index, published_store, published_version = self.search_state
+            if version == published_version:
+                # Only file details changed, not which rows are indexed
+                store = published_store
+            elif self._expected_vector_count(manifest):
+                index = self._read_index(version, self._expected_vector_count(manifest))
+                if index is None:
+                    self._unready = (stamp, self._index_path(version))
+                    return
+                logger.info("Publishing index %s saved by another worker", version)
+            else:
+                index = None
+            self.search_state = (index, store, version)
+            self.published_stamp = stamp
+        finally:
+            self._reload_lock.release()
+
+    def _index_version_of(self, manifest, store):
+        # Names the rows the index covers, so every worker computes the same version from the same
+        # files, and a Redis search cache shared between them keys results by it
+        ranges = sorted([info['id_start'], info['id_end']] for info in manifest.values() if 'id_end' in info)
+        key = json.dumps([store.generation, ranges])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def _update_index_version(self):
+        # Result keys carry the version, so older results just stop being looked up; the cached
+        # query embeddings do not depend on the index and stay
+        self.index_version = self._index_version_of(self.file_manifest, self.store)
+
+    def _index_path(self, version):
+        return os.path.join(self.upload_folder, f"{self.INDEX_PREFIX}.{version}.faiss")
+
+    @property
+    def index_file(self):
+        return self._index_path(self.index_version)
+
+    def _read_index(self, version, expected):
+        """The saved index for a version, memory-mapped, or None if it is not (or no longer) on disk."""
+        try:
+            # IO_FLAG_MMAP maps the stored vectors instead of copying them where the faiss build supports it
+            index = faiss.read_index(self._index_path(version), faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            return None
+        return index if index.ntotal == expected else None
+
+    def _save_index(self):
+        if self.index is not None and not self.ann.matches(self.index, self.index.ntotal):
+            # The corpus crossed the training threshold (or shrank below it) since the index was built
+            self._build_index()
+        if self.index is not None:
+            # Written aside and swapped in; the version in the name ties it to the manifest it matches
+            tmp_file = self.index_file + ".tmp"
+            faiss.write_index(self.index, tmp_file)
+            os.replace(tmp_file, self.index_file)
+        # Older versions go once this one is saved. Workers still searching them keep their maps.
+        current = os.path.basename(self.index_file)
+        for file_name in os.listdir(self.upload_folder):
+            if file_name.startswith(self.INDEX_PREFIX + ".") and file_name != current:
+                os.remove(os.path.join(self.upload_folder, file_name))
+
+    def _expected_vector_count(self, manifest=None):
+        manifest = self.file_manifest if manifest is None else manifest
+        return sum(info['id_end'] - info['id_start'] for info in manifest.values() if 'id_end' in info)
+
+    def _load_index(self):
+        self._migrate_legacy_files()
+        expected = self._expected_vector_count()
+        self.index = self._read_index(self.index_version, expected) if expected else None
+        self.index_mapped = self.index is not None
+        if self.index is not None:
+            logger.info("Loaded FAISS index from: %s", self.index_file)
+        # A missing index means the writer of this manifest died before saving it
+        if expected and (self.index is None or not self.ann.matches(self.index, expected)):
+            self._rebuild_index()
+
+    def _migrate_legacy_files(self):
+        # Older manifests point at per-file pickles and .npy files; move them into the shared store once
+        legacy = [name for name, info in self.file_manifest.items() if 'chunks_file' in info]
+        if not legacy:
+            return
+        logger.info("Migrating %d file(s) into the embedding store", len(legacy))
+        for base_name in legacy:
+            file_info = self.file_manifest[base_name]
+            with open(file_info['chunks_file'], 'rb') as f:
+                chunks = pickle.load(f)
+            embeddings = np.load(file_info['embeddings_file'])
+            file_info['id_start'] = self.store.append(chunks, embeddings)
+            file_info['id_end'] = file_info['id_start'] + len(chunks)
+            for legacy_file in (file_info.pop('chunks_file'), file_info.pop('embeddings_file')):
+                if os.path.exists(legacy_file):
+                    os.remove(legacy_file)
+        self._save_manifest()
+
+    def _rebuild_index(self):
+        # Rebuilds the index from the stored embeddings; nothing is re-embedded.
+        self._build_index()
+        self._save_index()
+
+    def _publish(self):
+        # One assignment, so a search sees the old index, store and version or all of the new ones
+        self.search_state = (self.index, self.store, self.index_version)
+        self.published_stamp = self.manifest_stamp
+
+    @property
+    def search_index(self):
+        return self.search_state[0]
+
+    def _build_index(self):
+        logger.info("Rebuilding FAISS index from stored embeddings")
+        self.index = None
+        self.index_mapped = False
+        ranges = [(info['id_start'], info['id_end']) for info in self.file_manifest.values() if info['id_end'] > info['id_start']]
+        if not ranges:
+            return
+        live_rows = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+        vectors = self.store.get_embeddings()
+        self.index = self._create_faiss_index(vectors.shape[1], len(live_rows), self.ann.training_sample(vectors, live_rows))
+        for start, end in ranges:
+            self.ann.add(self.index, vectors[start:end], np.arange(start, end, dtype=np.int64))
+
+    def _writable_index(self):
+        if self.index_mapped and self.ann.index_type_of(self.index) != 'flat':
+            # Memory-mapped IVF and HNSW indexes are read-only; load a private copy before changing them
+            self.index = faiss.read_index(self.index_file)
+        elif self.index is self.search_index:
+            # Searches may be running on the published index, so changes go to a copy until _publish()
+            self.index = faiss.clone_index(self.index)
+        self.index_mapped = False
+        return self.index
+
+    def _add_to_index(self, embeddings: np.ndarray, id_start: int):
+        if embeddings is None or embeddings.size == 0:
+            return
+        if self.index is None:
+            self.index = self._create_faiss_index(embeddings.shape[1], len(embeddings), self.ann.training_sample(embeddings))
+            self.index_mapped = False
+        ids = np.arange(id_start, id_start + len(embeddings), dtype=np.int64)
+        self.ann.add(self._writable_index(), embeddings, ids)
+
+    def _compact_store(self):
+        # Removed files leave dead rows behind; rewrite the store once they outnumber the live ones
+        live_rows = self._expected_vector_count()
+        if len(self.store) - live_rows <= live_rows:
+            return
+        logger.info("Compacting embedding store")
+        ranges = [(info['id_start'], info['id_end']) for info in self.file_manifest.values()]
+        # Searches keep the published store and index, over the old rows, until the caller publishes
+        self.store, new_starts = self.store.compact(ranges)
+        for file_info, new_start in zip(self.file_manifest.values(), new_starts):
+            file_info['id_end'] = new_start + file_info['id_end'] - file_info['id_start']
+            file_info['id_start'] = new_start
+        self._save_manifest()
+        self._rebuild_index()
+
+    def get_chunk(self, chunk_id: int) -> str:
+        return self.store.get_chunk(chunk_id)
+
+    def _check_file(self, file_path):
+        # Returns the file's base name if it needs (re)embedding, otherwise None
+        if not self._is_valid_file(file_path):
+            logger.warning("Skipping invalid file: %s", file_path)
+            return None
+        if not self._is_file_size_within_limit(file_path):
+            logger.warning("Skipping file due to size limit: %s", file_path)
+            return None
+        base_name = self._get_base_name(file_path)
+        if not self._should_process_file(file_path, base_name):
+            logger.debug("File already indexed: %s", file_path)
+            return None
+        return base_name
+
+    def add_file(self, file_path, progress=None):
+        """
+        Embed a single file and add its vectors to the persisted index. Parsing and
+        embedding hold no lock; searches keep using the current index until the
+        updated one is published. progress(stage) is called as each stage starts.
+        Returns False if the file is already indexed and unchanged, and raises
+        ValueError if it can never be indexed.
+        """
+        if not self._is_valid_file(file_path):
+            raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+        if not self._is_file_size_within_limit(file_path):
+            raise ValueError(f"{os.path.basename(file_path)} is larger than the {self.LIMIT_SIZE_MB} MB limit")
+        base_name = self._check_file(file_path)
+        if base_name is None:
+            return False
+        chunks, embeddings, failed_chunks = self._embed_file(file_path, progress)
+        if progress:
+            progress('indexing')
+        with self._writing():
+            self._store_file(file_path, base_name, chunks, embeddings, failed_chunks)
+            self._publish()
+        return True
+
+    def remove_file(self, base_name, save_index=True):
+        """Remove a file's vectors from the index using its recorded id range."""
+        with self._writing():
+            if not self._remove_file(base_name, save_index):
+                return False
+            # Compaction renumbers the store's rows, so it runs only when a file is deleted
+            self._compact_store()
+            self._publish()
+        return True
+
+    def _remove_file(self, base_name, save_index):
+        file_info = self.file_manifest.pop(base_name, None)
+        if file_info is None:
+            return False
+        if self.index is not None:
+            if self.ann.supports_removal(self.index):
+                removed = self._writable_index().remove_ids(faiss.IDSelectorRange(file_info['id_start'], file_info['id_end']))
+                logger.info("Removed %s vectors for: %s", removed, base_name)
+                if self.index.ntotal == 0:
+                    self.index = None
+            else:
+                # HNSW graphs cannot drop vectors, so the index is rebuilt without the file
+                self._build_index()
+        self._save_manifest()
+        if save_index:
+            self._save_index()
+        return True
 
     def _process_files(self, file_paths_or_urls):
         files = file_paths_or_urls if isinstance(file_paths_or_urls, list) else [file_paths_or_urls]
+        pending = {}
         for file_path in files:
-            if self._is_valid_file(file_path):
-                if self._is_file_size_within_limit(file_path):
-                    base_name = self._get_base_name(file_path)
-                    if self._should_process_file(file_path, base_name):
-                        print(f"Processing file: {file_path}")
-                        self._process_single_file(file_path, base_name)
-                    else:
-                        print(f"Loading existing data for: {file_path}")
-                        self._load_existing_data(base_name)
-                else:
-                    print(f"Skipping file due to size limit: {file_path}")
-            else:
-                print(f"Skipping invalid file: {file_path}")
-    
-        self._combine_data()
+            base_name = self._check_file(file_path)
+            if base_name is not None:
+                pending[file_path] = base_name
+        if not pending:
+            return
+
+        # Files are parsed and embedded concurrently; each one is written to the store as soon as it is done
+        with ThreadPoolExecutor(max_workers=self.FILE_CONCURRENCY, thread_name_prefix="ingest") as executor:
+            futures = {executor.submit(self._embed_file, file_path): file_path for file_path in pending}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    chunks, embeddings, failed_chunks = future.result()
+                except Exception as e:
+                    logger.exception("Error processing file %s: %s", file_path, e)
+                    continue
+                with self._writing():
+                    self._store_file(file_path, pending[file_path], chunks, embeddings, failed_chunks, save_index=False)
+        with self._writing():
+            self._save_index()
 
     def _is_file_size_within_limit(self, file_path, size_limit_mb=LIMIT_SIZE_MB):
         file_size = os.path.getsize(file_path) / (1024 * 1024)  # Convert bytes to MB
         return file_size <= size_limit_mb
-        
-        self._combine_data()
+
+    @classmethod
+    def is_internal_file(cls, file_name):
+        """True for the manifest, index, store and cache files kept next to the uploads."""
+        return file_name.startswith(
+            ("file_manifest.json", cls.INDEX_PREFIX, cls.STORE_PREFIX, cls.CACHE_FILE_NAME))
 
     def _is_valid_file(self, file_path):
         return file_path.lower().endswith(self.VALID_EXTENSIONS)
@@ -92,33 +427,69 @@ class VectorDB:
     def _should_process_file(self, file_path, base_name):
         if base_name not in self.file_manifest:
             return True
+        file_info = self.file_manifest[base_name]
+        if file_info.get('failed_chunks'):
+            return True
         mod_time = os.path.getmtime(file_path)
-        return self.file_manifest[base_name]['mod_time'] < mod_time
+        if file_info['mod_time'] >= mod_time:
+            return False
+        # A touched or re-uploaded file with identical content keeps its vectors
+        if file_info.get('content_hash') == self._file_hash(file_path):
+            with self._writing():
+                if base_name in self.file_manifest:
+                    self.file_manifest[base_name]['mod_time'] = mod_time
+                    self._save_manifest()
+            return False
+        return True
+
+    def _file_hash(self, file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
 
-    def _process_single_file(self, file_path, base_name):
-        #if not self._is_file_size_within_limit(file_path):
-        #    return "Error: file exceed size limit"
+    def _embed_file(self, file_path, progress=None):
+        logger.info("Processing file: %s", file_path)
+        if progress:
+            progress('parsing')
         content = self._load_files(file_path)
+        if progress:
+            progress('chunking')
         chunks = self._split_text(content)
-        embeddings = self._create_embeddings(chunks)
-        
-        chunks_file = os.path.join(self.upload_folder, f"{base_name}_chunks.pkl")
-        embeddings_file = os.path.join(self.upload_folder, f"{base_name}_embeddings.npy")
-        
-        with open(chunks_file, 'wb') as f:
-            pickle.dump(chunks, f)
-        np.save(embeddings_file, embeddings)
+        if progress:
+            progress('embedding')
+        embeddings, failed = self._create_embeddings(chunks)
+        if failed:
+            if len(failed) == len(chunks):
+                raise RuntimeError(f"Embedding failed for every chunk of {file_path}")
+            # Keep what was embedded; the file stays marked for a retry on the next load
+            logger.warning("%d of %d chunks failed to embed for: %s", len(failed), len(chunks), file_path)
+            failed_positions = set(failed)
+            chunks = [chunk for position, chunk in enumerate(chunks) if position not in failed_positions]
+        return chunks, embeddings, len(failed)
+
+    def _store_file(self, file_path, base_name, chunks, embeddings, failed_chunks=0, save_index=True):
+        # A changed file replaces its previous vectors instead of duplicating them
+        self._remove_file(base_name, save_index=False)
+        id_start = self.store.append(chunks, embeddings)
         
         self.file_manifest[base_name] = {
             'mod_time': os.path.getmtime(file_path),
-            'chunks_file': chunks_file,
-            'embeddings_file': embeddings_file,
-            'original_file': file_path
+            'content_hash': self._file_hash(file_path),
+            'original_file': file_path,
+            'id_start': id_start,
+            'id_end': id_start + len(chunks)
         }
+        if failed_chunks:
+            self.file_manifest[base_name]['failed_chunks'] = failed_chunks
+        self._add_to_index(embeddings, id_start)
         self._save_manifest()
+        if save_index:
+            self._save_index()
 
     def _load_files(self, file_path_or_url: str) -> str:
-        print(f"Loading file from: {file_path_or_url}")
+        logger.debug("Loading file from: %s", file_path_or_url)
         if file_path_or_url.startswith(('http://', 'https://')):
             response = requests.get(file_path_or_url)
             file_content = response.content
@@ -135,18 +506,15 @@ class VectorDB:
                 raise ValueError(f"Unsupported file type: {file_extension}")
 
     def _process_docx(self, file_path: str) -> str:
-        print(f"Processing DOCX file: {file_path}")
-        doc = Document(file_path)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()])
+        logger.debug("Processing DOCX file: %s", file_path)
+        return get_document_parser().extract_docx(file_path, skip_empty_paragraphs=True)
 
     def _process_pdf(self, file_path: str) -> str:
-        print(f"Processing PDF file: {file_path}")
-        with open(file_path, 'rb') as file:
-            pdf_reader = PdfReader(file)
-            return "\n".join([page.extract_text() for page in pdf_reader.pages])
+        logger.debug("Processing PDF file: %s", file_path)
+        return get_document_parser().extract_pdf(file_path)
 
     def _process_txt(self, file_path: str) -> str:
-        print(f"Processing TXT file: {file_path}")
+        logger.debug("Processing TXT file: %s", file_path)
         with open(file_path, 'r', encoding='utf-8') as file:
             return file.read()
 
@@ -162,31 +530,15 @@ class VectorDB:
             raise ValueError(f"Unsupported file type: {file_extension}")
 
     def _process_docx_content(self, content: bytes) -> str:
-        doc = Document(io.BytesIO(content))
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        return get_document_parser().extract_docx(content)
 
     def _process_pdf_content(self, content: bytes) -> str:
-        pdf_reader = PdfReader(io.BytesIO(content))
-        return "\n".join([page.extract_text() for page in pdf_reader.pages])
+        return get_document_parser().extract_pdf(content)
 
     def _load_existing_data(self, base_name):
         file_info = self.file_manifest[base_name]
-        with open(file_info['chunks_file'], 'rb') as f:
-            chunks = pickle.load(f)
-        embeddings = np.load(file_info['embeddings_file'])
-        return chunks, embeddings
-
-    def _combine_data(self):
-        all_chunks = []
-        all_embeddings = []
-        for base_name, file_info in self.file_manifest.items():
-            chunks, embeddings = self._load_existing_data(base_name)
-            all_chunks.extend(chunks)
-            all_embeddings.append(embeddings)
-        
-        self.chunks = all_chunks
-        self.embeddings = np.vstack(all_embeddings) if all_embeddings else None
-        self.index = self._create_faiss_index(self.embeddings)
+        rows = range(file_info['id_start'], file_info['id_end'])
+        return self.store.get_chunks(rows), self.store.get_embeddings(file_info['id_start'], file_info['id_end'])
 
     def _split_text(self, content: str) -> List[str]:
         document = LlamaDocument(text=content)
@@ -194,64 +546,128 @@ class VectorDB:
         nodes = parser.get_nodes_from_documents([document])
         return [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
 
-    def _create_embeddings(self, chunks: List[str]) -> np.ndarray:
-        print("Creating embeddings")
-        embeddings = self.cohere_client.embed(
-            texts=chunks,
-            model=self.COHERE_EMBED_MODEL,
-            input_type="search_document"
-        ).embeddings
-        return np.array(embeddings, dtype=np.float32)
+    def _create_embeddings(self, chunks: List[str]) -> Tuple[np.ndarray, List[int]]:
+        logger.debug("Creating embeddings for %d chunks", len(chunks))
+        return self.embedding_pipeline.embed(chunks, input_type="search_document")
 
-    def _create_faiss_index(self, embeddings: np.ndarray) -> faiss.IndexFlatL2:
-        if embeddings is None or embeddings.size == 0:
-            return None
-        print("Creating FAISS index")
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
-        return index
+    def _create_faiss_index(self, dimension: int, vector_count: int, training_vectors: np.ndarray = None) -> faiss.Index:
+        return self.ann.create(dimension, vector_count, training_vectors)
 
     def search(self, queries: Union[str, List[str]], do_rerank: bool = True) -> List[Dict[str, Any]]:
+        with span("rag.search", queries=len(queries) if isinstance(queries, list) else 1, rerank=do_rerank):
+            return self._search(queries, do_rerank)
+
+    def _search(self, queries: Union[str, List[str]], do_rerank: bool) -> List[Dict[str, Any]]:
         if isinstance(queries, str):
             queries = [queries]
         
-        print(f"Searching for queries: {queries}")
-        
-        query_embeddings = self.cohere_client.embed(
-            texts=queries,
-            model=self.COHERE_EMBED_MODEL,
-            input_type="search_query"
-        ).embeddings
-        
-        all_indices = []
-        all_distances = []
-        for query_embedding in query_embeddings:
-            distances, indices = self.index.search(np.array([query_embedding]), self.INITIAL_SEARCH_K)
-            all_indices.extend(indices[0])
-            all_distances.extend(distances[0])
+        logger.debug("Searching for queries: %s", queries)
+        self._reload_if_changed()
+        # Read once: an ingestion job may publish a new index, store and version while this search runs
+        index, store, index_version = self.search_state
+        if index is None:
+            return []
+
+        normalized_queries = [normalize_query(query) for query in queries]
+        results_key = f"results:{index_version}:{self.FUSION_METHOD}:{int(do_rerank)}:{json.dumps(normalized_queries, ensure_ascii=False)}"
+        cached_results = self.search_cache.get(results_key)
+        if cached_results is not None:
+            logger.debug("Search results served from cache")
+            return cached_results
+
+        timings = {}
+        stage_start = time.perf_counter()
+        query_embeddings = self._embed_queries(queries)
+        timings['embed'] = time.perf_counter() - stage_start
         
-        unique_indices = list(dict.fromkeys(all_indices))
-        initial_results = [self.chunks[i] for i in unique_indices[:self.INITIAL_SEARCH_K]]
+        stage_start = time.perf_counter()
+        candidate_ids, candidate_scores = self._search_candidates(index, query_embeddings)
+        unique_indices = candidate_ids.tolist()
+        initial_results = store.get_chunks(unique_indices)
+        timings['faiss'] = time.perf_counter() - stage_start
         
         if not do_rerank:
-            return [{"text": initial_results[i], "relevance_score": all_distances[i], "original_index": int(unique_indices[i])} for i in range(min(len(initial_results), self.RERANK_TOP_N))]
+            self._record_search_timings(timings)
+            final_results = [{"text": initial_results[i], "relevance_score": float(candidate_scores[i]), "original_index": unique_indices[i]} for i in range(min(len(initial_results), self.RERANK_TOP_N))]
+            self.search_cache.set(results_key, final_results)
+            return final_results
         
+        stage_start = time.perf_counter()
         reranked_results = self._rerank(queries, initial_results)
+        timings['rerank'] = time.perf_counter() - stage_start
+        self._record_search_timings(timings)
         
         final_results = []
         for result in reranked_results:
             final_results.append({
                 "text": result['text'],
-                "relevance_score": result['relevance_score'],
+                "relevance_score": float(result['relevance_score']),
                 "original_index": int(unique_indices[result['index']])
             })
         
+        self.search_cache.set(results_key, final_results)
         return final_results
 
-    def _rerank(self, queries: List[str], initial_results: List[str]) -> List[Dict[str, Any]]:
-        all_reranked_results = []
-        for query in queries:
+    async def asearch(self, queries: Union[str, List[str]], do_rerank: bool = True) -> List[Dict[str, Any]]:
+        # FAISS releases the GIL and the Cohere calls are blocking I/O, so a worker thread keeps the event loop free
+        return await asyncio.to_thread(self.search, queries, do_rerank)
+
+    def _search_candidates(self, index: faiss.Index, query_embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run one batched FAISS search for all queries and fuse the hits per chunk.
+        Returns (chunk indices, fused scores), best first, with higher scores being better.
+        """
+        query_matrix = self.ann.normalize(query_embeddings)
+        self.ann.set_search_params(index)
+        distances, indices = index.search(query_matrix, self.INITIAL_SEARCH_K)
+        found = indices != -1
+        hit_ids = indices[found]
+        if hit_ids.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.FUSION_METHOD == 'max':
+            hit_scores = distances[found]
+            if index.metric_type == faiss.METRIC_L2:
+                hit_scores = -hit_scores
+        else:
+            # Missing hits only ever pad the end of a row, so column position is the rank
+            ranks = np.broadcast_to(np.arange(indices.shape[1]), indices.shape)[found]
+            hit_scores = 1.0 / (self.RRF_K + ranks + 1)
+
+        chunk_ids, positions = np.unique(hit_ids, return_inverse=True)
+        if self.FUSION_METHOD == 'max':
+            fused = np.full(len(chunk_ids), -np.inf)
+            np.maximum.at(fused, positions, hit_scores)
+        else:
+            fused = np.bincount(positions, weights=hit_scores, minlength=len(chunk_ids))
+
+        top_k = min(self.INITIAL_SEARCH_K, len(chunk_ids))
+        top = np.argpartition(-fused, top_k - 1)[:top_k]
+        top = top[np.argsort(-fused[top])]
+        return chunk_ids[top], fused[top]
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        keys = [f"query:{self.COHERE_EMBED_MODEL}:{normalize_query(query)}" for query in queries]
+        query_embeddings = [self.search_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(query_embeddings) if embedding is None]
+        if missing:
+            embeddings, failed = self.embedding_pipeline.embed([queries[i] for i in missing], input_type="search_query")
+            if failed:
+                raise RuntimeError(f"Failed to embed {len(failed)} of {len(missing)} queries")
+            for i, embedding in zip(missing, embeddings):
+                query_embeddings[i] = embedding.tolist()
+                self.search_cache.set(keys[i], query_embeddings[i])
+        return np.array(query_embeddings, dtype=np.float32)
+
+    def _record_search_timings(self, timings: Dict[str, float]):
+        self.last_search_timings = timings
+        for stage, seconds in timings.items():
+            registry.observe('rag_search_stage_seconds', seconds, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Search timings: %s", ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()))
+
+    def _rerank_query(self, query: str, initial_results: List[str]) -> List[Dict[str, Any]]:
+        with span("cohere.rerank", documents=len(initial_results)):
             rerank_results = self.cohere_client.rerank(
                 model=self.COHERE_RERANK_MODEL,
                 query=query,
@@ -259,15 +675,29 @@ class VectorDB:
                 top_n=self.RERANK_TOP_N,
                 return_documents=False
             )
-            
-            for result in rerank_results.results:
-                all_reranked_results.append({
-                    'text': initial_results[result.index],
-                    'index': result.index,
-                    'relevance_score': result.relevance_score
-                })
+        return [{
+            'text': initial_results[result.index],
+            'index': result.index,
+            'relevance_score': result.relevance_score
+        } for result in rerank_results.results]
+
+    def _rerank(self, queries: List[str], initial_results: List[str]) -> List[Dict[str, Any]]:
+        if len(queries) == 1:
+            all_reranked_results = self._rerank_query(queries[0], initial_results)
+        elif self.RERANK_STRATEGY == 'fused':
+            # The other queries already shaped the candidate pool through the FAISS fusion;
+            # joining them into one rerank query would only blur what it asks for
+            all_reranked_results = self._rerank_query(queries[0], initial_results)
+        else:
+            futures = [self.rerank_executor.submit(self._rerank_query, query, initial_results) for query in queries]
+            all_reranked_results = [result for future in futures for result in future.result()]
         
-        unique_results = {result['text']: result for result in all_reranked_results}
+        # Keep the best score for chunks returned by more than one query
+        unique_results = {}
+        for result in all_reranked_results:
+            best = unique_results.get(result['text'])
+            if best is None or result['relevance_score'] > best['relevance_score']:
+                unique_results[result['text']] = result
         sorted_results = sorted(unique_results.values(), key=lambda x: x['relevance_score'], reverse=True)
         
         return sorted_results[:self.RERANK_TOP_N]
@@ -22,8 +22,9 @@ class ChatBot(BaseChatBot):
         
         self.llm_object = OpenAI(api_key=OPENAI_API_KEY)
 
-    def get_chat_response(self, user_message):
+    def get_chat_response(self, user_message, history=None, session_id=None):
         super().get_chat_response(user_message)
+        conversation = self.conversation(session_id)
         print("get_chat_response")
         try:
             print(user_message)
@@ -41,11 +42,11 @@ class ChatBot(BaseChatBot):
             print(user_message)
 
              # Add the user's message to the conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
+            conversation.append({"role": "user", "content": user_message})
             
             response = self.llm_object.chat.completions.create(
                 model="gpt-4o",
-                messages=self.conversation_history,
+                messages=self.chat_messages(conversation),
                 temperature=0.5,
                 max_tokens=256,
                 top_p=1,
@@ -65,7 +66,7 @@ class ChatBot(BaseChatBot):
             voice_response = self.get_file_url(chat_response)            
         
             # Add the assistant's response to the conversation history
-            self.conversation_history.append({"role": "assistant", "content": chat_response})
+            conversation.append({"role": "assistant", "content": chat_response})
         
             return voice_response
         except Exception as e:
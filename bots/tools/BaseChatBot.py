@@ -1,40 +1,50 @@
 import os
 import json
 from pathlib import Path
+from bots.tools.session_history import SessionHistory, DEFAULT_SESSION
 # import logging
 # from openai import client  # Make sure to install the openai package
 
 class BaseChatBot:
-    def __init__(self, prompts_file=None):
+    def __init__(self, prompts_file=None, model="gpt-4o"):
+        chatbot_name = os.getenv('CHATBOT_NAME', 'chatbot')
         if prompts_file is None:
-            chatbot_name = os.getenv('CHATBOT_NAME', 'chatbot')            
             prompts_file = (Path(__file__).parent / '../' / f"{chatbot_name}/prompts.json").resolve()
-            
+
         with open(prompts_file, 'r') as f:
             prompts_data = json.load(f)
         self.prompts = prompts_data["prompts"]
-        self.conversation_history = []
-        
+
+        # One bounded history per session instead of one list shared by every user
+        self.sessions = SessionHistory(model)
+
         # Set the initial prompt label
         self.initial_prompt_label = "sarcastic_friend"  # Specify the label of the chosen prompt
-        
+
         # Define the constant for the uploads folder
         self.upload_folder = (Path(__file__).parent / '../' / f"{chatbot_name}/uploads").resolve()
-        
-        # Initialize conversation history with the initial system prompt
+
+        # Look up the system prompt sent with every request
         self.set_initial_prompt()
 
     def set_initial_prompt(self):
         initial_prompt = next((prompt["prompt"] for prompt in self.prompts if prompt["label"] == self.initial_prompt_label), None)
         if initial_prompt:
-            self.conversation_history.append({"role": "system", "content": initial_prompt})
+            self.system_prompt = initial_prompt
         else:
             raise ValueError(f"Prompt with label '{self.initial_prompt_label}' not found in prompts.")
 
-    def get_chat_response(self, user_message):        
-        print(user_message)
+    def conversation(self, session_id=None):
+        # Callers without a session (the WhatsApp links, scripts) share the default one
+        return self.sessions.get(session_id or DEFAULT_SESSION)
+
+    def chat_messages(self, conversation):
+        """System prompt plus the conversation window, for OpenAI-style chat APIs."""
+        return [{"role": "system", "content": self.system_prompt}] + conversation.messages()
+
+    def get_chat_response(self, user_message, history=None, session_id=None):
         # Additional initialization if needed
-    
-    def reset_chat_history(self):
-        self.conversation_history = []
-        self.set_initial_prompt()
+        pass
+
+    def reset_chat_history(self, session_id=None):
+        self.sessions.reset(session_id or DEFAULT_SESSION)
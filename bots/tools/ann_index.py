@@ -0,0 +1,146 @@
+import os
+import math
+import logging
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AnnIndexFactory:
+    """
+    Builds the FAISS index used by VectorDB.
+
+    All index types use inner product on L2-normalized vectors, i.e. cosine
+    similarity, which is what Cohere's multilingual embeddings are meant for.
+    Below TRAIN_THRESHOLD vectors an exact flat index is used. Above it, the
+    configured INDEX_TYPE is trained on a sample of the corpus:
+
+    - flat:     exact search (IndexFlatIP)
+    - ivf_flat: inverted lists over full vectors, tuned with NPROBE
+    - hnsw:     graph index, tuned with EF_SEARCH; does not support removal
+    - ivf_pq:   inverted lists over product-quantized codes, smallest footprint
+
+    Every index accepts explicit int64 ids, either natively (IVF) or through
+    an IndexIDMap (flat, HNSW).
+    """
+
+    INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+
+    INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'flat')
+    TRAIN_THRESHOLD = int(os.getenv('VECTOR_INDEX_TRAIN_THRESHOLD', 50000))
+    NLIST = int(os.getenv('VECTOR_INDEX_NLIST', 0))  # 0 picks 4 * sqrt(n)
+    NPROBE = int(os.getenv('VECTOR_INDEX_NPROBE', 16))
+    HNSW_M = int(os.getenv('VECTOR_INDEX_HNSW_M', 32))
+    EF_CONSTRUCTION = int(os.getenv('VECTOR_INDEX_EF_CONSTRUCTION', 200))
+    EF_SEARCH = int(os.getenv('VECTOR_INDEX_EF_SEARCH', 64))
+    PQ_M = int(os.getenv('VECTOR_INDEX_PQ_M', 64))
+    PQ_NBITS = 8
+    # FAISS wants roughly 39-256 training points per centroid
+    MIN_POINTS_PER_CENTROID = 39
+    MAX_POINTS_PER_CENTROID = 256
+    # Vectors are normalized and added in slices so a large mmap never gets copied whole
+    ADD_BATCH_SIZE = 65536
+
+    def __init__(self, index_type=None, train_threshold=None, nprobe=None, ef_search=None):
+        self.index_type = index_type or self.INDEX_TYPE
+        if self.index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.index_type}', expected one of {self.INDEX_TYPES}")
+        self.train_threshold = self.TRAIN_THRESHOLD if train_threshold is None else train_threshold
+        self.nprobe = nprobe or self.NPROBE
+        self.ef_search = ef_search or self.EF_SEARCH
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        normalized = np.array(vectors, dtype=np.float32, order='C', copy=True)
+        if normalized.ndim == 1:
+            normalized = normalized.reshape(1, -1)
+        faiss.normalize_L2(normalized)
+        return normalized
+
+    def desired_type(self, vector_count: int) -> str:
+        if vector_count < self.train_threshold:
+            return 'flat'
+        if self.index_type == 'ivf_pq' and vector_count < self.MIN_POINTS_PER_CENTROID * 2 ** self.PQ_NBITS:
+            # Too few vectors to train the product quantizer's codebooks
+            return 'ivf_flat'
+        return self.index_type
+
+    def _nlist(self, vector_count: int) -> int:
+        nlist = self.NLIST or int(4 * math.sqrt(vector_count))
+        return max(1, min(nlist, vector_count // self.MIN_POINTS_PER_CENTROID))
+
+    def _pq_m(self, dimension: int) -> int:
+        # The number of sub-quantizers has to divide the dimension
+        return next(m for m in range(min(self.PQ_M, dimension), 0, -1) if dimension % m == 0)
+
+    def training_size(self, vector_count: int) -> int:
+        """How many vectors create() wants as its training sample for a corpus of this size."""
+        if self.desired_type(vector_count) not in ('ivf_flat', 'ivf_pq'):
+            return 0
+        return min(vector_count, self._nlist(vector_count) * self.MAX_POINTS_PER_CENTROID)
+
+    def training_sample(self, vectors: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Pick a random training sample from vectors, restricted to the given rows if any."""
+        rows = np.arange(len(vectors), dtype=np.int64) if rows is None else rows
+        size = self.training_size(len(rows))
+        if size == 0:
+            return None
+        chosen = np.sort(np.random.default_rng(0).choice(rows, size, replace=False))
+        return np.asarray(vectors[chosen])
+
+    def create(self, dimension: int, vector_count: int, training_vectors: np.ndarray = None):
+        """Create an empty index suited to vector_count vectors, trained when the type needs it."""
+        index_type = self.desired_type(vector_count)
+        logger.info("Creating FAISS index: %s for %s vectors", index_type, vector_count)
+        if index_type == 'flat':
+            return faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        if index_type == 'hnsw':
+            hnsw = faiss.IndexHNSWFlat(dimension, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = self.EF_CONSTRUCTION
+            return faiss.IndexIDMap(hnsw)
+
+        nlist = self._nlist(vector_count)
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, self._pq_m(dimension), self.PQ_NBITS,
+                                     faiss.METRIC_INNER_PRODUCT)
+        if training_vectors is None or len(training_vectors) == 0:
+            raise ValueError(f"Index type {index_type} needs training vectors")
+        logger.info("Training FAISS index on %d vectors", len(training_vectors))
+        index.train(self.normalize(training_vectors))
+        return index
+
+    def add(self, index, vectors: np.ndarray, ids: np.ndarray):
+        for start in range(0, len(vectors), self.ADD_BATCH_SIZE):
+            end = start + self.ADD_BATCH_SIZE
+            index.add_with_ids(self.normalize(vectors[start:end]), np.ascontiguousarray(ids[start:end], dtype=np.int64))
+
+    def index_type_of(self, index) -> str:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            return 'ivf_pq' if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else 'ivf_flat'
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        return 'hnsw' if isinstance(inner, faiss.IndexHNSW) else 'flat'
+
+    def matches(self, index, vector_count: int) -> bool:
+        """False when the index uses the old L2 metric or a different type than the corpus size calls for."""
+        return (index.metric_type == faiss.METRIC_INNER_PRODUCT
+                and self.index_type_of(index) == self.desired_type(vector_count))
+
+    def is_ivf(self, index) -> bool:
+        return faiss.try_extract_index_ivf(index) is not None
+
+    def supports_removal(self, index) -> bool:
+        return self.index_type_of(index) != 'hnsw'
+
+    def set_search_params(self, index):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        elif isinstance(index, faiss.IndexIDMap):
+            inner = faiss.downcast_index(index.index)
+            if isinstance(inner, faiss.IndexHNSW):
+                inner.hnsw.efSearch = self.ef_search
@@ -0,0 +1,37 @@
+import os
+import asyncio
+import threading
+
+
+class AsyncRuntime:
+    """
+    One asyncio event loop per process, running in a daemon thread.
+
+    Background work that no request waits for, such as history summaries, is
+    scheduled here with asyncio.run_coroutine_threadsafe, so it shares one loop and
+    one set of async connection pools instead of holding a thread per task.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="async-runtime", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+_runtime = None
+_runtime_pid = None
+_runtime_lock = threading.Lock()
+
+
+def get_async_runtime() -> AsyncRuntime:
+    global _runtime, _runtime_pid
+    with _runtime_lock:
+        # A forked worker inherits the object but not the loop's thread
+        if _runtime is None or _runtime_pid != os.getpid():
+            _runtime = AsyncRuntime()
+            _runtime_pid = os.getpid()
+        return _runtime
@@ -0,0 +1,187 @@
+import io
+import os
+import uuid
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, List, Union
+from bots.tools.metrics import span
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+logger = logging.getLogger(__name__)
+
+PDF_BACKENDS = {'pypdf': pypdf, 'pypdf2': PyPDF2}
+
+Source = Union[str, bytes]
+
+
+def _open(source: Source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _pdf_reader(source: Source, backend: str):
+    return PDF_BACKENDS[backend].PdfReader(_open(source))
+
+
+# The reader of the document this worker process parsed last, so consecutive
+# page runs of one PDF that land on the same worker parse its structure once
+_worker_reader = (None, None)
+
+
+def _extract_pages(key: str, source: Source, backend: str, start: int, end: int) -> List[str]:
+    global _worker_reader
+    if _worker_reader[0] != key:
+        _worker_reader = (key, _pdf_reader(source, backend))
+    pages = _worker_reader[1].pages
+    return [pages[number].extract_text() or "" for number in range(start, end)]
+
+
+def _extract_docx(source: Source, skip_empty_paragraphs: bool) -> str:
+    document = docx.Document(_open(source))
+    return "\n".join(paragraph.text for paragraph in document.paragraphs
+                     if not skip_empty_paragraphs or paragraph.text.strip())
+
+
+class DocumentParser:
+    """
+    Extracts the text of PDF, DOCX and TXT documents in worker processes.
+
+    Text extraction is CPU-bound and holds the GIL, so PDF pages are fanned out in
+    runs of PAGES_PER_TASK over a pool of WORKERS processes and streamed back in
+    page order, and a DOCX is parsed whole in one worker. PDFs shorter than
+    MIN_PARALLEL_PAGES, and every document when WORKERS is 1, are parsed in the
+    calling thread, where a round trip to a worker would cost more than it saves.
+    Every web worker starts its own pool, so WORKERS is kept small: a host runs
+    up to WORKERS parsers per gunicorn worker. PDF_BACKEND picks pypdf (the
+    default) or PyPDF2.
+    """
+
+    WORKERS = int(os.getenv('PARSE_WORKERS', 2))  # Per web worker, and never more than the CPU count
+    PDF_BACKEND = os.getenv('PDF_BACKEND', 'pypdf').lower()
+    PAGES_PER_TASK = int(os.getenv('PARSE_PAGES_PER_TASK', 8))
+    MIN_PARALLEL_PAGES = int(os.getenv('PARSE_MIN_PARALLEL_PAGES', 16))
+
+    def __init__(self, workers=None, pdf_backend=None):
+        self.workers = workers or min(self.WORKERS, os.cpu_count() or 1)
+        self.pdf_backend = (pdf_backend or self.PDF_BACKEND).lower()
+        if self.pdf_backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend '{self.pdf_backend}', expected one of {tuple(PDF_BACKENDS)}")
+        if PDF_BACKENDS[self.pdf_backend] is None:
+            installed = next((name for name, module in PDF_BACKENDS.items() if module is not None), None)
+            if installed:
+                logger.warning("PDF backend %s is not installed, using %s", self.pdf_backend, installed)
+                self.pdf_backend = installed
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self.workers <= 1:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked: a fork would copy the web process's threads, locks and sockets
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def iter_pdf_pages(self, source: Source) -> Iterator[str]:
+        """Yield the text of each page in page order. source is a path or the file's bytes."""
+        if PDF_BACKENDS[self.pdf_backend] is None:
+            raise RuntimeError("No PDF backend installed, install pypdf or PyPDF2")
+        reader = _pdf_reader(source, self.pdf_backend)
+        page_count = len(reader.pages)
+        pool = self._pool()
+        if pool is None or page_count < self.MIN_PARALLEL_PAGES:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+        key = uuid.uuid4().hex
+        spooled = None
+        if isinstance(source, bytes):
+            # Tasks get a path to read rather than a pickled copy of the whole PDF each
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(source)
+            source = spooled = f.name
+        futures = [pool.submit(_extract_pages, key, source, self.pdf_backend, start, min(start + self.PAGES_PER_TASK, page_count))
+                   for start in range(0, page_count, self.PAGES_PER_TASK)]
+        try:
+            # Later runs keep extracting while earlier ones are handed back
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            if spooled is not None:
+                os.remove(spooled)
+
+    def extract_pdf(self, source: Source) -> str:
+        with span("parse.pdf"):
+            return "\n".join(self.iter_pdf_pages(source))
+
+    def extract_docx(self, source: Source, skip_empty_paragraphs: bool = False) -> str:
+        with span("parse.docx"):
+            pool = self._pool()
+            if pool is None:
+                return _extract_docx(source, skip_empty_paragraphs)
+            return pool.submit(_extract_docx, source, skip_empty_paragraphs).result()
+
+    def extract_text(self, source: Source, file_name: str = None, skip_empty_paragraphs: bool = False) -> str:
+        """
+        The text of a document given as a path, or as bytes with its file name. PDF
+        and DOCX are parsed by extension; anything else is read as UTF-8 text.
+        """
+        extension = os.path.splitext(file_name or (source if isinstance(source, str) else ""))[1].lower()
+        if extension == '.pdf':
+            return self.extract_pdf(source)
+        if extension == '.docx':
+            return self.extract_docx(source, skip_empty_paragraphs)
+        if isinstance(source, bytes):
+            return source.decode('utf-8')
+        with open(source, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def extract_texts(self, paths: List[str], skip_empty_paragraphs: bool = False) -> List[str]:
+        """The text of several files, parsed concurrently and returned in the order given."""
+        if len(paths) <= 1:
+            return [self.extract_text(path, skip_empty_paragraphs=skip_empty_paragraphs) for path in paths]
+        # The threads only wait on the worker processes
+        with ThreadPoolExecutor(max_workers=min(len(paths), self.workers), thread_name_prefix="parse") as threads:
+            return list(threads.map(lambda path: self.extract_text(path, skip_empty_paragraphs=skip_empty_paragraphs), paths))
+
+
+_parser = None
+_parser_pid = None
+_parser_lock = threading.Lock()
+
+
+def get_document_parser() -> DocumentParser:
+    """Return this process's shared parser. Its worker processes start on first use."""
+    global _parser, _parser_pid
+    with _parser_lock:
+        # A pool inherited through a fork (gunicorn --preload) belongs to the parent
+        if _parser is None or _parser_pid != os.getpid():
+            _parser = DocumentParser()
+            _parser_pid = os.getpid()
+        return _parser
@@ -0,0 +1,101 @@
+import os
+import time
+import random
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Tuple
+from bots.tools.embedding_cache import text_hash
+from bots.tools.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingPipeline:
+    """
+    Splits texts into provider-sized batches and embeds them on a bounded thread pool.
+
+    Each batch is retried with exponential backoff. A batch that still fails is
+    reported back instead of failing the whole call, so callers can keep the
+    chunks that did get embedded. With an EmbeddingCache attached, only texts
+    missing from the cache are sent to the provider, and each distinct text
+    is sent once per call.
+    """
+
+    # Cohere's embed endpoint accepts at most 96 texts per request
+    BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 96))
+    MAX_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', 4))
+    MAX_RETRIES = int(os.getenv('EMBED_MAX_RETRIES', 3))
+    BACKOFF_SECONDS = float(os.getenv('EMBED_BACKOFF_SECONDS', 1.0))
+
+    def __init__(self, cohere_client, model, cache=None, batch_size=None, max_concurrency=None, max_retries=None):
+        self.cohere_client = cohere_client
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency or self.MAX_CONCURRENCY,
+                                            thread_name_prefix="embed")
+
+    def _embed_batch(self, texts: List[str], input_type: str) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with span("cohere.embed", texts=len(texts), input_type=input_type, attempt=attempt):
+                    embeddings = self.cohere_client.embed(
+                        texts=texts,
+                        model=self.model,
+                        input_type=input_type
+                    ).embeddings
+                return np.array(embeddings, dtype=np.float32)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+                logger.warning("Embedding batch of %d failed (%s), retrying in %.1fs", len(texts), e, delay)
+                time.sleep(delay)
+
+    def iter_batches(self, texts: List[str], input_type: str) -> Iterator[Tuple[int, np.ndarray, Exception]]:
+        """
+        Yield (start, embeddings, error) per batch as batches complete, in completion order.
+        On failure embeddings is None and error holds the last exception.
+        """
+        futures = {
+            self._executor.submit(self._embed_batch, texts[start:start + self.batch_size], input_type): start
+            for start in range(0, len(texts), self.batch_size)
+        }
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                yield start, future.result(), None
+            except Exception as e:
+                logger.error("Embedding batch at offset %d failed after retries: %s", start, e)
+                yield start, None, e
+
+    def embed(self, texts: List[str], input_type: str) -> Tuple[np.ndarray, List[int]]:
+        """
+        Embed texts and return (embeddings, failed_positions). The embeddings hold one
+        row per successfully embedded text, in input order.
+        """
+        hashes = [text_hash(text) for text in texts]
+        resolved = self.cache.get_many(self.model, input_type, hashes) if self.cache else {}
+
+        missing = {}
+        for hash_value, text in zip(hashes, texts):
+            if hash_value not in resolved:
+                missing.setdefault(hash_value, text)
+        missing_hashes = list(missing)
+
+        fetched = {}
+        for start, embeddings, error in self.iter_batches(list(missing.values()), input_type):
+            if error is None:
+                for hash_value, embedding in zip(missing_hashes[start:start + self.batch_size], embeddings):
+                    fetched[hash_value] = embedding
+        if self.cache:
+            self.cache.put_many(self.model, input_type, fetched)
+        resolved.update(fetched)
+
+        failed = [position for position, hash_value in enumerate(hashes) if hash_value not in resolved]
+        rows = [resolved[hash_value] for hash_value in hashes if hash_value in resolved]
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32), failed
+        return np.vstack(rows).astype(np.float32, copy=False), failed
@@ -0,0 +1,239 @@
+import os
+import mmap
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import List, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _FileLock:
+    """A reentrant lock held across the threads of this process and, through flock, across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            if self._depth == 0 and fcntl is not None:
+                handle = open(self.path, 'a')
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                self._handle = handle
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._handle is not None:
+                    fcntl.flock(self._handle, fcntl.LOCK_UN)
+                    self._handle.close()
+                    self._handle = None
+
+
+# One lock per file in this process: a second flock on the same file from another
+# descriptor would wait on the first, so every store instance over it shares one
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def _file_lock(path) -> _FileLock:
+    path = os.path.abspath(path)
+    with _file_locks_guard:
+        if path not in _file_locks:
+            _file_locks[path] = _FileLock(path)
+        return _file_locks[path]
+
+
+class EmbeddingStore:
+    """
+    Append-only store for chunk texts and their embeddings.
+
+    Embeddings live in one contiguous raw float32 file and chunk texts in one
+    UTF-8 file indexed by an int64 end-offset file. Everything is read through
+    memory maps, so every gunicorn worker shares the same page-cache copy and
+    opening the store never deserializes the corpus. Row numbers are stable
+    until compact(), which leaves this instance on the old rows and returns a
+    new one over the rewritten files; generation changes with every compaction.
+
+    Writers in every process serialize on an flock of the store's lock file, and
+    append at the end of the files as they are on disk, not as this instance last
+    saw them.
+    """
+
+    EMBEDDINGS_SUFFIX = "_embeddings.f32"
+    CHUNKS_SUFFIX = "_chunks.bin"
+    OFFSETS_SUFFIX = "_chunks.idx"
+    LOCK_SUFFIX = ".lock"
+
+    def __init__(self, directory, prefix="vector_store"):
+        self.prefix = prefix
+        self.embeddings_file = os.path.join(directory, prefix + self.EMBEDDINGS_SUFFIX)
+        self.chunks_file = os.path.join(directory, prefix + self.CHUNKS_SUFFIX)
+        self.offsets_file = os.path.join(directory, prefix + self.OFFSETS_SUFFIX)
+        self.lock_file = os.path.join(directory, prefix + self.LOCK_SUFFIX)
+        self._lock = _file_lock(self.lock_file)
+        self._rows = 0
+        self._dimension = None
+        self._embeddings = None
+        self._offsets = None
+        self._chunks_map = None
+        self.generation = None
+        self.refresh()
+
+    def file_names(self) -> List[str]:
+        return [os.path.basename(path) for path in (self.embeddings_file, self.chunks_file, self.offsets_file)]
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    def locked(self):
+        """
+        Hold the store's write lock across threads and processes. Reentrant, so a
+        caller can keep it across an append and its own bookkeeping.
+        """
+        return self._lock.locked()
+
+    def refresh(self):
+        """Re-open the maps if another process appended to or compacted the store."""
+        handles = [self._open(path) for path in (self.offsets_file, self.embeddings_file, self.chunks_file)]
+        try:
+            stats = [os.fstat(handle.fileno()) if handle else None for handle in handles]
+            offsets_size, embeddings_size = (stat.st_size if stat else 0 for stat in stats[:2])
+            rows = offsets_size // 8
+            if rows == 0 or embeddings_size == 0:
+                self._close()
+                self._rows = 0
+                self.generation = None
+                return
+            dimension = embeddings_size // 4 // rows
+            # The offsets file is written last, so a torn append never exposes a partial row
+            rows = min(rows, embeddings_size // 4 // dimension)
+            offsets = np.memmap(handles[0], dtype=np.int64, mode='r', shape=(rows,))
+            embeddings = np.memmap(handles[1], dtype=np.float32, mode='r', shape=(rows, dimension))
+            chunks_map = None
+            if int(offsets[-1]) > 0 and handles[2] is not None:
+                chunks_map = mmap.mmap(handles[2].fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            for handle in handles:
+                if handle:
+                    handle.close()
+        # The old maps are not closed: a concurrent reader may still hold them, and they
+        # are released with their last reference. Rows they cover read the same in the new maps.
+        self._offsets, self._embeddings, self._chunks_map = offsets, embeddings, chunks_map
+        self._dimension = dimension
+        self._rows = rows
+        # Appends keep the files and compaction replaces them, so the inodes of what was
+        # mapped name the row numbering; a map taken mid-compaction mixes them and matches nothing
+        self.generation = "-".join(str(stat.st_ino) if stat else "0" for stat in stats)
+
+    @staticmethod
+    def _open(path):
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def _close(self):
+        if self._chunks_map is not None:
+            self._chunks_map.close()
+        self._chunks_map = None
+        self._embeddings = None
+        self._offsets = None
+
+    def get_chunk(self, row: int) -> str:
+        if row < 0 or row >= self._rows:
+            raise IndexError(f"Chunk row {row} out of range")
+        start = int(self._offsets[row - 1]) if row > 0 else 0
+        end = int(self._offsets[row])
+        if start == end:
+            return ""
+        return self._chunks_map[start:end].decode('utf-8')
+
+    def get_chunks(self, rows) -> List[str]:
+        return [self.get_chunk(int(row)) for row in rows]
+
+    def get_embeddings(self, start=0, end=None) -> np.ndarray:
+        if self._rows == 0:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        return self._embeddings[start:end]
+
+    def append(self, chunks: List[str], embeddings: np.ndarray) -> int:
+        """Append rows and return the row number of the first one."""
+        if not chunks:
+            return self._rows
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(chunks) != len(embeddings):
+            raise ValueError("chunks and embeddings must have the same length")
+        with self.locked():
+            # Another worker may have appended since this instance last looked
+            self.refresh()
+            if self._dimension is not None and self._rows and embeddings.shape[1] != self._dimension:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self._dimension}")
+
+            row_start = self._rows
+            base_offset = int(self._offsets[-1]) if self._rows else 0
+            encoded = [chunk.encode('utf-8') for chunk in chunks]
+            ends = base_offset + np.cumsum([len(data) for data in encoded], dtype=np.int64)
+
+            # Appending leaves the mapped prefix untouched, so readers keep their maps until refresh().
+            # The truncates only drop the tail of an append that died before writing its offsets.
+            with open(self.chunks_file, 'ab') as f:
+                f.truncate(base_offset)
+                f.write(b"".join(encoded))
+            with open(self.embeddings_file, 'ab') as f:
+                f.truncate(row_start * embeddings.shape[1] * 4)
+                f.write(embeddings.tobytes())
+            with open(self.offsets_file, 'ab') as f:
+                f.truncate(row_start * 8)
+                f.write(ends.tobytes())
+            self.refresh()
+            return row_start
+
+    def compact(self, ranges: List[Tuple[int, int]]) -> Tuple["EmbeddingStore", List[int]]:
+        """
+        Rewrite the store keeping only the given (start, end) row ranges, in order.
+        Returns a new store over the rewritten files and the new start row of each
+        range. The files are swapped in with os.replace and this instance keeps its
+        maps of the old ones, so searches still using it read the rows they expect
+        until the caller switches over. The caller should hold locked() from reading
+        the ranges until it has recorded the new starts.
+        """
+        with self.locked():
+            chunks = []
+            embeddings = []
+            new_starts = []
+            for start, end in ranges:
+                new_starts.append(len(chunks))
+                chunks.extend(self.get_chunks(range(start, end)))
+                embeddings.append(np.array(self.get_embeddings(start, end)))
+
+            directory = os.path.dirname(self.embeddings_file)
+            compacted = EmbeddingStore(directory, self.prefix + ".compact")
+            for path in (compacted.embeddings_file, compacted.chunks_file, compacted.offsets_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            compacted.refresh()
+            if chunks:
+                compacted.append(chunks, np.vstack(embeddings))
+            compacted._close()
+
+            for source, target in ((compacted.chunks_file, self.chunks_file),
+                                   (compacted.embeddings_file, self.embeddings_file),
+                                   (compacted.offsets_file, self.offsets_file)):
+                if os.path.exists(source):
+                    os.replace(source, target)
+                elif os.path.exists(target):
+                    os.remove(target)
+            return EmbeddingStore(directory, self.prefix), new_starts
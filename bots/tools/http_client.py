@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from bots.tools.metrics import registry, span
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class StreamedResponse:
+    """Backend-neutral view of a response whose body has not been read yet."""
+
+    def __init__(self, response, is_httpx):
+        self._response = response
+        self._is_httpx = is_httpx
+
+    @property
+    def status_code(self):
+        return self._response.status_code
+
+    def json(self):
+        if self._is_httpx:
+            self._response.read()
+        return self._response.json()
+
+    def iter_lines(self):
+        if self._is_httpx:
+            return self._response.iter_lines()
+        # requests assumes ISO-8859-1 for text/* without a charset, which garbles Hebrew deltas
+        self._response.encoding = 'utf-8'
+        return self._response.iter_lines(decode_unicode=True)
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP client for one provider.
+
+    Connections are reused across calls, so a tool loop pays for the TCP and TLS
+    handshake once instead of on every round trip. Every request gets a connect and
+    read timeout unless the caller passes its own. With HTTP2_ENABLED and httpx (plus
+    h2) installed, requests are multiplexed over HTTP/2; otherwise requests.Session
+    with an HTTP/1.1 connection pool is used. Every call is timed as a
+    "<provider>.request" span; streamed calls are recorded under the same name
+    without opening one.
+    """
+
+    CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 120))
+    POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+    POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))
+    HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+    def __init__(self, provider="http", http2=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        self.span_name = f"{provider}.request"
+        self.pool_maxsize = pool_maxsize or self.POOL_MAXSIZE
+        self.timeout = (connect_timeout or self.CONNECT_TIMEOUT, read_timeout or self.READ_TIMEOUT)
+        http2 = self.HTTP2_ENABLED if http2 is None else http2
+        if http2 and httpx is None:
+            logger.warning("HTTP2_ENABLED is set but the httpx package is not installed, using HTTP/1.1")
+            http2 = False
+
+        self.is_httpx = http2
+        if http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+            )
+        else:
+            self._client = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS, pool_maxsize=self.pool_maxsize)
+            self._client.mount('https://', adapter)
+            self._client.mount('http://', adapter)
+
+    def _prepare(self, kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.is_httpx and 'content' in kwargs:
+            # A pre-encoded body is `content` in httpx and `data` in requests
+            kwargs['data'] = kwargs.pop('content')
+        return kwargs
+
+    def request(self, method, url, **kwargs):
+        with span(self.span_name, method=method, url=url) as current:
+            response = self._client.request(method, url, **self._prepare(kwargs))
+            current.set_attribute('status', response.status_code)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @contextmanager
+    def stream(self, method, url, **kwargs):
+        """Send a request and yield a StreamedResponse; the connection returns to the pool on exit."""
+        kwargs = self._prepare(kwargs)
+        # Timed without a span: callers read the body from generators that yield inside the
+        # with block, and a span cannot stay open across a yield. The time covers the whole body.
+        started = time.perf_counter()
+        try:
+            if self.is_httpx:
+                with self._client.stream(method, url, **kwargs) as response:
+                    yield StreamedResponse(response, True)
+            else:
+                with self._client.request(method, url, stream=True, **kwargs) as response:
+                    yield StreamedResponse(response, False)
+        finally:
+            registry.observe('span_duration_seconds', time.perf_counter() - started, span=self.span_name)
+
+    def close(self):
+        self._client.close()
+
+
+class AsyncHttpClient:
+    """
+    Async counterpart of HttpClient on a pooled httpx.AsyncClient.
+
+    An httpx.AsyncClient is bound to the event loop it first runs on, so each loop
+    gets its own: get_async_http_client keeps one per provider and loop, for the
+    AsyncRuntime loop and, under asgi.py, the server's.
+    """
+
+    # One loop serves every async chat (or every background call) in the process, so the pool is sized for it
+    POOL_MAXSIZE = int(os.getenv('ASYNC_HTTP_POOL_MAXSIZE', 100))
+
+    def __init__(self, provider="http", http2=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        if httpx is None:
+            raise RuntimeError("The async HTTP client needs the httpx package")
+        self.span_name = f"{provider}.request"
+        pool_maxsize = pool_maxsize or self.POOL_MAXSIZE
+        self.timeout = (connect_timeout or HttpClient.CONNECT_TIMEOUT, read_timeout or HttpClient.READ_TIMEOUT)
+        self._client = httpx.AsyncClient(
+            http2=HttpClient.HTTP2_ENABLED if http2 is None else http2,
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+            timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+        )
+
+    async def request(self, method, url, **kwargs):
+        with span(self.span_name, method=method, url=url) as current:
+            response = await self._client.request(method, url, **kwargs)
+            current.set_attribute('status', response.status_code)
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def stream(self, method, url, **kwargs):
+        """Async context manager yielding an httpx.Response; iterate it with aiter_lines()."""
+        return self._client.stream(method, url, **kwargs)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+# Overridable with <PROVIDER>_BASE_URL (the variable the provider's own SDK reads), e.g. to
+# go through a proxy or to run against bench/mock_providers.py
+PROVIDER_BASE_URLS = {
+    'anthropic': 'https://api.anthropic.com',
+}
+
+
+def provider_url(provider: str, path: str) -> str:
+    base = os.getenv(f"{provider.upper()}_BASE_URL") or PROVIDER_BASE_URLS[provider]
+    return base.rstrip('/') + path
+
+
+_clients = {}
+_async_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_http_client(provider: str) -> HttpClient:
+    """Return this process's shared client for a provider, e.g. 'anthropic'."""
+    with _clients_lock:
+        _reset_after_fork()
+        client = _clients.get(provider)
+        if client is None:
+            client = _clients[provider] = HttpClient(provider)
+        return client
+
+
+def get_async_http_client(provider: str) -> AsyncHttpClient:
+    """Return the shared async client for a provider on the running event loop."""
+    key = (provider, asyncio.get_running_loop())
+    with _clients_lock:
+        _reset_after_fork()
+        client = _async_clients.get(key)
+        if client is None:
+            client = _async_clients[key] = AsyncHttpClient(provider)
+        return client
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared with forked workers (gunicorn --preload)
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients.clear()
+        _async_clients.clear()
+        _clients_pid = os.getpid()
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class LatencySummary:
+    """Count and sum of every observation, plus a window of the newest ones for quantiles."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+
+    def quantiles(self, quantiles) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {q: 0.0 for q in quantiles}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles}
+
+
+class MetricsRegistry:
+    """
+    Process-wide latency summaries and counters, rendered in the Prometheus text format.
+
+    Latencies keep their total count and sum, and p50/p95/p99 over the newest
+    SAMPLE_WINDOW observations of each series. Collectors are callables returning a
+    dict of numbers (e.g. a cache's stats()) that are read at scrape time.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+    SAMPLE_WINDOW = int(os.getenv('METRICS_SAMPLE_WINDOW', 1024))
+    PREFIX = os.getenv('METRICS_PREFIX', 'aviz_')
+
+    def __init__(self):
+        self._summaries = {}
+        self._counters = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _series(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    def observe(self, name, seconds, **labels):
+        key = self._series(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = LatencySummary(self.SAMPLE_WINDOW)
+            summary.observe(seconds)
+
+    def increment(self, name, value=1, **labels):
+        key = self._series(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, name, collect):
+        """Expose the numeric values of collect() as gauges named <name>_<key>; a later call replaces it."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        labels = labels + tuple(extra)
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+        values = {}
+        for name, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", name, e)
+                continue
+            for key, value in stats.items():
+                # Backend names and other labels-as-values are not samples
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[f"{name}_{key}"] = value
+        return values
+
+    def render(self) -> str:
+        with self._lock:
+            summaries = {key: (summary.count, summary.sum, summary.quantiles(self.QUANTILES))
+                         for key, summary in self._summaries.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        typed = set()
+        for (name, labels), (count, total, quantiles) in sorted(summaries.items()):
+            name = self.PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q, value in quantiles.items():
+                lines.append(f"{name}{self._labels(labels, [('quantile', q)])} {value:.6f}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            name = self.PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for name, value in sorted(self._collect().items()):
+            name = self.PREFIX + name
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        """The latency quantiles per series, as a dict for logs and debugging."""
+        with self._lock:
+            return {
+                name + self._labels(labels): {'count': summary.count, **{f"p{int(q * 100)}": value for q, value
+                                                                         in summary.quantiles(self.QUANTILES).items()}}
+                for (name, labels), summary in self._summaries.items()
+            }
+
+
+class SpanExporter:
+    """
+    Writes finished spans as JSON lines, in the shape of OpenTelemetry's span data,
+    from a background thread so a request never waits on the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def export(self, span_data):
+        if self._pid != os.getpid():
+            # Also after a fork: the writer thread does not survive it
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        self._queue.put(span_data)
+
+    def _start(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, args=(self._queue,), name="span-exporter", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def _run(self, span_queue):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                span_data = span_queue.get()
+                if span_data is None:
+                    break
+                f.write(json.dumps(span_data, ensure_ascii=False, default=str) + "\n")
+                if span_queue.empty():
+                    f.flush()
+
+    def stop(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+            self._pid = None
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_span_id', 'attributes', 'error')
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else (trace_id_var.get() or uuid.uuid4().hex)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+registry = MetricsRegistry()
+trace_id_var = contextvars.ContextVar('trace_id', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+_exporter = SpanExporter(os.getenv('TRACE_FILE')) if os.getenv('TRACE_FILE') else None
+if _exporter is not None:
+    atexit.register(_exporter.stop)
+
+
+def start_trace(trace_id=None):
+    """Begin a new trace in the current context, e.g. one per HTTP request."""
+    trace_id_var.set(trace_id)
+    _current_span.set(None)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as `name`. The duration goes into the span_duration_seconds summary;
+    with TRACE_FILE set the span, its parent and attributes are also exported. Spans
+    nest through contextvars, so they follow threads started with copy_context() and
+    asyncio tasks. Do not hold one open across a generator's yield.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    start_ns = time.time_ns()
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(token)
+        registry.observe('span_duration_seconds', duration, span=name)
+        if _exporter is not None:
+            _exporter.export({
+                'name': name,
+                'trace_id': current.trace_id,
+                'span_id': current.span_id,
+                'parent_span_id': current.parent_span_id,
+                'start_time_unix_nano': start_ns,
+                'end_time_unix_nano': start_ns + int(duration * 1e9),
+                'status': {'code': 'ERROR', 'message': current.error} if current.error else {'code': 'OK'},
+                'attributes': current.attributes
+            })
+
+
+def record_tokens(provider, model, **counts):
+    """Add a response's token usage to the llm_tokens_total counter, by provider, model and kind."""
+    for kind, value in counts.items():
+        if value:
+            registry.increment('llm_tokens_total', value, provider=provider, model=model, kind=kind)
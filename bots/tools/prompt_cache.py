@@ -0,0 +1,80 @@
+import os
+import logging
+import threading
+from bots.tools.request_json import JsonFragment
+from bots.tools.metrics import record_tokens
+
+logger = logging.getLogger(__name__)
+
+# Where cache_control breakpoints go, in prompt order: the tool schemas, the system
+# prompt, and the last message (which caches the history for the next tool round
+# and the next turn). The API allows at most four breakpoints per request.
+BREAKPOINTS = [name.strip() for name in os.getenv('PROMPT_CACHE_BREAKPOINTS', 'tools,system,messages').split(',')
+               if name.strip() and name.strip() != 'none']
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def _mark_last(blocks):
+    return blocks[:-1] + [{**blocks[-1], "cache_control": EPHEMERAL}]
+
+
+def with_cache_control(data, breakpoints=None):
+    """
+    Copy of a Messages API request with cache_control on its stable prefixes. The
+    caller's request is left untouched, so a tool loop can keep appending to it and
+    mark the new last message on every round. JsonFragments are taken as already
+    marked when they were built.
+    """
+    breakpoints = BREAKPOINTS if breakpoints is None else breakpoints
+    data = dict(data)
+    if "tools" in breakpoints and data.get("tools") and not isinstance(data["tools"], JsonFragment):
+        data["tools"] = _mark_last(data["tools"])
+    if "system" in breakpoints and data.get("system") and not isinstance(data["system"], JsonFragment):
+        system = data["system"]
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        data["system"] = _mark_last(system)
+    if "messages" in breakpoints and data.get("messages"):
+        last = data["messages"][-1]
+        content = last["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        if content:
+            data["messages"] = data["messages"][:-1] + [{**last, "content": _mark_last(content)}]
+    return data
+
+
+class PromptCacheStats:
+    """Process-wide totals of the usage reported by Messages API responses."""
+
+    FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+    def __init__(self):
+        self.requests = 0
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, response_data):
+        usage = response_data.get("usage") or {}
+        with self._lock:
+            self.requests += 1
+            for field in self.FIELDS:
+                self.totals[field] += usage.get(field) or 0
+        record_tokens('anthropic', response_data.get('model'), **{field: usage.get(field) for field in self.FIELDS})
+        logger.debug("Anthropic usage: input %s, cache write %s, cache read %s, output %s",
+                     usage.get('input_tokens'), usage.get('cache_creation_input_tokens'),
+                     usage.get('cache_read_input_tokens'), usage.get('output_tokens'))
+
+    def stats(self) -> dict:
+        with self._lock:
+            prompt_tokens = (self.totals["input_tokens"] + self.totals["cache_creation_input_tokens"]
+                             + self.totals["cache_read_input_tokens"])
+            return {
+                'requests': self.requests,
+                **self.totals,
+                'cache_hit_ratio': self.totals["cache_read_input_tokens"] / prompt_tokens if prompt_tokens else 0.0
+            }
+
+
+cache_stats = PromptCacheStats()
@@ -0,0 +1,23 @@
+import json
+
+
+class JsonFragment:
+    """
+    A request field serialized once and reused: encode_request copies `json` into the
+    body verbatim instead of encoding `value` again on every call.
+    """
+
+    __slots__ = ("value", "json")
+
+    def __init__(self, value):
+        self.value = value
+        self.json = json.dumps(value, ensure_ascii=False)
+
+
+def encode_request(data) -> bytes:
+    """JSON body for a request dict whose top-level values may be JsonFragments."""
+    fields = (
+        f"{json.dumps(key)}:{value.json if isinstance(value, JsonFragment) else json.dumps(value, ensure_ascii=False)}"
+        for key, value in data.items()
+    )
+    return ("{" + ",".join(fields) + "}").encode("utf-8")
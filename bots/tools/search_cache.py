@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+    """
+    In-process LRU cache with per-entry TTL, optionally backed by a shared Redis.
+
+    Values must be JSON-serializable. Redis is only consulted on a local miss, and
+    any Redis error falls back to the local cache so search never fails on it.
+    Callers put an index version in their keys, so writes to the index make old
+    entries unreachable and the TTL cleans them up.
+    """
+
+    MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1024))
+    TTL_SECONDS = int(os.getenv('SEARCH_CACHE_TTL', 3600))
+
+    def __init__(self, namespace, max_entries=None, ttl=None, redis_url=None):
+        self.namespace = namespace
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.ttl = ttl or self.TTL_SECONDS
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        redis_url = redis_url or os.getenv('SEARCH_CACHE_REDIS_URL')
+        if redis_url:
+            if redis is None:
+                logger.warning("SEARCH_CACHE_REDIS_URL is set but the redis package is not installed")
+            else:
+                self._redis = redis.Redis.from_url(redis_url)
+
+    def _redis_key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(self._redis_key(key))
+            except redis.RedisError as e:
+                logger.warning("Search cache Redis get failed: %s", e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._set_local(key, value, now)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._set_local(key, value, time.time())
+        if self._redis is not None:
+            try:
+                self._redis.setex(self._redis_key(key), self.ttl, json.dumps(value))
+            except redis.RedisError as e:
+                logger.warning("Search cache Redis set failed: %s", e)
+
+    def _set_local(self, key, value, now):
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from bots.tools.token_counter import TokenCounter, window_start
+
+
+DEFAULT_SESSION = "default"
+
+
+class Conversation:
+    """
+    One session's messages, each stored with its token count so the window sent to
+    the model is picked without re-tokenizing the whole history on every request.
+    """
+
+    def __init__(self, history: "SessionHistory"):
+        self._history = history
+        self._messages = deque(maxlen=history.max_messages)
+        self._lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def append(self, message):
+        tokens = self._history.tokens.count(message)
+        with self._lock:
+            self._messages.append((message, tokens))
+
+    def messages(self) -> list:
+        """The newest messages that fit the token budget, starting at a user turn."""
+        with self._lock:
+            stored = list(self._messages)
+        messages = [message for message, _ in stored]
+        return messages[window_start(messages, [tokens for _, tokens in stored], self._history.token_budget):]
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class SessionHistory:
+    """
+    Per-session conversation histories for the single-instance bots.
+
+    Each request sends only the newest messages that fit TOKEN_BUDGET (the system
+    prompt is not counted). Memory is capped: a session keeps at most MAX_MESSAGES,
+    sessions idle for IDLE_SECONDS are dropped, and beyond MAX_SESSIONS the least
+    recently used session is evicted.
+    """
+
+    TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 4000))
+    MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', 200))
+    MAX_SESSIONS = int(os.getenv('HISTORY_MAX_SESSIONS', 1000))
+    IDLE_SECONDS = int(os.getenv('HISTORY_IDLE_SECONDS', 3600))
+
+    def __init__(self, model="gpt-4o", token_budget=None, max_messages=None, max_sessions=None, idle_seconds=None):
+        self.token_budget = token_budget or self.TOKEN_BUDGET
+        self.max_messages = max_messages or self.MAX_MESSAGES
+        self.max_sessions = max_sessions or self.MAX_SESSIONS
+        self.idle_seconds = idle_seconds or self.IDLE_SECONDS
+        self.evicted = 0
+        self.tokens = TokenCounter(model)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def get(self, session_id) -> Conversation:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > 60:
+                self._sweep(now)
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                conversation = self._sessions[session_id] = Conversation(self)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            self._sessions.move_to_end(session_id)
+            conversation.last_used = now
+            return conversation
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        # Sessions are in least-recently-used order, so the idle ones are at the front
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if now - conversation.last_used <= self.idle_seconds:
+                break
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'messages': sum(len(conversation) for conversation in self._sessions.values()),
+                'evicted': self.evicted
+            }
@@ -0,0 +1,74 @@
+import os
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter:
+    """
+    Counts the tokens a chat message costs. Counts are cached by text, so a history
+    that is re-sent every turn is only tokenized once per message.
+    """
+
+    CACHE_SIZE = int(os.getenv('TOKEN_COUNT_CACHE_SIZE', 8192))
+    # Tokens the chat format adds around every message
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, model="gpt-4o"):
+        self._encoding = self._load_encoding(model)
+        self.count_text = lru_cache(maxsize=self.CACHE_SIZE)(self._count_text)
+
+    @staticmethod
+    def _load_encoding(model):
+        if tiktoken is None:
+            return None
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                # Claude and Llama tokenizers are not in tiktoken; cl100k_base is close enough for a budget
+                return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its vocabulary on first use, which fails on hosts without network access
+            logger.warning("Could not load a tiktoken encoding, estimating token counts instead: %s", e)
+            return None
+
+    def _count_text(self, text) -> int:
+        if self._encoding is None:
+            # Without tiktoken, about four characters per token
+            return len(text) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count(self, message) -> int:
+        return self.count_text(message_text(message)) + self.MESSAGE_OVERHEAD
+
+
+def message_text(message) -> str:
+    """The text of a message whose content is a string or a list of content blocks."""
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def window_start(messages, counts, budget) -> int:
+    """
+    Index of the first message kept when the newest `messages` (costing `counts`
+    tokens each) are fitted into `budget`. The newest message is always kept, and
+    the window opens on a user turn, since one cut between a tool call and its
+    result, or before an assistant turn, is invalid input.
+    """
+    start = len(messages)
+    used = 0
+    while start > 0 and (start == len(messages) or used + counts[start - 1] <= budget):
+        start -= 1
+        used += counts[start]
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+    return start
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List
+from bots.tools.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+class ToolRunner:
+    """
+    Runs the tool_use blocks of one model turn concurrently and returns their
+    tool_result blocks in the order the model asked for them.
+
+    Each tool gets a timeout (per tool name, or TIMEOUT_SECONDS). A tool that times
+    out or raises produces an is_error tool_result, so the model can react instead of
+    the whole request failing or hanging. A timed-out thread cannot be killed; it
+    finishes in the background and its result is dropped. Each call is timed as a
+    "tool.<name>" span.
+    """
+
+    MAX_WORKERS = int(os.getenv('TOOL_CONCURRENCY', 4))
+    TIMEOUT_SECONDS = float(os.getenv('TOOL_TIMEOUT_SECONDS', 60))
+
+    def __init__(self, handler: Callable, async_handler: Callable = None, timeouts: Dict[str, float] = None, max_workers=None):
+        self.handler = handler
+        self.async_handler = async_handler
+        self.timeouts = timeouts or {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS, thread_name_prefix="tool")
+
+    @staticmethod
+    def tool_uses(response_data) -> List[Dict[str, Any]]:
+        return [block for block in response_data.get('content', []) if block.get('type') == 'tool_use']
+
+    @staticmethod
+    def tool_messages(response_data, tool_results) -> List[Dict[str, Any]]:
+        """The assistant turn as the model sent it, followed by one user message carrying every result."""
+        return [
+            {"role": "assistant", "content": response_data.get('content', [])},
+            {"role": "user", "content": tool_results}
+        ]
+
+    def timeout_for(self, tool_name):
+        return self.timeouts.get(tool_name, self.TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _result(tool_use_id, content):
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        return {"type": "tool_result", "tool_use_id": tool_use_id, "content": content}
+
+    @staticmethod
+    def _error(tool_use_id, tool_name, message):
+        logger.error("Tool %s (%s) failed: %s", tool_name, tool_use_id, message)
+        return {"type": "tool_result", "tool_use_id": tool_use_id, "is_error": True,
+                "content": json.dumps({"error": message, "tool": tool_name})}
+
+    def _call(self, tool_name, tool_input, tool_use_id):
+        with span(f"tool.{tool_name}", tool_use_id=tool_use_id):
+            return self.handler(tool_name, tool_input, tool_use_id)
+
+    def run(self, tool_uses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        started = time.monotonic()
+        # Each tool runs in a copy of the caller's context, so its log records keep the request's ids
+        futures = [
+            self.executor.submit(contextvars.copy_context().run, self._call,
+                                 block.get('name'), block.get('input'), block.get('id'))
+            for block in tool_uses
+        ]
+        results = []
+        for block, future in zip(tool_uses, futures):
+            tool_name, tool_use_id = block.get('name'), block.get('id')
+            # Deadlines run from dispatch, so waiting on one tool does not extend another's budget
+            remaining = max(0.0, started + self.timeout_for(tool_name) - time.monotonic())
+            try:
+                results.append(self._result(tool_use_id, future.result(timeout=remaining)))
+            except FutureTimeoutError:
+                future.cancel()
+                results.append(self._error(tool_use_id, tool_name, f"Timed out after {self.timeout_for(tool_name):g}s"))
+            except Exception as e:
+                results.append(self._error(tool_use_id, tool_name, str(e)))
+        return results
+
+    async def arun(self, tool_uses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        async def call(block):
+            tool_name, tool_use_id = block.get('name'), block.get('id')
+            if self.async_handler is not None:
+                with span(f"tool.{tool_name}", tool_use_id=tool_use_id):
+                    return await self.async_handler(tool_name, block.get('input'), tool_use_id)
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, contextvars.copy_context().run, self._call, tool_name, block.get('input'), tool_use_id)
+
+        async def run_one(block):
+            tool_name, tool_use_id = block.get('name'), block.get('id')
+            try:
+                return self._result(tool_use_id, await asyncio.wait_for(call(block), self.timeout_for(tool_name)))
+            except asyncio.TimeoutError:
+                return self._error(tool_use_id, tool_name, f"Timed out after {self.timeout_for(tool_name):g}s")
+            except Exception as e:
+                return self._error(tool_use_id, tool_name, str(e))
+
+        return list(await asyncio.gather(*(run_one(block) for block in tool_uses)))
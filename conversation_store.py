@@ -0,0 +1,207 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, deque
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def new_conversation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def normalize_conversation_id(conversation_id):
+    """The canonical form of a client-supplied id, or None if it is not a UUID."""
+    # Ids end up in SQL parameters and Redis keys, so only UUIDs are accepted
+    try:
+        return uuid.UUID(str(conversation_id)).hex
+    except ValueError:
+        return None
+
+
+def text_message(role, text) -> dict:
+    """A history entry in the shape the web client has always sent."""
+    return {"role": role, "content": [{"type": "text", "text": text}]}
+
+
+class MemoryConversationStore:
+    """
+    Conversation histories kept in process memory.
+
+    Each conversation keeps its newest `max_messages` entries, and only the
+    `max_conversations` most recently used conversations are kept, so memory is
+    bounded no matter how many visitors come and go. Only correct for a single
+    process; use the SQLite or Redis store when several workers serve the chat.
+    """
+
+    def __init__(self, max_messages, max_conversations):
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self.evicted = 0
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, conversation_id, limit=None) -> list:
+        with self._lock:
+            messages = self._conversations.get(conversation_id)
+            if messages is None:
+                return []
+            self._conversations.move_to_end(conversation_id)
+            messages = list(messages)
+        return messages[-limit:] if limit else messages
+
+    def append(self, conversation_id, *messages):
+        with self._lock:
+            stored = self._conversations.get(conversation_id)
+            if stored is None:
+                stored = self._conversations[conversation_id] = deque(maxlen=self.max_messages)
+            self._conversations.move_to_end(conversation_id)
+            stored.extend(messages)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        return {'backend': 'memory', 'conversations': len(self._conversations), 'evicted': self.evicted}
+
+
+class SQLiteConversationStore:
+    """
+    Conversation histories in a local SQLite file, shared by every worker on the host.
+
+    Messages are inserted one row each and never rewritten; a conversation's rows
+    beyond `max_messages` are pruned every TRIM_EVERY inserts.
+    """
+
+    TRIM_EVERY = 50
+
+    def __init__(self, path, max_messages):
+        self.path = path
+        self.max_messages = max_messages
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    message TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id, id)")
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def history(self, conversation_id, limit=None) -> list:
+        limit = min(limit or self.max_messages, self.max_messages)
+        rows = self._connection().execute(
+            "SELECT message FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+            (conversation_id, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def append(self, conversation_id, *messages):
+        with self._connection() as conn:
+            cursor = conn.executemany(
+                "INSERT INTO messages (conversation_id, message) VALUES (?, ?)",
+                [(conversation_id, json.dumps(message, ensure_ascii=False)) for message in messages]
+            )
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            if last_id % self.TRIM_EVERY < cursor.rowcount:
+                conn.execute("""
+                    DELETE FROM messages WHERE conversation_id = ? AND id <= (
+                        SELECT id FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+                    )
+                """, (conversation_id, conversation_id, self.max_messages))
+
+    def clear(self, conversation_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+
+    def stats(self) -> dict:
+        conversations, messages = self._connection().execute(
+            "SELECT COUNT(DISTINCT conversation_id), COUNT(*) FROM messages").fetchone()
+        return {'backend': 'sqlite', 'conversations': conversations, 'messages': messages}
+
+
+class RedisConversationStore:
+    """
+    Conversation histories in Redis lists, shared by every worker and host.
+
+    An append pushes, trims the list to `max_messages` and refreshes its expiry in
+    one transaction, so abandoned conversations expire after `ttl` seconds.
+    """
+
+    def __init__(self, redis_url, max_messages, ttl, prefix="conversation"):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(redis_url)
+
+    def _key(self, conversation_id):
+        return f"{self.prefix}:{conversation_id}"
+
+    def history(self, conversation_id, limit=None) -> list:
+        limit = min(limit or self.max_messages, self.max_messages)
+        return [json.loads(message) for message in self._redis.lrange(self._key(conversation_id), -limit, -1)]
+
+    def append(self, conversation_id, *messages):
+        key = self._key(conversation_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(key, *(json.dumps(message, ensure_ascii=False) for message in messages))
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear(self, conversation_id):
+        self._redis.delete(self._key(conversation_id))
+
+    def stats(self) -> dict:
+        return {'backend': 'redis'}
+
+
+def create_conversation_store():
+    """
+    Pick the backend from CONVERSATION_STORE: 'sqlite' (default, file at
+    CONVERSATION_STORE_PATH), 'redis' (at CONVERSATION_STORE_REDIS_URL) or 'memory'.
+    SQLite is the default because under several gunicorn workers a conversation's
+    next message can land on any of them; 'memory' is only for a single process.
+    """
+    backend = os.getenv('CONVERSATION_STORE', 'sqlite').lower()
+    max_messages = int(os.getenv('CONVERSATION_MAX_MESSAGES', 100))
+
+    if backend == 'memory':
+        return MemoryConversationStore(max_messages, int(os.getenv('CONVERSATION_STORE_MAX_CONVERSATIONS', 10000)))
+    if backend == 'redis':
+        if redis is None:
+            logger.warning("CONVERSATION_STORE is 'redis' but the redis package is not installed, keeping conversations in SQLite")
+        else:
+            return RedisConversationStore(
+                os.getenv('CONVERSATION_STORE_REDIS_URL', 'redis://localhost:6379/0'),
+                max_messages,
+                int(os.getenv('CONVERSATION_TTL_SECONDS', 7 * 24 * 3600))
+            )
+    elif backend != 'sqlite':
+        logger.warning("Unknown CONVERSATION_STORE '%s', keeping conversations in SQLite", backend)
+    return SQLiteConversationStore(os.getenv('CONVERSATION_STORE_PATH', 'data/conversations.db'), max_messages)
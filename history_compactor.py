@@ -0,0 +1,141 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from bots.tools.async_runtime import get_async_runtime
+from bots.tools.http_client import get_async_http_client, provider_url
+from bots.tools.token_counter import TokenCounter, message_text, window_start
+from conversation_store import text_message
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryCompactor:
+    """
+    Fits a conversation's history into a token budget before it is sent to the model.
+
+    The newest turns are kept verbatim. Older turns are folded into a running summary
+    that is cached per conversation and prepended as one exchange. Summaries are
+    written in the background by a cheap model on the shared event loop, so a request
+    never waits for one: until a newer summary is ready the previous one is used.
+    Without ANTHROPIC_API_KEY, older turns are simply dropped.
+    """
+
+    SUMMARY_MODEL = os.getenv('HISTORY_SUMMARY_MODEL', 'claude-3-haiku-20240307')
+    SUMMARY_MAX_TOKENS = int(os.getenv('HISTORY_SUMMARY_MAX_TOKENS', 512))
+    MAX_SUMMARIES = int(os.getenv('HISTORY_MAX_SUMMARIES', 10000))
+    SUMMARY_PROMPT = ("You maintain a running summary of a conversation between a user and an assistant. "
+                      "Merge the new turns into the existing summary. Keep names, facts, decisions, open questions "
+                      "and the user's preferences; drop small talk. Write in the language of the conversation. "
+                      "Output only the updated summary.")
+
+    def __init__(self, token_budget, model="gpt-4o"):
+        self.token_budget = token_budget
+        self.tokens = TokenCounter(model)
+        self.api_key = os.getenv('ANTHROPIC_API_KEY')
+        self.api_url = provider_url('anthropic', '/v1/messages')
+        self.summaries_written = 0
+        self.summary_failures = 0
+        # conversation_id -> ((messages folded in, fingerprint of the last one), summary text)
+        self._summaries = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(history, position) -> str:
+        # The message and the one before it, so a repeated short turn ("ok") rarely matches twice
+        digest = hashlib.sha1()
+        for message in history[max(position - 1, 0):position + 1]:
+            digest.update(f"{message.get('role')}:{message_text(message)}\0".encode('utf-8'))
+        return digest.hexdigest()
+
+    def compact(self, conversation_id, history) -> list:
+        if not history:
+            return history
+        with self._lock:
+            (folded_count, folded_through), summary = self._summaries.get(conversation_id, ((0, None), None))
+
+        # The summary stands in for everything up to the last turn folded into it. That turn
+        # is at folded_count - 1, or earlier if the store has since trimmed old messages, so
+        # the last match at or before it is taken.
+        offset = 0
+        if summary:
+            matches = [position for position in range(min(folded_count, len(history)))
+                       if self._fingerprint(history, position) == folded_through]
+            if matches:
+                offset = matches[-1] + 1
+        recent = history[offset:]
+        summary_messages = self._summary_messages(summary) if summary else []
+
+        budget = self.token_budget - sum(self.tokens.count(message) for message in summary_messages)
+        start = window_start(recent, [self.tokens.count(message) for message in recent], budget)
+        if start and conversation_id and self.api_key:
+            folded = offset + start
+            self._schedule_summary(conversation_id, summary, recent[:start], (folded, self._fingerprint(history, folded - 1)))
+        return summary_messages + recent[start:]
+
+    @staticmethod
+    def _summary_messages(summary):
+        # An exchange rather than a lone message, so the history still alternates and opens on a user turn
+        return [
+            text_message('user', f"Summary of our earlier conversation:\n{summary}"),
+            text_message('assistant', "Understood, I'll keep that in mind.")
+        ]
+
+    def _schedule_summary(self, conversation_id, summary, messages, folded_through):
+        with self._lock:
+            if conversation_id in self._pending:
+                return
+            self._pending.add(conversation_id)
+        asyncio.run_coroutine_threadsafe(
+            self._update_summary(conversation_id, summary, messages, folded_through), get_async_runtime().loop)
+
+    async def _update_summary(self, conversation_id, summary, messages, folded_through):
+        try:
+            new_summary = await self._summarize(summary, messages)
+            with self._lock:
+                self._summaries[conversation_id] = (folded_through, new_summary)
+                self._summaries.move_to_end(conversation_id)
+                while len(self._summaries) > self.MAX_SUMMARIES:
+                    self._summaries.popitem(last=False)
+                self.summaries_written += 1
+        except Exception as e:
+            logger.warning("Could not summarize conversation %s: %s", conversation_id, e)
+            with self._lock:
+                self.summary_failures += 1
+        finally:
+            with self._lock:
+                self._pending.discard(conversation_id)
+
+    async def _summarize(self, summary, messages) -> str:
+        transcript = "\n".join(f"{message['role']}: {message_text(message)}" for message in messages)
+        response = await get_async_http_client('anthropic').post(
+            self.api_url,
+            headers={
+                'x-api-key': self.api_key,
+                'anthropic-version': '2023-06-01',
+                'content-type': 'application/json'
+            },
+            json={
+                "model": self.SUMMARY_MODEL,
+                "max_tokens": self.SUMMARY_MAX_TOKENS,
+                "system": self.SUMMARY_PROMPT,
+                "messages": [{"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"}]
+            }
+        )
+        if response.status_code != 200:
+            raise Exception(f"API request failed with status {response.status_code}: {response.json()}")
+        return response.json()['content'][0]['text'].strip()
+
+    def forget(self, conversation_id):
+        with self._lock:
+            self._summaries.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        return {
+            'summaries': len(self._summaries),
+            'summaries_written': self.summaries_written,
+            'summary_failures': self.summary_failures
+        }
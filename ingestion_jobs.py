@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from bots.tools.metrics import registry, span
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryJobStore:
+    """
+    Job records kept in process memory, newest last. Beyond `max_jobs` the oldest
+    finished jobs are dropped. Only correct for a single process; use the SQLite
+    store when several workers may be asked about the same job.
+    """
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+            excess = len(self._jobs) - self.max_jobs
+            if excess > 0:
+                finished = [job_id for job_id, record in self._jobs.items() if record['status'] in FINISHED]
+                for job_id in finished[:excess]:
+                    del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def list(self, limit):
+        with self._lock:
+            return [dict(job) for job in reversed(self._jobs.values())][:limit]
+
+
+class SQLiteJobStore:
+    """
+    Job records in a local SQLite file, so every worker on the host can report on
+    a job that another worker is running. Beyond `max_jobs` the oldest finished
+    jobs are deleted.
+    """
+
+    def __init__(self, path, max_jobs):
+        self.path = path
+        self.max_jobs = max_jobs
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    created REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    job TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created)")
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def save(self, job):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (id, created, status, job) VALUES (?, ?, ?, ?)",
+                         (job['id'], job['created'], job['status'], json.dumps(job, ensure_ascii=False)))
+            if job['status'] in FINISHED:
+                conn.execute("""
+                    DELETE FROM jobs WHERE status IN (?, ?) AND id NOT IN (
+                        SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created DESC LIMIT ?
+                    )
+                """, (*FINISHED, *FINISHED, self.max_jobs))
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT job FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, limit):
+        rows = self._connection().execute("SELECT job FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class IngestionJobs:
+    """
+    Runs document ingestion (parsing, chunking, embedding and index updates) off
+    the request thread.
+
+    An upload route submits a function and answers at once with the job's id; the
+    client polls the job record for its status and current stage. The function is
+    called with a progress(stage) callback and its return value, which must be
+    JSON-serializable, becomes the job's result. Jobs run on INGEST_WORKERS threads
+    of the process that accepted them, inside an app context and the submitting
+    request's context, so their logs and spans carry its request id. With the
+    default single worker, uploads are applied in the order they arrived.
+    """
+
+    WORKERS = int(os.getenv('INGEST_WORKERS', 1))
+
+    def __init__(self, store, app=None, workers=None):
+        self.store = store
+        self.app = app
+        self.counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers or self.WORKERS, thread_name_prefix="ingest-job")
+
+    def _count(self, old_status, new_status):
+        with self._lock:
+            if old_status is not None:
+                self.counts[old_status] -= 1
+            self.counts[new_status] += 1
+
+    def submit(self, kind, run, **details) -> dict:
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': QUEUED,
+            'stage': None,
+            'details': details,
+            'result': None,
+            'error': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None
+        }
+        self.store.save(job)
+        self._count(None, QUEUED)
+        queued = dict(job)
+        self._executor.submit(contextvars.copy_context().run, self._run, job, run)
+        logger.info("Queued %s job %s: %s", kind, job['id'], details)
+        return queued
+
+    def _run(self, job, run):
+        job.update(status=RUNNING, started=time.time())
+        self.store.save(job)
+        self._count(QUEUED, RUNNING)
+        registry.observe('ingest_job_wait_seconds', job['started'] - job['created'], kind=job['kind'])
+
+        def progress(stage):
+            job['stage'] = stage
+            self.store.save(job)
+
+        try:
+            with span('ingest.job', kind=job['kind'], job_id=job['id']):
+                with self.app.app_context() if self.app is not None else nullcontext():
+                    result = run(progress)
+            job.update(status=SUCCEEDED, result=result)
+        except Exception as e:
+            logger.exception("Ingestion job %s failed: %s", job['id'], e)
+            job.update(status=FAILED, error=str(e))
+        job['finished'] = time.time()
+        self.store.save(job)
+        self._count(RUNNING, job['status'])
+        logger.info("%s job %s %s after %.1fs", job['kind'], job['id'], job['status'], job['finished'] - job['started'])
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list(self, limit=50):
+        return self.store.list(limit)
+
+    def stats(self) -> dict:
+        # Jobs of this process only; the store may also hold other workers' jobs
+        with self._lock:
+            return dict(self.counts)
+
+
+def create_ingestion_jobs(app=None):
+    """
+    Pick the job store from INGEST_JOB_STORE: 'sqlite' (default, file at
+    INGEST_JOB_STORE_PATH) or 'memory', keeping the newest INGEST_JOBS_KEEP
+    finished jobs. The SQLite store is the default because under several gunicorn
+    workers a client's poll of /jobs/<id> can land on any of them; 'memory' is
+    only for a single process.
+    """
+    backend = os.getenv('INGEST_JOB_STORE', 'sqlite').lower()
+    max_jobs = int(os.getenv('INGEST_JOBS_KEEP', 200))
+
+    if backend == 'memory':
+        store = MemoryJobStore(max_jobs)
+    else:
+        if backend != 'sqlite':
+            logging.warning(f"Unknown INGEST_JOB_STORE '{backend}', keeping jobs in SQLite")
+        store = SQLiteJobStore(os.getenv('INGEST_JOB_STORE_PATH', 'data/ingest_jobs.db'), max_jobs)
+    return IngestionJobs(store, app)
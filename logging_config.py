@@ -0,0 +1,129 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Set per request by app.py; every record logged in that context carries them
+request_id_var = contextvars.ContextVar('request_id', default=None)
+conversation_id_var = contextvars.ContextVar('conversation_id', default=None)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.conversation_id = conversation_id_var.get()
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread. The request thread
+    only interpolates the message arguments (so later mutation of those objects
+    cannot change the record) and renders a traceback if there is one.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ('request_id', 'conversation_id'):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+
+_listener = None
+_queue_handler = None
+
+
+def _build_handlers():
+    handlers = []
+    formatter = JsonFormatter() if os.getenv('LOG_FORMAT', 'json') == 'json' else logging.Formatter(TEXT_FORMAT)
+    log_file = os.getenv('LOG_FILE', 'app.log')
+    if log_file:
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+            encoding='utf-8'
+        )
+        handlers.append(file_handler)
+    if os.getenv('LOG_TO_STDERR', 'false').lower() in ('1', 'true', 'yes'):
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive a fork (gunicorn --preload); without a new one
+    # the worker's records would pile up in the queue
+    if _queue_handler is not None:
+        _start_listener()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # Drains the queue before the writer thread exits
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging():
+    """
+    Route all logging through a queue to a background writer thread.
+
+    The root level is LOG_LEVEL (default INFO). LOG_LEVELS overrides single loggers,
+    e.g. "bots.omnibot.tools.rag=DEBUG,werkzeug=WARNING". Records go to LOG_FILE
+    (default app.log, rotated at LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT files) and
+    to stderr with LOG_TO_STDERR, as JSON lines unless LOG_FORMAT=text.
+    """
+    global _queue_handler
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for override in filter(None, os.getenv('LOG_LEVELS', '').split(',')):
+        name, _, level = override.partition('=')
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    if _queue_handler is None:
+        _queue_handler = DeferredQueueHandler(None)
+        _queue_handler.addFilter(ContextFilter())
+        _start_listener()
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    # Replaces handlers that a bot module's basicConfig may have installed on import
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
@@ -0,0 +1,152 @@
+import os
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import deque, namedtuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+class MemoryRateLimiter:
+    """
+    Sliding-window limiter kept in process memory: at most `limit` hits per key in
+    any `window` seconds. Each key holds the timestamps of its hits inside the
+    window, so memory per key is bounded by the limit. Only correct for a single
+    process; use RedisRateLimiter when several workers serve the same clients.
+    """
+
+    # Idle keys are swept once the table grows past this many entries
+    SWEEP_THRESHOLD = 10000
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.allowed = 0
+        self.rejected = 0
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                self.rejected += 1
+                retry_after = hits[0] + self.window - now
+                return RateLimitResult(False, self.limit, 0, retry_after)
+            hits.append(now)
+            self.allowed += 1
+            if len(self._hits) > self.SWEEP_THRESHOLD:
+                self._sweep(now)
+            return RateLimitResult(True, self.limit, self.limit - len(hits), 0.0)
+
+    def _sweep(self, now):
+        idle = [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]
+        for key in idle:
+            del self._hits[key]
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'memory',
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'tracked_keys': len(self._hits)
+        }
+
+
+class RedisRateLimiter:
+    """
+    Sliding-window limiter shared by every worker through Redis.
+
+    Each key is a sorted set of hit timestamps. One Lua script trims the window,
+    counts and records the hit atomically, using the Redis clock so workers with
+    skewed clocks agree. If Redis is unreachable the local MemoryRateLimiter
+    decides, so an outage degrades to per-process limits instead of failing chat.
+    """
+
+    SCRIPT = """
+    local key = KEYS[1]
+    local window = tonumber(ARGV[1])
+    local limit = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local count = redis.call('ZCARD', key)
+    if count < limit then
+        redis.call('ZADD', key, now, now .. '-' .. ARGV[3])
+        redis.call('PEXPIRE', key, window)
+        return {1, limit - count - 1, 0}
+    end
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    return {0, 0, tonumber(oldest[2]) + window - now}
+    """
+
+    def __init__(self, limit, window, redis_url, prefix="ratelimit"):
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+        self.allowed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+        self._redis = redis.Redis.from_url(redis_url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self._fallback = MemoryRateLimiter(limit, window)
+        self._lock = threading.Lock()
+
+    def hit(self, key) -> RateLimitResult:
+        try:
+            allowed, remaining, retry_after_ms = self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[int(self.window * 1000), self.limit, uuid.uuid4().hex]
+            )
+        except redis.RedisError as e:
+            logger.warning("Rate limiter Redis call failed, using the local limiter: %s", e)
+            with self._lock:
+                self.backend_errors += 1
+            return self._fallback.hit(key)
+
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return RateLimitResult(bool(allowed), self.limit, int(remaining), int(retry_after_ms) / 1000)
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'redis',
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'backend_errors': self.backend_errors
+        }
+
+
+def create_rate_limiter(limit, window, redis_url=None):
+    """Redis-backed when RATE_LIMIT_REDIS_URL is set and redis is installed, in-memory otherwise."""
+    redis_url = redis_url or os.getenv('RATE_LIMIT_REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+        else:
+            return RedisRateLimiter(limit, window, redis_url)
+    return MemoryRateLimiter(limit, window)
+
+
+def rate_limit_headers(result: RateLimitResult) -> dict:
+    headers = {'X-RateLimit-Limit': str(result.limit), 'X-RateLimit-Remaining': str(result.remaining)}
+    if not result.allowed:
+        # Retry-After takes whole seconds; round up so clients never retry early
+        headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+    return headers
@@ -18,6 +18,8 @@ const emojiMap = {
 
 let enterDisabled = false;
 let loadingMessageElement = null;
+// The server keeps the history of this tab's conversation; we only send its id
+let conversationId = sessionStorage.getItem('conversationId');
 
 function replaceEmoticonsWithEmoji(text) {
     for (const [emoticon, emoji] of Object.entries(emojiMap)) {
@@ -58,20 +60,109 @@ function getChatHistory() {
     return history;
 }
 
-function defaultFetchMessage(message, history) {
-    let fetchParams = {};
+function rememberConversation(data) {
+    if (data && data.conversation_id) {
+        conversationId = data.conversation_id;
+        sessionStorage.setItem('conversationId', conversationId);
+    }
+}
+
+function forgetConversation() {
+    conversationId = null;
+    sessionStorage.removeItem('conversationId');
+}
+
+function defaultFetchMessage(message) {
+    return fetch('/chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ message: message, conversation_id: conversationId, ...getFetchParams() })
+    });
+}
+
+function getFetchParams() {
     try {
-        fetchParams = JSON.parse(localStorage.getItem('fetchParams')) || {};
+        return JSON.parse(localStorage.getItem('fetchParams')) || {};
     } catch (e) {
         console.error('Error parsing fetchParams from localStorage', e);
+        return {};
     }
+}
 
-    return fetch('/chat', {
+// Reads the /chat/stream Server-Sent Events and calls onEvent with each parsed event
+async function streamChatMessage(message, onEvent) {
+    const response = await fetch('/chat/stream', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ message: message, history: history, ...fetchParams })
+        body: JSON.stringify({ message: message, conversation_id: conversationId, ...getFetchParams() })
+    });
+    if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        if (data.response) {
+            // A rate-limited request is refused with a 429 whose message is shown as the reply
+            onEvent({ type: 'done', response: data.response });
+        } else {
+            onEvent({ type: 'error', error: data.error || `HTTP ${response.status}` });
+        }
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const data = frame.split('\n')
+                .filter(line => line.startsWith('data:'))
+                .map(line => line.slice(5).trim())
+                .join('\n');
+            if (data) {
+                onEvent(JSON.parse(data));
+            }
+        }
+    }
+}
+
+function sendStreamingMessage(message) {
+    let botMessageElement = null;
+    let streamedText = '';
+
+    const renderBotMessage = (text) => {
+        if (!botMessageElement) {
+            removeLoadingMessage();
+            botMessageElement = addMessageToChat('bot', text);
+        } else {
+            renderMessageContent(botMessageElement, text);
+        }
+    };
+
+    return streamChatMessage(message, event => {
+        if (event.type === 'text') {
+            removeLoadingMessage();
+            streamedText += event.text;
+            renderBotMessage(streamedText);
+        } else if (event.type === 'tool') {
+            // Text from before the tool call stays; the answer streams on after it once the tool is done
+            if (!loadingMessageElement) {
+                showLoadingMessage();
+            }
+        } else if (event.type === 'done') {
+            rememberConversation(event);
+            renderBotMessage(event.response || streamedText);
+        } else if (event.type === 'error') {
+            console.error('Error:', event.error);
+            renderBotMessage('Sorry, something went wrong.');
+        }
     });
 }
 
@@ -82,8 +173,8 @@ function sendMessage(fetchMessageFunction = defaultFetchMessage) {
 
     if (message === '') return;
 
-    // Get chat history
-    const history = getChatHistory();
+    // Bots that override the fetch function still get the history scraped from the page
+    const history = fetchMessageFunction === defaultFetchMessage ? null : getChatHistory();
 
     // Add user message to chat box
     addMessageToChat('user', message);
@@ -96,16 +187,21 @@ function sendMessage(fetchMessageFunction = defaultFetchMessage) {
     // Show loading message
     showLoadingMessage();
 
-    // Send message to the server using the provided fetch function
-    fetchMessageFunction(message, history)
-    .then(response => response.json())
-    .then(data => {
-        if (data && data.response) {
-            addMessageToChat('bot', data.response);
-        } else {
-            addMessageToChat('bot', 'Sorry, something went wrong.');
-        }
-    })
+    // The default path streams tokens; bots that override the fetch function keep the JSON response
+    const request = fetchMessageFunction === defaultFetchMessage
+        ? sendStreamingMessage(message)
+        : fetchMessageFunction(message, history)
+            .then(response => response.json())
+            .then(data => {
+                rememberConversation(data);
+                if (data && data.response) {
+                    addMessageToChat('bot', data.response);
+                } else {
+                    addMessageToChat('bot', 'Sorry, something went wrong.');
+                }
+            });
+
+    request
     .catch(error => {
         console.error('Error:', error);
         addMessageToChat('bot', 'Sorry, something went wrong.');
@@ -114,14 +210,17 @@ function sendMessage(fetchMessageFunction = defaultFetchMessage) {
         // Re-enable the send button and enter key after the response is handled
         sendButton.disabled = false;
         enterDisabled = false;
-        // Remove loading message
-        if (loadingMessageElement) {
-            loadingMessageElement.remove();
-            loadingMessageElement = null;
-        }
+        removeLoadingMessage();
     });
 }
 
+function removeLoadingMessage() {
+    if (loadingMessageElement) {
+        loadingMessageElement.remove();
+        loadingMessageElement = null;
+    }
+}
+
 function showLoadingMessage() {
     const chatBox = document.getElementById('chat-box');
     loadingMessageElement = document.createElement('div');
@@ -135,6 +234,13 @@ function addMessageToChat(sender, message) {
     const chatBox = document.getElementById('chat-box');
     const messageElement = document.createElement('div');
     messageElement.classList.add('message', sender);
+    chatBox.appendChild(messageElement);
+    renderMessageContent(messageElement, message);
+    return messageElement;
+}
+
+function renderMessageContent(messageElement, message) {
+    const chatBox = document.getElementById('chat-box');
 
     // Replace emoticons with emoji
     const messageWithEmoji = replaceEmoticonsWithEmoji(message);
@@ -169,7 +275,6 @@ function addMessageToChat(sender, message) {
     });
 
     messageElement.innerHTML = tempDiv.innerHTML;
-    chatBox.appendChild(messageElement);
     chatBox.scrollTop = chatBox.scrollHeight;
 }
 
@@ -177,6 +282,12 @@ function clearChat() {
     const chatBox = document.getElementById('chat-box');
     chatBox.innerHTML = '';
 
+    if (conversationId) {
+        fetch(`/chat/conversation/${conversationId}`, { method: 'DELETE' })
+            .catch(error => console.error('Error:', error));
+        forgetConversation();
+    }
+
     // Clear chat history on the server
     fetch('/reset', {
         method: 'POST'